@@ -1,5 +1,5 @@
 import os
-from flask import Flask, send_from_directory
+from flask import Flask
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
 from .extensions import db, migrate, jwt
@@ -7,6 +7,7 @@ from .authentication.views.auth_frontend import frontend_bp
 from .notification_sender.views.alert_views import alert_bp
 from .logging_config import flask_logger
 from .celery_config import celery as celery_app
+from .media_serving import serve_upload, MEDIA_SENDFILE_MODE
 import click,sys
 from app.authentication.models import User
 
@@ -16,6 +17,8 @@ def create_app():
 
     # Ensure upload folder exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Let Apache / lighttpd stream uploads (see media_serving.py); nginx uses X-Accel-Redirect instead
+    app.config['USE_X_SENDFILE'] = MEDIA_SENDFILE_MODE == "x-sendfile"
 
     # Database configuration with URL-encoding for password
     db_user = os.getenv("MYSQL_USER")
@@ -31,6 +34,16 @@ def create_app():
     )
     app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Connection pool settings (Celery workers keep one app per process, so the pool stays warm)
+    engine_options = {
+        "pool_pre_ping": True,
+        "pool_recycle": int(os.getenv("SQLALCHEMY_POOL_RECYCLE", 1800)),
+    }
+    if db_uri.startswith("mysql"):
+        engine_options["pool_size"] = int(os.getenv("SQLALCHEMY_POOL_SIZE", 5))
+        engine_options["max_overflow"] = int(os.getenv("SQLALCHEMY_MAX_OVERFLOW", 10))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
     app.config['SECRET_KEY'] = os.getenv("SECRET_KEY", "supersecretkey")
     app.config['JWT_SECRET_KEY'] = os.getenv("JWT_SECRET_KEY", "jwt-secret-key")
     app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
@@ -65,9 +78,9 @@ def create_app():
     def index():
         return {"message": "App is running!"}
 
-    @app.route('/media/uploads/<filename>')
+    @app.route('/media/uploads/<path:filename>')
     def uploaded_file(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        return serve_upload(app.config['UPLOAD_FOLDER'], filename)
 
     # Custom CLI command to create an admin user
     @app.cli.command("create-admin")
@@ -78,6 +91,7 @@ def create_app():
         """Create an admin user with the provided email, password, and full name."""
         from app.authentication.models import User
         from app.extensions import db
+        from app.dashboard_cache import invalidate_dashboard
 
         # Check if user already exists
         if User.query.filter_by(email=email).first():
@@ -97,6 +111,144 @@ def create_app():
         # Add and commit to the database
         db.session.add(new_user)
         db.session.commit()
+        invalidate_dashboard("users")
         print(f"Admin user {full_name} ({email}) created successfully!")
 
+    @app.cli.command("backfill-next-run-at")
+    def backfill_next_run_at():
+        """Fill AlertSample.next_run_at for recurring samples created before the column existed."""
+        from datetime import datetime
+        import pytz
+        from sqlalchemy import func
+        from app.notification_sender.models import AlertSample, AlertLog
+        from app.notification_sender.recurrence import expand_occurrences
+
+        samples = AlertSample.query.filter(
+            AlertSample.is_recurring.is_(True),
+            AlertSample.next_run_at.is_(None)
+        ).all()
+        if not samples:
+            print("No recurring samples to backfill.")
+            return
+
+        # A queued log already holds the next run; the rest get their next occurrence from now
+        queued = dict(db.session.query(AlertLog.sample_id, func.min(AlertLog.scheduled_for)).filter(
+            AlertLog.sample_id.in_([sample.id for sample in samples]),
+            AlertLog.status == "queued"
+        ).group_by(AlertLog.sample_id).all())
+        expanded = expand_occurrences([sample for sample in samples if not queued.get(sample.id)], 1, after=datetime.now(pytz.utc))
+
+        for sample in samples:
+            occurrences = expanded.get(sample.id)
+            sample.next_run_at = queued.get(sample.id) or (occurrences[0] if occurrences else None)
+        db.session.commit()
+        print(f"Backfilled next_run_at for {len(samples)} recurring samples.")
+
+    @app.cli.command("backfill-body-previews")
+    @click.option("--batch-size", type=int, default=100, help="Samples loaded (with their bodies) per batch.")
+    def backfill_body_previews(batch_size):
+        """Fill AlertSample.body_preview / body_size for samples saved before the columns existed."""
+        from app.notification_sender.models import AlertSample, body_preview_text
+
+        filled = 0
+        while True:
+            rows = db.session.query(AlertSample.id, AlertSample.body).filter(
+                AlertSample.body_size.is_(None)
+            ).order_by(AlertSample.id).limit(batch_size).all()
+            if not rows:
+                break
+            for row in rows:
+                AlertSample.query.filter(AlertSample.id == row.id).update({
+                    AlertSample.body_preview: body_preview_text(row.body),
+                    AlertSample.body_size: len(row.body.encode("utf-8")) if row.body else 0,
+                }, synchronize_session=False)
+            db.session.commit()
+            filled += len(rows)
+        print(f"Backfilled body previews for {filled} samples.")
+
+    @app.cli.command("extract-body-images")
+    @click.option("--batch-size", type=int, default=50, help="Samples loaded (with their bodies) per batch.")
+    def extract_body_images(batch_size):
+        """Move inline base64 images out of stored sample bodies into the media store."""
+        from app.notification_sender.body_images import extract_existing_body_images
+
+        result = extract_existing_body_images(app.config['UPLOAD_FOLDER'], batch_size=batch_size)
+        print(f"Extracted {result['images']} inline images from {result['samples']} sample bodies.")
+        for label in ("before", "after"):
+            stats = result[label]
+            row_length = f", table avg row {stats['table_avg_row_length']} bytes" if stats['table_avg_row_length'] is not None else ""
+            print(f"{label:>6}: {stats['samples']} samples, avg body {stats['avg_body_bytes']} bytes, "
+                  f"max {stats['max_body_bytes']}, total {stats['total_body_bytes']}, "
+                  f"{stats['bodies_with_inline_images']} with inline images{row_length}")
+
+    @app.cli.command("build-media-derivatives")
+    def build_media_derivatives():
+        """Build Telegram derivatives and thumbnails for sample photos uploaded before the media pipeline."""
+        from app.notification_sender.models import AlertSample
+        from app.notification_sender.media_pipeline import sample_photo_derivatives
+
+        samples = AlertSample.query.filter(
+            AlertSample.photo_upload.isnot(None),
+            AlertSample.photo_thumbnail.is_(None)
+        ).all()
+        built = 0
+        for sample in samples:
+            fields = sample_photo_derivatives(sample, app.config['UPLOAD_FOLDER'])
+            if not fields:
+                continue
+            for field, value in fields.items():
+                setattr(sample, field, value)
+            built += 1
+        db.session.commit()
+        print(f"Built media derivatives for {built} of {len(samples)} samples.")
+
+    @app.cli.command("media-gc")
+    def media_gc():
+        """Delete stored uploads no sample or user references any more, store files failed requests left without
+        a row, and photo derivatives / thumbnails no sample uses."""
+        from app.notification_sender.media_store import collect_garbage, GC_GRACE_SECONDS
+        from app.notification_sender.media_pipeline import collect_derivative_garbage
+
+        removed, freed = collect_garbage(app.config['UPLOAD_FOLDER'])
+        print(f"Removed {removed} unreferenced media blobs and orphaned files ({freed} bytes).")
+        removed, freed = collect_derivative_garbage(app.config['UPLOAD_FOLDER'], GC_GRACE_SECONDS)
+        print(f"Removed {removed} unreferenced photo derivatives and thumbnails ({freed} bytes).")
+
+    @app.cli.command("media-recount")
+    def media_recount():
+        """Recompute media blob reference counts from the samples and users pointing at them."""
+        from app.notification_sender.media_store import recount_references
+
+        print(f"Corrected the reference count of {recount_references()} media blobs.")
+
+    @app.cli.command("archive-logs")
+    @click.option("--days", type=int, default=None, help="Archive finalized logs older than this (default LOG_ARCHIVE_AFTER_DAYS).")
+    @click.option("--mode", type=click.Choice(["table", "ndjson"]), default=None, help="Default LOG_ARCHIVE_MODE.")
+    def archive_logs(days, mode):
+        """Move finalized alert logs past the retention window out of alert_log, until none are left."""
+        from app.notification_sender.log_archive import archive_old_logs, LOG_ARCHIVE_AFTER_DAYS, LOG_ARCHIVE_MODE
+
+        result = archive_old_logs(
+            older_than_days=LOG_ARCHIVE_AFTER_DAYS if days is None else days,
+            max_batches=sys.maxsize,
+            mode=mode or LOG_ARCHIVE_MODE,
+        )
+        print(f"Archived {result['archived']} alert logs ({result['mode']}) in {result['batches']} batches, {result['seconds']:.1f}s.")
+
+    @app.cli.command("rebuild-hourly-stats")
+    @click.option("--days", type=int, default=None, help="Only rebuild the last N days (default: all history).")
+    @click.option("--exports/--no-exports", default=True,
+                  help="Also count logs LOG_ARCHIVE_MODE=ndjson exported to LOG_ARCHIVE_EXPORT_DIR (default on). "
+                       "Without them, the rebuilt hours lose the counts of exported logs.")
+    def rebuild_hourly_stats_command(days, exports):
+        """Rebuild the dashboard's hourly alert counters from alert_log, its archive table and the NDJSON exports."""
+        from datetime import datetime, timedelta
+        import pytz
+        from app.notification_sender.hourly_stats import rebuild_hourly_stats
+        from app.notification_sender.log_archive import LOG_ARCHIVE_EXPORT_DIR
+
+        start = datetime.now(pytz.utc) - timedelta(days=days) if days else None
+        read, written = rebuild_hourly_stats(start=start, export_dir=LOG_ARCHIVE_EXPORT_DIR if exports else None)
+        print(f"Rebuilt {written} hourly stats rows from {read} alert logs.")
+
     return app
\ No newline at end of file
@@ -1,4 +1,5 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, session, current_app
+import time
 from datetime import datetime
 import pytz # Added import for pytz
 from sqlalchemy import func
@@ -8,6 +9,10 @@ import os
 from werkzeug.utils import secure_filename
 from app.notification_sender.models import AlertConfig, AlertLog,AlertSample,AlertService
 from app.notification_sender.views.alert_views import LOCAL_TZ # Import LOCAL_TZ
+from app.notification_sender.media_store import store_upload, release_profile_pic, profile_pic_path
+from app.pagination import keyset_paginate, count_capped, PAGINATION_COUNT_LIMIT
+from app.notification_sender.hourly_stats import hourly_totals
+from app.dashboard_cache import get_fragments, invalidate_dashboard
 import logging
 
 frontend_bp = Blueprint('frontend', __name__, template_folder='../../templates/auth')
@@ -55,80 +60,30 @@ def logout():
 
 
 # -------------------- Dashboard --------------------
-@frontend_bp.route('/')
-def dashboard():
-    log.info("Dashboard route started.")
-    start_time = datetime.now()
-
-    user_id = session.get('user_id')
-    current_user = None
-    if user_id:
-        current_user = User.query.get(user_id)
-
-    if not current_user:
-        flash("You must be logged in to view this page.", "danger")
-        return redirect(url_for('frontend.login'))
-
-    approved_users = User.query.filter_by(is_approved=True).all()
-
-    pending_users = []
-    if current_user.role == 'admin':
-        pending_users = User.query.filter_by(is_approved=False).all()
+# Each fragment below is cached in Redis by app/dashboard_cache.py and rebuilt only after it is invalidated or expires
 
+def _today_utc_range():
     today = datetime.now(LOCAL_TZ).date() # Get today's date in local timezone
 
-    # Define today's start and end in local timezone
+    # Define today's start and end in local timezone, converted to UTC for database queries
     local_today_start = LOCAL_TZ.localize(datetime.combine(today, datetime.min.time()))
     local_today_end = LOCAL_TZ.localize(datetime.combine(today, datetime.max.time()))
+    return local_today_start.astimezone(pytz.utc), local_today_end.astimezone(pytz.utc)
 
-    # Convert to UTC for database query
-    utc_today_start = local_today_start.astimezone(pytz.utc)
-    utc_today_end = local_today_end.astimezone(pytz.utc)
-
-    # Optimized query for status counts
-    status_counts = db.session.query(
-        func.count(AlertLog.id).label("total"),
-        func.count(func.nullif(AlertLog.status != 'sent', True)).label("sent"),
-        func.count(func.nullif(AlertLog.status != 'failed', True)).label("failed"),
-        func.count(func.nullif(AlertLog.status.notin_(['queued', 'scheduled']), True)).label("waiting")
-    ).filter(
-        AlertLog.scheduled_for >= utc_today_start,
-        AlertLog.scheduled_for <= utc_today_end
-    ).first()
-
-    total_scheduled_messages_today = status_counts.total
-    sent_messages_today = status_counts.sent
-    failed_messages_today = status_counts.failed
-    waiting_messages_today = status_counts.waiting
-    total_messages_for_pie_chart = sent_messages_today + failed_messages_today + waiting_messages_today
 
-    # Get the count of group names for each service
-    service_group_counts = db.session.query(
-        AlertConfig.service_name,
-        func.count(AlertConfig.group_name)
-    ).filter(AlertConfig.group_name.isnot(None)).group_by(AlertConfig.service_name).all()
-
-    # Optimized query for hourly message counts (MySQL-compatible)
-    converted_time = func.CONVERT_TZ(AlertLog.scheduled_for, 'UTC', LOCAL_TZ.zone)
-    hour_extract_func = func.extract('hour', converted_time)
-    
-    hourly_counts = db.session.query(
-        hour_extract_func.label('hour'),
-        func.count(AlertLog.id).label('total'),
-        func.count(func.nullif(AlertLog.status != 'sent', True)).label('sent')
-    ).filter(
-        AlertLog.scheduled_for >= utc_today_start,
-        AlertLog.scheduled_for <= utc_today_end
-    ).group_by(hour_extract_func).all()
-
-    # Initialize hourly data and populate with query results
+def _dashboard_counts():
+    # Today's counters from the hourly rollup (at most 24 rows per service/config, see hourly_stats.py)
+    hourly_stats = hourly_totals(*_today_utc_range())
+    return {name: sum(hour[name] for hour in hourly_stats.values()) for name in ('total', 'sent', 'failed', 'waiting')}
+
+
+def _dashboard_charts():
+    # Hourly data from the rollup, keyed by local hour
     hourly_data = {i: {'total': 0, 'sent': 0} for i in range(24)}
-    for row in hourly_counts:
-        if row.hour is not None:
-            hour = int(row.hour)
-            if 0 <= hour < 24:
-                hourly_data[hour]['total'] = row.total
-                hourly_data[hour]['sent'] = row.sent
+    for hour_start, counts in hourly_totals(*_today_utc_range()).items():
+        hour = pytz.utc.localize(hour_start).astimezone(LOCAL_TZ).hour
+        hourly_data[hour]['total'] += counts['total']
+        hourly_data[hour]['sent'] += counts['sent']
 
     # Convert hourly_data to a list of values for Chart.js
     chart_labels = []
@@ -141,28 +96,73 @@ def dashboard():
             chart_labels.append(f'{i} AM')
         else:
             chart_labels.append(f'{i - 12} PM')
-    chart_total_data = [hourly_data[i]['total'] for i in range(24)]
-    chart_sent_data = [hourly_data[i]['sent'] for i in range(24)]
+    return {
+        'labels': chart_labels,
+        'total': [hourly_data[i]['total'] for i in range(24)],
+        'sent': [hourly_data[i]['sent'] for i in range(24)],
+    }
 
-    end_time = datetime.now()
-    log.info(f"Dashboard route finished. Total time: {end_time - start_time}")
 
-    return render_template(
+def _dashboard_user_counts():
+    # Counted up to PAGINATION_COUNT_LIMIT ("1000+" beyond); the lists themselves are on the paged user pages
+    counts = {}
+    for name, approved in (('approved', True), ('pending', False)):
+        count = count_capped(User.query.filter_by(is_approved=approved))
+        counts[name] = f"{PAGINATION_COUNT_LIMIT}+" if count is None else str(count)
+    return counts
+
+
+def _dashboard_service_group_counts():
+    # Get the count of group names for each service
+    return [
+        [service_name, count] for service_name, count in db.session.query(
+            AlertConfig.service_name,
+            func.count(AlertConfig.group_name)
+        ).filter(AlertConfig.group_name.isnot(None)).group_by(AlertConfig.service_name).all()
+    ]
+
+
+@frontend_bp.route('/')
+def dashboard():
+    start_time = time.perf_counter()
+
+    user_id = session.get('user_id')
+    current_user = None
+    if user_id:
+        current_user = User.query.get(user_id)
+
+    if not current_user:
+        flash("You must be logged in to view this page.", "danger")
+        return redirect(url_for('frontend.login'))
+
+    fragments, outcomes = get_fragments({
+        'counts': _dashboard_counts,
+        'charts': _dashboard_charts,
+        'users': _dashboard_user_counts,
+        'service_groups': _dashboard_service_group_counts,
+    }, scope=datetime.now(LOCAL_TZ).date().isoformat())
+    counts = fragments['counts']
+    charts = fragments['charts']
+
+    response = render_template(
         'dashboard.html',
         current_user=current_user,
-        approved_users=approved_users,
-        pending_users=pending_users,
-        sent_messages_today=sent_messages_today,
-        total_scheduled_messages_today=total_scheduled_messages_today,
-        service_group_counts=service_group_counts,
-        chart_labels=chart_labels,
-        chart_total_data=chart_total_data,
-        chart_sent_data=chart_sent_data,
-        failed_messages_today=failed_messages_today,
-        waiting_messages_today=waiting_messages_today,
-        total_messages_for_pie_chart=total_messages_for_pie_chart
+        user_counts=fragments['users'],
+        sent_messages_today=counts['sent'],
+        total_scheduled_messages_today=counts['total'],
+        service_group_counts=fragments['service_groups'],
+        chart_labels=charts['labels'],
+        chart_total_data=charts['total'],
+        chart_sent_data=charts['sent'],
+        failed_messages_today=counts['failed'],
+        waiting_messages_today=counts['waiting'],
+        total_messages_for_pie_chart=counts['sent'] + counts['failed'] + counts['waiting']
     )
 
+    cache_summary = ", ".join(f"{name} {outcome}" for name, outcome in outcomes.items())
+    log.info(f"Dashboard rendered in {(time.perf_counter() - start_time) * 1000:.1f} ms ({cache_summary}).")
+    return response
+
 
 # -------------------- Admin Pages --------------------
 @frontend_bp.route('/users/pending')
@@ -174,13 +174,13 @@ def pending_users():
         flash("Unauthorized access.", "danger")
         return redirect(url_for('frontend.pending_users'))  
 
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = request.args.get('per_page', 10, type=int)
 
-    pending_users_pagination = User.query.filter_by(is_approved=False).order_by(User.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    pending_users_pagination = keyset_paginate(User.query.filter_by(is_approved=False), (User.id,), cursor=cursor, per_page=per_page)
     pending_users = pending_users_pagination.items
 
-    start_index = (page - 1) * per_page
+    start_index = pending_users_pagination.start
 
     return render_template('pending_users.html', users=pending_users, current_user=current_user, pending_users_pagination=pending_users_pagination, start_index=start_index)
 
@@ -194,13 +194,13 @@ def approved_users():
         flash("You must be logged in to view this page.", "danger")
         return redirect(url_for('frontend.login'))
 
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = request.args.get('per_page', 10, type=int)
 
-    approved_users_pagination = User.query.filter_by(is_approved=True).order_by(User.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    approved_users_pagination = keyset_paginate(User.query.filter_by(is_approved=True), (User.id,), cursor=cursor, per_page=per_page)
     approved_users = approved_users_pagination.items
 
-    start_index = (page - 1) * per_page
+    start_index = approved_users_pagination.start
 
     return render_template('approved_users.html', users=approved_users, current_user=current_user, approved_users_pagination=approved_users_pagination, start_index=start_index)
 
@@ -211,6 +211,7 @@ def approve_user(user_id):
         user.is_approved = True
         user.is_rejected = False
         db.session.commit()
+        invalidate_dashboard('users')
         flash(f"{user.email} approved!", "success")
     return redirect(url_for('frontend.pending_users'))
 
@@ -219,8 +220,10 @@ def approve_user(user_id):
 def reject_user(user_id):
     user = User.query.get(user_id)
     if user:
+        release_profile_pic(user.profile_pic)
         db.session.delete(user)
         db.session.commit()
+        invalidate_dashboard('users')
         flash(f"{user.email} rejected and removed!", "warning")
     else:
         flash("User not found!", "danger")
@@ -262,12 +265,9 @@ def edit_profile():
 
         profile_pic = request.files.get('profile_pic')
         if profile_pic and allowed_file(profile_pic.filename):
-            filename = secure_filename(profile_pic.filename)
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            os.makedirs(upload_folder, exist_ok=True)
-            profile_pic_path = os.path.join(upload_folder, filename)
-            profile_pic.save(profile_pic_path)
-            user.profile_pic = f"media/uploads/{filename}"
+            stored_path = store_upload(profile_pic, current_app.config['UPLOAD_FOLDER'])
+            release_profile_pic(user.profile_pic)
+            user.profile_pic = profile_pic_path(stored_path)
 
         db.session.commit()
         flash("Profile updated successfully!", "success")
@@ -340,12 +340,9 @@ def edit_user(user_id):
 
         profile_pic = request.files.get('profile_pic')
         if profile_pic and allowed_file(profile_pic.filename):
-            filename = secure_filename(profile_pic.filename)
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            os.makedirs(upload_folder, exist_ok=True)
-            profile_pic_path = os.path.join(upload_folder, filename)
-            profile_pic.save(profile_pic_path)
-            user.profile_pic = f"media/uploads/{filename}"
+            stored_path = store_upload(profile_pic, current_app.config['UPLOAD_FOLDER'])
+            release_profile_pic(user.profile_pic)
+            user.profile_pic = profile_pic_path(stored_path)
 
         new_password = request.form.get('password')
         if new_password:
@@ -353,6 +350,7 @@ def edit_user(user_id):
 
         try:
             db.session.commit()
+            invalidate_dashboard('users')
             flash("User updated successfully!", "success")
             if current_user.is_superuser and not user.is_approved:
                 return redirect(url_for('frontend.user_details', user_id=user.id))
@@ -423,8 +421,10 @@ def delete_user(user_id):
         flash("You cannot delete a superuser.", "danger")
         return redirect(url_for('frontend.approved_users'))
 
+    release_profile_pic(user.profile_pic)
     db.session.delete(user)
     db.session.commit()
+    invalidate_dashboard('users')
     flash("User deleted successfully!", "warning")
 
     return redirect(url_for('frontend.approved_users'))
@@ -460,14 +460,9 @@ def create_user():
             flash("Email already exists.", "danger")
             return redirect(url_for('frontend.create_user'))
 
-        profile_pic_path = None
+        stored_profile_pic = None
         if profile_pic and allowed_file(profile_pic.filename):
-            filename = secure_filename(profile_pic.filename)
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            os.makedirs(upload_folder, exist_ok=True)
-            profile_pic_path = os.path.join(upload_folder, filename)
-            profile_pic.save(profile_pic_path)
-            profile_pic_path = f"media/uploads/{filename}"
+            stored_profile_pic = profile_pic_path(store_upload(profile_pic, current_app.config['UPLOAD_FOLDER']))
 
         user = User(
             full_name=full_name,
@@ -478,12 +473,13 @@ def create_user():
             phone=phone,
             address=address,
             bio=bio,
-            profile_pic=profile_pic_path
+            profile_pic=stored_profile_pic
         )
         user.set_password(password)
 
         db.session.add(user)
         db.session.commit()
+        invalidate_dashboard('users')
 
         flash(f"User {full_name} created successfully!", "success")
         return redirect(url_for('frontend.approved_users'))
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from kombu import Queue
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -41,10 +42,67 @@ celery.conf.update(
     imports=('app.notification_sender.tasks',)
 )
 
+# ---------------- QUEUES & ROUTING ----------------
+# Each queue has its own worker pool (supervisord.conf), so a burst of scheduled sends never sits
+# in front of an operator's test message.
+QUEUE_INTERACTIVE = "interactive"   # operator-triggered: test sends
+QUEUE_IMMEDIATE = "immediate"       # "send now" alerts: their log creation, send and retries
+QUEUE_SCHEDULED = "scheduled"       # bulk batches claimed by the scheduler, and their retries
+QUEUE_MAINTENANCE = "maintenance"   # future samples' log creation, media processing, reconciliation, housekeeping
+QUEUE_NAMES = (QUEUE_INTERACTIVE, QUEUE_IMMEDIATE, QUEUE_SCHEDULED, QUEUE_MAINTENANCE)
+
+celery.conf.update(
+    task_queues=tuple(Queue(name, routing_key=name) for name in QUEUE_NAMES),
+    task_default_queue=QUEUE_IMMEDIATE,
+    task_routes={
+        'app.notification_sender.tasks.send_test_alert_task': {'queue': QUEUE_INTERACTIVE},
+        'app.notification_sender.tasks.send_alert_task': {'queue': QUEUE_IMMEDIATE},
+        'app.notification_sender.tasks.send_alert_batch_task': {'queue': QUEUE_SCHEDULED},
+        # create_sample publishes "send now" samples to QUEUE_IMMEDIATE explicitly
+        'app.notification_sender.tasks.process_sample_creation_task': {'queue': QUEUE_MAINTENANCE},
+        'app.notification_sender.tasks.process_sample_media_task': {'queue': QUEUE_MAINTENANCE},
+        'app.notification_sender.tasks.check_scheduled_alerts': {'queue': QUEUE_MAINTENANCE},
+        'app.notification_sender.tasks.report_queue_depths': {'queue': QUEUE_MAINTENANCE},
+        'app.notification_sender.tasks.archive_old_logs_task': {'queue': QUEUE_MAINTENANCE},
+    },
+)
+
+
+def queue_depths():
+    """
+    Returns the number of messages waiting in each queue (reserved/running tasks are not counted).
+    """
+    depths = {}
+    with celery.connection_for_read() as connection:
+        channel = connection.default_channel
+        for name in QUEUE_NAMES:
+            try:
+                depths[name] = channel.queue_declare(queue=name, passive=True).message_count
+            except Exception:
+                depths[name] = None
+    return depths
+
+
 # ---------------- BEAT SCHEDULE ----------------
+# With the Redis delay queue (app/notification_sender/dispatcher.py) sending logs on time, this task
+# is only the DB reconciliation and can run less often; without it, it is the scheduler itself.
+DELAY_QUEUE_ENABLED = str_to_bool(os.getenv("DELAY_QUEUE_ENABLED", "true"))
+SCHEDULER_RECONCILE_INTERVAL = float(os.getenv("SCHEDULER_RECONCILE_INTERVAL", 60 if DELAY_QUEUE_ENABLED else 30))
+
+QUEUE_DEPTH_REPORT_INTERVAL = float(os.getenv("QUEUE_DEPTH_REPORT_INTERVAL", 60))
+LOG_ARCHIVE_INTERVAL = float(os.getenv("LOG_ARCHIVE_INTERVAL", 3600))  # each run moves at most LOG_ARCHIVE_MAX_BATCHES batches
+
 celery.conf.beat_schedule = {
-    'check-scheduled-alerts-every-30-seconds': {
+    'check-scheduled-alerts': {
         'task': 'app.notification_sender.tasks.check_scheduled_alerts',
-        'schedule': 30.0,
+        'schedule': SCHEDULER_RECONCILE_INTERVAL,
+    },
+    'report-queue-depths': {
+        'task': 'app.notification_sender.tasks.report_queue_depths',
+        'schedule': QUEUE_DEPTH_REPORT_INTERVAL,
+    },
+    'archive-old-logs': {
+        'task': 'app.notification_sender.tasks.archive_old_logs_task',
+        'schedule': LOG_ARCHIVE_INTERVAL,
     },
 }
\ No newline at end of file
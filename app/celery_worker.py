@@ -1,10 +1,18 @@
-from app.celery_config import celery
+from app.celery_config import celery, SCHEDULER_RECONCILE_INTERVAL, QUEUE_DEPTH_REPORT_INTERVAL, LOG_ARCHIVE_INTERVAL
 
 
 # ---------------- BEAT SCHEDULE ----------------
 celery.conf.beat_schedule = {
     "check_scheduled_alerts": {
         "task": "app.notification_sender.tasks.check_scheduled_alerts",
-        "schedule": 60.0,  # Run every 60 seconds
+        "schedule": SCHEDULER_RECONCILE_INTERVAL,  # DB reconciliation (see celery_config.py)
+    },
+    "report_queue_depths": {
+        "task": "app.notification_sender.tasks.report_queue_depths",
+        "schedule": QUEUE_DEPTH_REPORT_INTERVAL,
+    },
+    "archive_old_logs": {
+        "task": "app.notification_sender.tasks.archive_old_logs_task",
+        "schedule": LOG_ARCHIVE_INTERVAL,
     }
 }
@@ -0,0 +1,101 @@
+import os
+import json
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.redis_client import get_redis, redis_available, mark_redis_unavailable
+from app.logging_config import flask_logger
+
+# The dashboard is assembled from independently cached fragments. Each lives in Redis with its own TTL and
+# is deleted by the writes that change it, so the TTL only bounds staleness when an invalidation is missed
+# (Redis down, or a write landing between a rebuild and its SET).
+DASHBOARD_CACHE_TTLS = {
+    "counts": int(os.getenv("DASHBOARD_CACHE_COUNTS_TTL", 30)),  # today's sent/failed/waiting totals
+    "charts": int(os.getenv("DASHBOARD_CACHE_CHARTS_TTL", 60)),  # hourly activity chart
+    "users": int(os.getenv("DASHBOARD_CACHE_USERS_TTL", 600)),  # approved / pending user counts
+    "service_groups": int(os.getenv("DASHBOARD_CACHE_SERVICE_GROUPS_TTL", 600)),  # groups per service
+}
+LOG_FRAGMENTS = ("counts", "charts")  # fragments built from the hourly alert stats
+
+KEY_PREFIX = "dashcache"
+_PENDING_KEY = "dashboard_cache_pending"
+
+
+def fragment_key(name):
+    return f"{KEY_PREFIX}:{name}"
+
+
+def _decode(raw):
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def get_fragments(builders, scope):
+    """
+    Returns ({name: data}, {name: "hit" | "miss"}) for builders, a {name: callable} dict. Cached fragments are
+    read with one MGET; missing ones are built (the callable returns JSON-serializable data) and stored.
+    scope is saved with each fragment (e.g. today's date): a fragment cached for another scope is rebuilt.
+    """
+    names = list(builders)
+    cached = [None] * len(names)
+    if redis_available():
+        try:
+            cached = get_redis().mget([fragment_key(name) for name in names])
+        except redis.RedisError as e:
+            mark_redis_unavailable(e, flask_logger, "building the dashboard uncached")
+
+    values, outcomes, fresh = {}, {}, {}
+    for name, raw in zip(names, cached):
+        entry = _decode(raw)
+        if entry is not None and entry.get("scope") == scope:
+            values[name] = entry["data"]
+            outcomes[name] = "hit"
+        else:
+            values[name] = fresh[name] = builders[name]()
+            outcomes[name] = "miss"
+
+    if fresh and redis_available():
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for name, data in fresh.items():
+                pipe.set(fragment_key(name), json.dumps({"scope": scope, "data": data}), ex=DASHBOARD_CACHE_TTLS[name])
+            pipe.execute()
+        except redis.RedisError as e:
+            mark_redis_unavailable(e, flask_logger, "building the dashboard uncached")
+    return values, outcomes
+
+
+def invalidate_dashboard(*names):
+    """
+    Drops cached dashboard fragments; call it after the write that changed them is committed.
+    """
+    if not names or not redis_available():
+        return
+    try:
+        get_redis().delete(*[fragment_key(name) for name in names])
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, flask_logger, f"leaving dashboard fragments {names} to expire")
+
+
+def invalidate_after_commit(session, *names):
+    """
+    Drops the fragments once the session's transaction commits (nothing happens if it rolls back),
+    so a concurrent dashboard request cannot cache the data from before the write.
+    """
+    session.info.setdefault(_PENDING_KEY, set()).update(names)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    names = session.info.pop(_PENDING_KEY, None)
+    if names:
+        invalidate_dashboard(*sorted(names))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
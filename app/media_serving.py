@@ -0,0 +1,53 @@
+import os
+import re
+import mimetypes
+from flask import current_app, send_from_directory, abort
+from werkzeug.security import safe_join
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How /media/uploads/<path> hands out bytes:
+#   ""           - Flask streams the file itself (ETag / Last-Modified / Range handled by werkzeug)
+#   "x-accel"    - nginx: answer with X-Accel-Redirect to an internal location aliased to UPLOAD_FOLDER
+#   "x-sendfile" - Apache mod_xsendfile / lighttpd: answer with X-Sendfile and the absolute path
+MEDIA_SENDFILE_MODE = os.getenv("MEDIA_SENDFILE_MODE", "").strip().lower()
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/protected-media/")
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", 3600))  # seconds, for files whose name does not pin their content
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Content-addressed store and media pipeline outputs: the name is a hash of the bytes, so they never change
+CONTENT_ADDRESSED_RE = re.compile(r"^(cas/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}|derived/[0-9a-f]{32}\.(tg|thumb))(\.\w+)?$")
+
+
+def serve_upload(upload_folder, filename):
+    """
+    Serves an uploaded file with conditional (ETag / If-None-Match, Last-Modified) and Range support.
+    Content-addressed files get their hash as a strong ETag and a year of immutable caching,
+    so the bot API and browsers fetch them once. With MEDIA_SENDFILE_MODE set, the front proxy streams the bytes.
+    """
+    immutable = bool(CONTENT_ADDRESSED_RE.match(filename))
+
+    if MEDIA_SENDFILE_MODE == "x-accel":
+        path = safe_join(upload_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        # nginx answers Range and conditional requests itself for the internal location
+        response = current_app.response_class()
+        response.headers["X-Accel-Redirect"] = f"{MEDIA_ACCEL_PREFIX}{filename}"
+        response.headers["Content-Type"] = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE if immutable else MEDIA_CACHE_MAX_AGE
+        response.cache_control.immutable = immutable
+        return response
+
+    # Flask's USE_X_SENDFILE (set in create_app for "x-sendfile") makes send_file emit X-Sendfile instead of the body
+    response = send_from_directory(
+        upload_folder,
+        filename,
+        etag=os.path.basename(filename) if immutable else True,
+        conditional=True,
+        max_age=IMMUTABLE_MAX_AGE if immutable else MEDIA_CACHE_MAX_AGE,
+    )
+    response.cache_control.immutable = immutable
+    return response
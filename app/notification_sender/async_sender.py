@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+import aiohttp
+from app.logging_config import telegram_logger
+from app.notification_sender.rate_limiter import rate_limiter, extract_retry_after, RateLimitTimeout, RATE_LIMIT_429_RETRIES
+from app.notification_sender.telegram_bot import (
+    bot_group_api, telegram_api_base, build_group_payload,
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_UPLOAD_READ_TIMEOUT, HTTP_KEEPALIVE_IDLE
+)
+from app.notification_sender.multipart import MultipartStream
+
+ASYNC_SEND_CONCURRENCY = int(os.getenv("BOT_ASYNC_CONCURRENCY", 50))
+
+
+class AsyncTelegramBot:
+    """
+    Delivers batches of prepared group messages concurrently over one aiohttp session.
+    Each result follows TelegramBot.group_message's contract: the API's JSON reply, or a dict with "error".
+    """
+    def __init__(self, concurrency=ASYNC_SEND_CONCURRENCY, group_url=None):
+        self.concurrency = concurrency
+        self.group_url = group_url or bot_group_api
+        self.api_base = telegram_api_base
+
+    async def group_message(self, session, auth_token, group_id, message, images_path=None, full_file_path=None):
+        payload = build_group_payload(auth_token, str(group_id), message, images_path=images_path, full_file_path=full_file_path)
+        try:
+            for attempt in range(RATE_LIMIT_429_RETRIES + 1):
+                await rate_limiter.acquire_async(auth_token, payload["group_id"])
+                async with session.post(self.group_url, json=payload) as response:
+                    status = response.status
+                    headers = response.headers
+                    text = await response.text()
+                retry_after = extract_retry_after(status, headers, text)
+                if retry_after is None or attempt == RATE_LIMIT_429_RETRIES:
+                    break
+                telegram_logger.warning(f"Rate limited for group {payload['group_id']}, retrying after {retry_after}s")
+                await rate_limiter.penalize_async(auth_token, payload["group_id"], retry_after)
+
+            telegram_logger.debug(f"Telegram response status={status}, text={text}")
+            try:
+                return json.loads(text)
+            except ValueError:
+                telegram_logger.error(f"Non-JSON response from Telegram API: {text}")
+                return {
+                    "ok": False,
+                    "error": "Invalid JSON response",
+                    "status_code": status,
+                    "raw": text
+                }
+        except RateLimitTimeout as e:
+            telegram_logger.error(f"Telegram rate limit wait failed: {e}")
+            return {"ok": False, "error": str(e)}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = str(e) or e.__class__.__name__
+            telegram_logger.error(f"Telegram request failed: {error}")
+            return {"ok": False, "error": error}
+
+    async def send_media(self, session, auth_token, chat_id, file_path, kind="document", fields=None):
+        """
+        Uploads a photo or document straight to the Bot API, streamed from disk in chunks (see MultipartStream).
+        Returns the API's JSON reply, or a dict with "error".
+        """
+        method = "sendPhoto" if kind == "photo" else "sendDocument"
+        url = f"{self.api_base}/bot{auth_token}/{method}"
+        fields = dict(fields or {}, chat_id=chat_id)
+        timeout = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_UPLOAD_READ_TIMEOUT)
+        try:
+            for attempt in range(RATE_LIMIT_429_RETRIES + 1):
+                await rate_limiter.acquire_async(auth_token, chat_id)
+                # A fresh stream per attempt; the file is closed even when the request fails
+                with MultipartStream(fields, kind, file_path) as body:
+                    async with session.post(url, data=body, headers=body.headers, timeout=timeout) as response:
+                        status = response.status
+                        headers = response.headers
+                        text = await response.text()
+                retry_after = extract_retry_after(status, headers, text)
+                if retry_after is None or attempt == RATE_LIMIT_429_RETRIES:
+                    break
+                telegram_logger.warning(f"Rate limited uploading to {chat_id}, retrying after {retry_after}s")
+                await rate_limiter.penalize_async(auth_token, chat_id, retry_after)
+
+            try:
+                return json.loads(text)
+            except ValueError:
+                telegram_logger.error(f"Non-JSON response from Telegram API: {text}")
+                return {"ok": False, "error": "Invalid JSON response", "status_code": status, "raw": text}
+        except FileNotFoundError:
+            telegram_logger.error(f"File not found at {file_path} for upload.")
+            return {"ok": False, "error": "File not found"}
+        except RateLimitTimeout as e:
+            telegram_logger.error(f"Telegram rate limit wait failed: {e}")
+            return {"ok": False, "error": str(e)}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = str(e) or e.__class__.__name__
+            telegram_logger.error(f"Telegram upload failed: {error}")
+            return {"ok": False, "error": error}
+
+    async def send_batch(self, messages):
+        """
+        Sends every message (a dict of group_message keyword arguments) with at most
+        `concurrency` requests in flight. Results are returned in input order.
+        """
+        if not messages:
+            return []
+        semaphore = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=HTTP_KEEPALIVE_IDLE)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            async def send_one(item):
+                async with semaphore:
+                    return await self.group_message(session, **item)
+
+            return await asyncio.gather(*(send_one(item) for item in messages))
+
+    def send_batch_sync(self, messages):
+        """
+        Runs send_batch from synchronous code such as a Celery task.
+        """
+        return asyncio.run(self.send_batch(messages))
@@ -0,0 +1,168 @@
+import re
+import base64
+import binascii
+import mimetypes
+from sqlalchemy import func
+from sqlalchemy.orm import undefer
+from app.extensions import db
+from app.notification_sender.models import AlertSample
+from app.notification_sender.media_store import store_stream, add_reference, release, STORE_DIR, PROFILE_PIC_PREFIX
+from app.logging_config import flask_logger
+
+# Rich-text editors paste images into sample bodies as data:image/...;base64 URIs, which can make a body
+# megabytes long. On save each URI is decoded slice by slice into the upload store and replaced with the
+# file's /media/uploads/ URL. AlertSample.body_images lists the stored files the body links to; the sample
+# holds one store reference per file, so media-recount and media-gc never drop an image a body still shows.
+MEDIA_URL_PREFIX = f"/{PROFILE_PIC_PREFIX}"
+DECODE_CHUNK = 256 * 1024  # base64 characters decoded per step
+
+DATA_URI_RE = re.compile(r"data:image/([a-zA-Z0-9.+-]{1,20});base64,")
+BASE64_RUN_RE = re.compile(r"[A-Za-z0-9+/=\r\n]*")
+STORED_IMAGE_RE = re.compile(re.escape(MEDIA_URL_PREFIX) + STORE_DIR + r"/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]{1,9}")
+EXTENSIONS = {"jpeg": ".jpg", "jpg": ".jpg", "png": ".png", "gif": ".gif", "webp": ".webp", "svg+xml": ".svg", "bmp": ".bmp"}
+
+
+def _decoded_chunks(body, start, end):
+    """
+    Decodes body[start:end] from base64 DECODE_CHUNK characters at a time (carrying the remainder of each
+    slice to the next), so a large image is never held in memory as one decoded copy.
+    """
+    pending = ""
+    for offset in range(start, end, DECODE_CHUNK):
+        text = pending + body[offset:min(offset + DECODE_CHUNK, end)].replace("\r", "").replace("\n", "")
+        usable = len(text) - len(text) % 4
+        pending = text[usable:]
+        if usable:
+            yield base64.b64decode(text[:usable], validate=True)
+    if pending:
+        yield base64.b64decode(pending + "=" * (-len(pending) % 4), validate=True)
+
+
+def _extension(subtype):
+    subtype = subtype.lower()
+    return EXTENSIONS.get(subtype) or mimetypes.guess_extension(f"image/{subtype}") or ".img"
+
+
+def extract_inline_images(body, upload_folder):
+    """
+    Moves every data:image base64 URI of an HTML body into the upload store, adding a reference per image
+    (not committed). Returns (new body, stored paths in order). URIs that are not valid base64 stay as they are.
+    """
+    if not body or "data:image/" not in body:
+        return body, []
+    parts, stored, position = [], [], 0
+    for match in DATA_URI_RE.finditer(body):
+        payload_start = match.end()
+        payload_end = BASE64_RUN_RE.match(body, payload_start).end()
+        if payload_end - payload_start < 4:
+            continue
+        try:
+            path, _ = store_stream(_decoded_chunks(body, payload_start, payload_end), _extension(match.group(1)), upload_folder)
+        except (binascii.Error, ValueError) as e:
+            flask_logger.warning(f"Left an inline image in place, its base64 data is invalid: {e}")
+            continue
+        parts.append(body[position:match.start()])
+        parts.append(f"{MEDIA_URL_PREFIX}{path}")
+        position = payload_end
+        stored.append(path)
+    parts.append(body[position:])
+    return "".join(parts), stored
+
+
+def referenced_images(body):
+    """
+    Stored files an HTML body links to, as store paths.
+    """
+    return sorted({match.group(0)[len(MEDIA_URL_PREFIX):] for match in STORED_IMAGE_RE.finditer(body or "")})
+
+
+def set_sample_body(sample, body, upload_folder):
+    """
+    Sets a sample's body with its inline images moved to the store, and moves the sample's store references
+    from the images of its old body to those of the new one (not committed). Returns the extracted paths.
+    Call it once the request is validated: the files are written before the commit, and a rollback leaves
+    them to collect_garbage's orphan sweep.
+    """
+    body, extracted = extract_inline_images(body, upload_folder)
+    held = {}
+    for path in (sample.body_images or "").split() + extracted:
+        held[path] = held.get(path, 0) + 1
+
+    linked = set()
+    for path in referenced_images(body):
+        # An image linked without a reference yet (e.g. copied from another sample's body) gets one
+        if path in held or add_reference(path):
+            linked.add(path)
+    for path, count in held.items():
+        for _ in range(count - (1 if path in linked else 0)):
+            release(path)
+
+    sample.body = body
+    sample.body_images = "\n".join(sorted(linked)) or None
+    return extracted
+
+
+def release_body_images(sample):
+    """
+    Drops the sample's references to the images of its body (not committed), e.g. before deleting it.
+    """
+    for path in (sample.body_images or "").split():
+        release(path)
+    sample.body_images = None
+
+
+def body_size_stats():
+    """
+    Size of the sample bodies: count, average / largest / total bytes, bodies still holding data:image URIs,
+    and on MySQL the table's average row length from information_schema (an estimate refreshed by ANALYZE TABLE).
+    """
+    samples, average, largest, total = db.session.query(
+        func.count(AlertSample.id),
+        func.avg(func.length(AlertSample.body)),
+        func.max(func.length(AlertSample.body)),
+        func.sum(func.length(AlertSample.body)),
+    ).one()
+    inline = db.session.query(func.count(AlertSample.id)).filter(AlertSample.body.like("%data:image/%")).scalar()
+    stats = {
+        "samples": samples,
+        "avg_body_bytes": int(average or 0),
+        "max_body_bytes": int(largest or 0),
+        "total_body_bytes": int(total or 0),
+        "bodies_with_inline_images": inline,
+        "table_avg_row_length": None,
+    }
+    if db.engine.dialect.name == "mysql":
+        stats["table_avg_row_length"] = db.session.execute(db.text(
+            "SELECT AVG_ROW_LENGTH FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ), {"table": AlertSample.__tablename__}).scalar()
+    return stats
+
+
+def extract_existing_body_images(upload_folder, batch_size=50):
+    """
+    One-off migration: moves the inline images of stored sample bodies to the upload store, batch_size samples
+    (with their bodies) per transaction. Returns the images extracted, samples changed and body sizes before / after.
+    """
+    before = body_size_stats()
+    last_id, changed, extracted = 0, 0, 0
+    while True:
+        ids = [row.id for row in db.session.query(AlertSample.id).filter(
+            AlertSample.id > last_id,
+            AlertSample.body.like("%data:image/%")
+        ).order_by(AlertSample.id).limit(batch_size)]
+        if not ids:
+            break
+        for sample in AlertSample.query.options(undefer(AlertSample.body)).filter(AlertSample.id.in_(ids)):
+            images = set_sample_body(sample, sample.body, upload_folder)
+            if images:
+                changed += 1
+                extracted += len(images)
+        db.session.commit()
+        db.session.expunge_all()  # release the bodies of the batch
+        last_id = ids[-1]
+    after = body_size_stats()
+    flask_logger.info(
+        f"Extracted {extracted} inline images from {changed} sample bodies; "
+        f"average body {before['avg_body_bytes']} -> {after['avg_body_bytes']} bytes."
+    )
+    return {"images": extracted, "samples": changed, "before": before, "after": after}
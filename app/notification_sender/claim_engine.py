@@ -0,0 +1,164 @@
+import os
+import time
+import uuid
+import pytz
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.notification_sender.models import AlertLog
+from app.notification_sender.hourly_stats import transition_rows, record_transitions
+from app.logging_config import scheduled_alerts_logger
+
+CLAIM_BATCH_SIZE = int(os.getenv("SCHEDULER_CLAIM_BATCH_SIZE", 500))
+LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", 900))
+
+
+def _expire_leases(status, now, values):
+    """
+    Applies values to the logs in status whose lease ran out (not committed). Returns the number of rows changed.
+    """
+    rows = transition_rows(AlertLog.query.filter(
+        AlertLog.status == status,
+        AlertLog.lease_expires_at.isnot(None),
+        AlertLog.lease_expires_at < now
+    ).with_for_update())
+    if not rows:
+        return 0
+    updated = AlertLog.query.filter(
+        AlertLog.id.in_([row.id for row in rows]),
+        AlertLog.status == status
+    ).update(values, synchronize_session=False)
+    record_transitions(rows, values[AlertLog.status])
+    return updated
+
+
+def release_expired_leases(now=None):
+    """
+    Puts logs whose claim lease ran out (e.g. the dispatching scheduler died) back in the queue,
+    and fails logs whose delivery lease ran out mid-send. Returns the number of re-queued rows.
+    """
+    now = now or datetime.now(pytz.utc)
+    released = _expire_leases('sending', now, {
+        AlertLog.status: 'queued',
+        AlertLog.claim_token: None,
+        AlertLog.lease_expires_at: None
+    })
+    # A worker that died while delivering may or may not have sent the message; failing the log
+    # (instead of queueing it again) keeps delivery at most once
+    lost = _expire_leases('delivering', now, {
+        AlertLog.status: 'failed',
+        AlertLog.error_message: 'Delivery outcome unknown: the sending worker stopped before recording a result',
+        AlertLog.claim_token: None,
+        AlertLog.lease_expires_at: None
+    })
+    db.session.commit()
+    if released:
+        scheduled_alerts_logger.warning(f"Released {released} logs with expired claim leases.")
+    if lost:
+        scheduled_alerts_logger.error(f"Marked {lost} logs failed whose delivery lease expired mid-send.")
+    return released
+
+
+def _mark_claimed(rows, token, now, lease_seconds):
+    """
+    Marks the selected (id, sample_id, scheduled_for) rows 'sending' under the claim token (not committed).
+    Returns the rows actually claimed. queued -> sending leaves the hourly stats unchanged (both count as waiting).
+    """
+    claimed = list(rows)
+    if not claimed:
+        return claimed
+    # The status guard keeps the claim exclusive on backends without row locks
+    updated = AlertLog.query.filter(
+        AlertLog.id.in_([row.id for row in claimed]),
+        AlertLog.status == 'queued'
+    ).update({
+        AlertLog.status: 'sending',
+        AlertLog.claim_token: token,
+        AlertLog.lease_expires_at: now + timedelta(seconds=lease_seconds)
+    }, synchronize_session=False)
+    if updated != len(claimed):
+        claimed = db.session.query(AlertLog.id, AlertLog.sample_id, AlertLog.scheduled_for).filter(
+            AlertLog.claim_token == token
+        ).all()
+    return claimed
+
+
+def _claim_result(token, rows, requested, started):
+    return {
+        "token": token,
+        "claimed": [(row.id, row.sample_id) for row in rows],
+        "scheduled_for": {row.id: row.scheduled_for for row in rows},
+        "requested": requested,
+        "claim_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+def claim_due_logs(batch_size=CLAIM_BATCH_SIZE, lease_seconds=LEASE_SECONDS, now=None, due_before=None):
+    """
+    Atomically claims up to batch_size due logs for this scheduler.
+
+    The due rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so parallel schedulers
+    never wait on or claim each other's rows, and are then marked 'sending' with a single
+    bulk UPDATE carrying a claim token and a lease expiry.
+    due_before (default now) limits the claim to logs scheduled up to that time.
+
+    Returns a dict with the claim token, the claimed (log_id, sample_id) pairs,
+    their scheduled_for keyed by log id and timing stats.
+    """
+    now = now or datetime.now(pytz.utc)
+    token = uuid.uuid4().hex
+    started = time.perf_counter()
+
+    try:
+        rows = db.session.query(AlertLog.id, AlertLog.sample_id, AlertLog.scheduled_for).filter(
+            AlertLog.status == 'queued',
+            AlertLog.scheduled_for <= (due_before or now)
+        ).order_by(
+            AlertLog.scheduled_for, AlertLog.id
+        ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+        claimed = _mark_claimed(rows, token, now, lease_seconds)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return _claim_result(token, claimed, batch_size, started)
+
+
+def claim_logs(log_ids, lease_seconds=LEASE_SECONDS, now=None):
+    """
+    Claims the given logs (popped from the delay queue) if they are still queued.
+    Logs already claimed elsewhere, sent or deleted are skipped. Returns the same dict as claim_due_logs.
+    """
+    now = now or datetime.now(pytz.utc)
+    token = uuid.uuid4().hex
+    started = time.perf_counter()
+
+    try:
+        rows = db.session.query(AlertLog.id, AlertLog.sample_id, AlertLog.scheduled_for).filter(
+            AlertLog.id.in_(log_ids),
+            AlertLog.status == 'queued'
+        ).order_by(AlertLog.id).with_for_update(skip_locked=True).all()
+        claimed = _mark_claimed(rows, token, now, lease_seconds)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return _claim_result(token, claimed, len(log_ids), started)
+
+
+def mark_dispatch_failed(log_ids):
+    """
+    Bulk-marks logs whose task could not be published.
+    """
+    if not log_ids:
+        return 0
+    rows = transition_rows(AlertLog.query.filter(AlertLog.id.in_(log_ids)).with_for_update())
+    updated = AlertLog.query.filter(AlertLog.id.in_(log_ids)).update({
+        AlertLog.status: 'dispatch_failed',
+        AlertLog.lease_expires_at: None
+    }, synchronize_session=False)
+    record_transitions(rows, 'dispatch_failed')
+    db.session.commit()
+    return updated
@@ -0,0 +1,93 @@
+import pytz
+from datetime import datetime
+from sqlalchemy import func
+from app.extensions import db
+from app.notification_sender.models import AlertLog, AlertDeadLetter
+from app.notification_sender.log_profiles import bare_profile
+from app.notification_sender.retry_policy import PERMANENT
+from app.logging_config import celery_logger
+
+REPLAY_LIMIT = 1000  # logs re-queued per replay call
+
+
+def dead_letter(log, failure, attempts, error_message=None):
+    """
+    Marks a log failed for good and records it in the dead-letter store (not committed).
+    Permanent errors land here on their first attempt; transient ones once their attempts run out.
+    """
+    reason = "permanent" if failure.kind == PERMANENT else "exhausted"
+    log.status = "failed"
+    log.error_message = error_message or failure.message
+    log.retry_count = attempts
+    log.claim_token = None
+    log.lease_expires_at = None
+    db.session.add(AlertDeadLetter(
+        log_id=log.id,
+        sample_id=log.sample_id,
+        reason=reason,
+        error_message=log.error_message,
+        attempts=attempts,
+    ))
+    celery_logger.warning(f"Log {log.id} dead-lettered ({reason}) after {attempts} attempt(s): {log.error_message}")
+
+
+def pending_dead_letters(reason=None, sample_id=None, limit=100, before_id=None):
+    """
+    Returns dead letters that were not replayed yet, newest first.
+    """
+    query = AlertDeadLetter.query.filter(AlertDeadLetter.replayed_at.is_(None))
+    if reason:
+        query = query.filter(AlertDeadLetter.reason == reason)
+    if sample_id:
+        query = query.filter(AlertDeadLetter.sample_id == sample_id)
+    if before_id:
+        query = query.filter(AlertDeadLetter.id < before_id)
+    return query.order_by(AlertDeadLetter.id.desc()).limit(limit).all()
+
+
+def dead_letter_summary():
+    """
+    Counts pending dead letters per reason and error message, for bulk inspection.
+    """
+    rows = db.session.query(
+        AlertDeadLetter.reason, AlertDeadLetter.error_message, func.count(AlertDeadLetter.id)
+    ).filter(
+        AlertDeadLetter.replayed_at.is_(None)
+    ).group_by(AlertDeadLetter.reason, AlertDeadLetter.error_message).order_by(func.count(AlertDeadLetter.id).desc()).all()
+    return [{"reason": reason, "error_message": message, "count": count} for reason, message, count in rows]
+
+
+def replay_dead_letters(dead_letter_ids=None, reason=None, sample_id=None, limit=REPLAY_LIMIT):
+    """
+    Queues the logs of pending dead letters again (due now, attempts reset) and marks the entries replayed.
+    Selects by ids, or by reason / sample. Returns the number of logs re-queued.
+    """
+    query = AlertDeadLetter.query.filter(AlertDeadLetter.replayed_at.is_(None))
+    if dead_letter_ids:
+        query = query.filter(AlertDeadLetter.id.in_(dead_letter_ids))
+    if reason:
+        query = query.filter(AlertDeadLetter.reason == reason)
+    if sample_id:
+        query = query.filter(AlertDeadLetter.sample_id == sample_id)
+    entries = query.order_by(AlertDeadLetter.id).limit(limit).all()
+    if not entries:
+        return 0
+
+    now = datetime.now(pytz.utc)
+    logs = {log.id: log for log in AlertLog.query.options(*bare_profile()).filter(
+        AlertLog.id.in_({entry.log_id for entry in entries})
+    )}
+    requeued = 0
+    for entry in entries:
+        entry.replayed_at = now
+        log = logs.get(entry.log_id)
+        if log is None or log.status != "failed":
+            continue
+        log.status = "queued"
+        log.scheduled_for = now
+        log.retry_count = 0
+        log.error_message = None
+        requeued += 1
+    db.session.commit()
+    celery_logger.info(f"Replayed {len(entries)} dead letters, {requeued} logs queued again.")
+    return requeued
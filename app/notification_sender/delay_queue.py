@@ -0,0 +1,193 @@
+import os
+import time
+import pytz
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app.celery_config import DELAY_QUEUE_ENABLED
+from app.redis_client import get_redis, redis_available, mark_redis_unavailable
+from app.notification_sender.models import AlertLog
+from app.logging_config import scheduled_alerts_logger
+
+# Queued AlertLogs wait in a Redis sorted set scored by scheduled_for (epoch seconds); the dispatcher
+# pops what is due and the periodic DB reconciliation catches anything Redis missed.
+DELAY_QUEUE_KEY = os.getenv("DELAY_QUEUE_KEY", "alerts:delay")
+LAG_KEY_PREFIX = "scheduler:lag"
+
+# Upper bounds (ms) of the scheduler lag histogram buckets
+LAG_BUCKETS_MS = (100, 250, 500, 1000, 5000, 30000, 60000)
+
+# Atomically removes and returns up to ARGV[2] members scored <= ARGV[1], so parallel dispatchers never pop the same log
+POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, tonumber(ARGV[2]))
+for i = 1, #due, 2 do
+    redis.call('ZREM', KEYS[1], due[i])
+end
+return due
+"""
+
+# ARGV: count, sum_ms, max_ms, then bucket field / increment pairs
+RECORD_LAG_SCRIPT = """
+redis.call('HINCRBY', KEYS[1], 'count', ARGV[1])
+redis.call('HINCRBYFLOAT', KEYS[1], 'sum_ms', ARGV[2])
+local current = tonumber(redis.call('HGET', KEYS[1], 'max_ms') or '0')
+if tonumber(ARGV[3]) > current then
+    redis.call('HSET', KEYS[1], 'max_ms', ARGV[3])
+end
+for i = 4, #ARGV, 2 do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+_scripts = {}
+_local_lag = {}
+
+PENDING_INFO_KEY = "delay_queue_pending"
+
+
+def _script(name, source):
+    if name not in _scripts:
+        _scripts[name] = get_redis().register_script(source)
+    return _scripts[name]
+
+
+def to_score(scheduled_for):
+    """
+    Epoch seconds of a scheduled_for value (naive values are UTC, as stored); None means due now.
+    """
+    if scheduled_for is None:
+        return time.time()
+    if scheduled_for.tzinfo is None:
+        scheduled_for = pytz.utc.localize(scheduled_for)
+    return scheduled_for.timestamp()
+
+
+def schedule_logs(entries):
+    """
+    Adds (log_id, scheduled_for) pairs to the delay queue; re-adding a log just moves it.
+    Returns False when Redis is unavailable (the DB reconciliation will pick the logs up).
+    """
+    if not (DELAY_QUEUE_ENABLED and entries and redis_available()):
+        return False
+    try:
+        get_redis().zadd(DELAY_QUEUE_KEY, {str(log_id): to_score(scheduled_for) for log_id, scheduled_for in entries})
+        return True
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, scheduled_alerts_logger, "leaving queued logs to the DB reconciliation")
+        return False
+
+
+def pop_due(limit, now=None):
+    """
+    Pops up to `limit` due entries. Returns [(log_id, score)] ordered by score.
+    """
+    if not redis_available():
+        return []
+    now = now if now is not None else time.time()
+    try:
+        flat = _script("pop_due", POP_DUE_SCRIPT)(keys=[DELAY_QUEUE_KEY], args=[now, limit])
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, scheduled_alerts_logger, "leaving queued logs to the DB reconciliation")
+        return []
+    return [(int(flat[i]), float(flat[i + 1])) for i in range(0, len(flat), 2)]
+
+
+def seconds_until_next(now=None):
+    """
+    Seconds until the earliest entry is due (0 if one is already due), or None when the queue is empty.
+    """
+    if not redis_available():
+        return None
+    now = now if now is not None else time.time()
+    try:
+        first = get_redis().zrange(DELAY_QUEUE_KEY, 0, 0, withscores=True)
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, scheduled_alerts_logger, "leaving queued logs to the DB reconciliation")
+        return None
+    if not first:
+        return None
+    return max(first[0][1] - now, 0.0)
+
+
+def queue_size():
+    return get_redis().zcard(DELAY_QUEUE_KEY)
+
+
+def record_lag(lags_ms, source):
+    """
+    Records scheduler lag (dispatch time minus scheduled_for) for a dispatched batch,
+    in this process and in a shared Redis histogram per source ('delay_queue', 'reconcile' or 'poll').
+    """
+    if not lags_ms:
+        return
+    buckets = {}
+    for lag in lags_ms:
+        bucket = next((f"le_{bound}" for bound in LAG_BUCKETS_MS if lag <= bound), "le_inf")
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+
+    local = _local_lag.setdefault(source, {"count": 0, "sum_ms": 0.0, "max_ms": 0.0})
+    local["count"] += len(lags_ms)
+    local["sum_ms"] += sum(lags_ms)
+    local["max_ms"] = max(local["max_ms"], max(lags_ms))
+
+    if not redis_available():
+        return
+    args = [len(lags_ms), round(sum(lags_ms), 3), round(max(lags_ms), 3)]
+    for bucket, count in buckets.items():
+        args.extend([bucket, count])
+    try:
+        _script("record_lag", RECORD_LAG_SCRIPT)(keys=[f"{LAG_KEY_PREFIX}:{source}"], args=args)
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, scheduled_alerts_logger, "keeping scheduler lag metrics in process only")
+
+
+def lag_stats():
+    """
+    Returns this process' lag counters, the shared lag histograms and the delay queue state.
+    """
+    stats = {"process": {}, "shared": {}, "queue": None}
+    for source, values in _local_lag.items():
+        stats["process"][source] = dict(values, avg_ms=values["sum_ms"] / values["count"] if values["count"] else 0.0)
+    try:
+        client = get_redis()
+        for source in ("delay_queue", "reconcile", "poll"):
+            shared = client.hgetall(f"{LAG_KEY_PREFIX}:{source}")
+            if not shared:
+                continue
+            values = {key: float(value) for key, value in shared.items()}
+            values["avg_ms"] = values["sum_ms"] / values["count"] if values.get("count") else 0.0
+            stats["shared"][source] = values
+        stats["queue"] = {"size": queue_size(), "next_due_in": seconds_until_next()}
+    except redis.RedisError:
+        stats["shared"] = None
+    return stats
+
+
+# --- Populating the queue -------------------------------------------------------------------------
+# Every AlertLog inserted or updated as 'queued' through the ORM is collected during the flush and
+# added to the queue once the transaction commits, so callers never have to remember to do it.
+
+def _collect_queued_log(mapper, connection, target):
+    if target.status != "queued":
+        return
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(PENDING_INFO_KEY, {})[target.id] = target.scheduled_for
+
+
+def _flush_pending(session):
+    pending = session.info.pop(PENDING_INFO_KEY, None)
+    if pending:
+        schedule_logs(list(pending.items()))
+
+
+def _drop_pending(session, *args):
+    session.info.pop(PENDING_INFO_KEY, None)
+
+
+if DELAY_QUEUE_ENABLED:
+    event.listen(AlertLog, "after_insert", _collect_queued_log)
+    event.listen(AlertLog, "after_update", _collect_queued_log)
+    event.listen(Session, "after_commit", _flush_pending)
+    event.listen(Session, "after_soft_rollback", _drop_pending)
@@ -0,0 +1,88 @@
+import os
+import time
+import signal
+import pytz
+from datetime import datetime
+from app.worker_app import get_worker_app
+from app.notification_sender.delay_queue import DELAY_QUEUE_ENABLED, pop_due, seconds_until_next, schedule_logs, record_lag
+from app.notification_sender.claim_engine import CLAIM_BATCH_SIZE, claim_logs, mark_dispatch_failed
+from app.notification_sender.tasks import dispatch_claimed_batch, dispatch_lags_ms
+from app.logging_config import scheduled_alerts_logger
+
+# Longest the dispatcher sleeps between polls of the delay queue (also bounds how late a newly
+# added, earlier-than-everything entry can be noticed)
+DISPATCHER_POLL_INTERVAL = float(os.getenv("DISPATCHER_POLL_INTERVAL", 0.25))
+
+_stopping = False
+
+
+def _request_stop(signum, frame):
+    global _stopping
+    _stopping = True
+    scheduled_alerts_logger.info(f"Dispatcher received signal {signum}, stopping after the current batch.")
+
+
+def dispatch_due(batch_size=CLAIM_BATCH_SIZE):
+    """
+    Pops due entries from the delay queue, claims the logs that are still queued and publishes them.
+    Returns the number of entries popped.
+    """
+    entries = pop_due(batch_size)
+    if not entries:
+        return 0
+
+    log_ids = [log_id for log_id, _ in entries]
+    try:
+        claim = claim_logs(log_ids)
+    except Exception as e:
+        # Put the entries back so the next poll (or the reconciliation) retries them
+        scheduled_alerts_logger.exception(f"Error claiming {len(log_ids)} logs popped from the delay queue: {e}")
+        schedule_logs([(log_id, datetime.fromtimestamp(score, pytz.utc)) for log_id, score in entries])
+        return 0
+
+    claimed = claim["claimed"]
+    if claimed:
+        failed_log_ids = dispatch_claimed_batch(claimed)
+        if failed_log_ids:
+            mark_dispatch_failed(failed_log_ids)
+        lags = dispatch_lags_ms(claim, datetime.now(pytz.utc))
+        record_lag(lags, "delay_queue")
+        if lags:
+            scheduled_alerts_logger.info(
+                f"Dispatched {len(claimed)}/{len(entries)} due logs from the delay queue, "
+                f"lag avg {sum(lags) / len(lags):.0f} ms, max {max(lags):.0f} ms."
+            )
+    return len(entries)
+
+
+def run_dispatcher(poll_interval=DISPATCHER_POLL_INTERVAL):
+    """
+    Runs the delay queue dispatcher until SIGTERM/SIGINT.
+    Sleeps until the earliest entry is due (at most poll_interval), so logs go out within a
+    fraction of a second of their scheduled_for instead of on the next beat tick.
+    """
+    if not DELAY_QUEUE_ENABLED:
+        scheduled_alerts_logger.warning("DELAY_QUEUE_ENABLED is off; the dispatcher has nothing to do.")
+        return
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    app = get_worker_app()
+    scheduled_alerts_logger.info(f"Delay queue dispatcher started (poll interval {poll_interval}s).")
+    while not _stopping:
+        try:
+            with app.app_context():
+                popped = dispatch_due()
+        except Exception as e:
+            scheduled_alerts_logger.exception(f"Error in delay queue dispatcher: {e}")
+            popped = 0
+        if popped:
+            continue
+        wait = seconds_until_next()
+        time.sleep(poll_interval if wait is None else min(wait, poll_interval))
+    scheduled_alerts_logger.info("Delay queue dispatcher stopped.")
+
+
+if __name__ == "__main__":
+    run_dispatcher()
@@ -0,0 +1,169 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import redis
+from app.redis_client import get_redis, redis_available, mark_redis_unavailable
+from app.logging_config import telegram_logger
+
+# Telegram file_ids of uploaded media, per (bot token, media kind, file content hash).
+# A file_id is only valid for the bot that uploaded it, and sendPhoto / sendDocument ids are not interchangeable.
+FILE_ID_CACHE_TTL = int(os.getenv("FILE_ID_CACHE_TTL", 30 * 24 * 3600))  # seconds a file_id is reused before uploading again
+FILE_ID_CACHE_LOCAL_SIZE = int(os.getenv("FILE_ID_CACHE_LOCAL_SIZE", 1024))  # entries kept in process memory (LRU)
+FILE_DIGEST_MEMO_SIZE = int(os.getenv("FILE_DIGEST_MEMO_SIZE", 4096))  # file digests kept in process memory (LRU)
+
+KEY_PREFIX = "fileid"
+STATS_KEY = f"{KEY_PREFIX}:stats"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_local = OrderedDict()
+_digests = OrderedDict()  # file path -> (mtime_ns, size, sha256), so unchanged files are hashed once
+_local_lock = threading.Lock()
+_local_stats = {"hits": 0, "misses": 0, "stale": 0, "bytes_saved": 0, "upload_ms_saved": 0}
+
+
+def _bot_key(auth_token):
+    # Never keep bot tokens in Redis keys
+    return hashlib.sha256(auth_token.encode("utf-8")).hexdigest()[:16]
+
+
+def _cache_key(auth_token, kind, digest):
+    return f"{KEY_PREFIX}:{_bot_key(auth_token)}:{kind}:{digest}"
+
+
+def file_digest(file_path):
+    """
+    Returns (sha256, size) of a file. The hash is recomputed only when the file's mtime or size changes,
+    so a re-uploaded file under the same name gets a new digest (and a new file_id).
+    """
+    stat = os.stat(file_path)
+    with _local_lock:
+        memo = _digests.get(file_path)
+        if memo is not None:
+            _digests.move_to_end(file_path)
+    if memo and memo[0] == stat.st_mtime_ns and memo[1] == stat.st_size:
+        return memo[2], stat.st_size
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    with _local_lock:
+        _digests[file_path] = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+        _digests.move_to_end(file_path)
+        while len(_digests) > FILE_DIGEST_MEMO_SIZE:
+            _digests.popitem(last=False)
+    return digest.hexdigest(), stat.st_size
+
+
+def _remember_local(key, entry):
+    with _local_lock:
+        _local[key] = entry
+        _local.move_to_end(key)
+        while len(_local) > FILE_ID_CACHE_LOCAL_SIZE:
+            _local.popitem(last=False)
+
+
+def _count(**increments):
+    with _local_lock:
+        for stat, value in increments.items():
+            _local_stats[stat] += value
+    if not redis_available():
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for stat, value in increments.items():
+            pipe.hincrby(STATS_KEY, stat, int(value))
+        pipe.execute()
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, telegram_logger, "keeping file_id counters in process only")
+
+
+def lookup(auth_token, kind, digest):
+    """
+    Returns the cached entry ({"file_id", "size", "upload_ms"}) for this bot and file content, or None.
+    """
+    key = _cache_key(auth_token, kind, digest)
+    with _local_lock:
+        entry = _local.get(key)
+        if entry is not None:
+            _local.move_to_end(key)
+    if entry is None and redis_available():
+        try:
+            cached = get_redis().get(key)
+            if cached:
+                entry = json.loads(cached)
+                _remember_local(key, entry)
+        except redis.RedisError as e:
+            mark_redis_unavailable(e, telegram_logger, "uploading media without the shared file_id cache")
+        except ValueError:
+            entry = None
+    return entry
+
+
+def record_hit(entry):
+    _count(hits=1, bytes_saved=entry.get("size", 0), upload_ms_saved=entry.get("upload_ms", 0))
+
+
+def store(auth_token, kind, digest, file_id, size, upload_ms):
+    """
+    Remembers the file_id Telegram returned for an upload, with the size and upload time it saves on reuse.
+    """
+    key = _cache_key(auth_token, kind, digest)
+    entry = {"file_id": file_id, "size": size, "upload_ms": round(upload_ms)}
+    _remember_local(key, entry)
+    _count(misses=1)
+    if not redis_available():
+        return
+    try:
+        get_redis().set(key, json.dumps(entry), ex=FILE_ID_CACHE_TTL)
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, telegram_logger, "uploading media without the shared file_id cache")
+
+
+def forget(auth_token, kind, digest):
+    """
+    Drops a file_id Telegram no longer accepts, so the next send uploads the file again.
+    """
+    key = _cache_key(auth_token, kind, digest)
+    with _local_lock:
+        _local.pop(key, None)
+    _count(stale=1)
+    if not redis_available():
+        return
+    try:
+        get_redis().delete(key)
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, telegram_logger, f"leaving the stale {kind} file_id {digest[:12]} in the shared cache")
+
+
+def extract_file_id(kind, response):
+    """
+    Returns the file_id from a successful sendPhoto / sendDocument reply (the largest photo size), or None.
+    """
+    result = response.get("result") if isinstance(response, dict) else None
+    if not isinstance(result, dict):
+        return None
+    if kind == "photo" and result.get("photo"):
+        return result["photo"][-1].get("file_id")
+    # Telegram may file a document under animation / video / audio depending on its type
+    for field in (kind, "document", "animation", "video", "audio"):
+        media = result.get(field)
+        if isinstance(media, dict) and media.get("file_id"):
+            return media["file_id"]
+    return None
+
+
+def file_id_stats():
+    """
+    Returns this process' counters and the shared counters of all workers:
+    cache hits, uploads, stale ids, bytes not uploaded and upload time avoided (ms).
+    """
+    with _local_lock:
+        stats = {"process": dict(_local_stats)}
+    try:
+        stats["shared"] = {key: int(value) for key, value in get_redis().hgetall(STATS_KEY).items()}
+    except redis.RedisError:
+        stats["shared"] = None
+    return stats
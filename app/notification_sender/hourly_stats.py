@@ -0,0 +1,226 @@
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from app.extensions import db
+from app.notification_sender.models import AlertLog, AlertLogArchive, AlertStatsHourly
+from app.notification_sender.recurrence import to_naive_utc
+from app.notification_sender.log_archive import iter_exported_logs, LOG_ARCHIVE_EXPORT_DIR
+from app.dashboard_cache import LOG_FRAGMENTS, invalidate_dashboard, invalidate_after_commit
+from app.logging_config import flask_logger
+
+# alert_stats_hourly holds, per UTC hour of scheduled_for, service and config, how many logs are in each
+# dashboard state. Every status change applies a -1 / +1 delta in the same transaction:
+#   - ORM changes (log.status = ..., new logs, session.delete(log)) through the before_flush hook below;
+#   - bulk UPDATE / DELETE statements through record_transitions, called next to them.
+# Archiving a log is not a change: its counts stay, so the dashboard and reports keep the history.
+COUNTERS = ("total", "sent", "failed", "waiting")
+WAITING_STATUSES = ("queued", "sending")  # not attempted yet; so a scheduler claim changes no counter
+TRACKED_ATTRIBUTES = ("status", "scheduled_for", "service_id", "config_id")
+REBUILD_CHUNK = 10000
+
+
+def hour_bucket(scheduled_for):
+    scheduled_for = to_naive_utc(scheduled_for)
+    return scheduled_for.replace(minute=0, second=0, microsecond=0) if scheduled_for else None
+
+
+def _counts(status):
+    return (1, int(status == "sent"), int(status == "failed"), int(status in WAITING_STATUSES))
+
+
+def _add(deltas, scheduled_for, service_id, config_id, status, sign):
+    hour = hour_bucket(scheduled_for)
+    if hour is None:
+        return  # unscheduled logs never show on the dashboard
+    key = (hour, service_id or 0, config_id or 0)
+    current = deltas.get(key, (0, 0, 0, 0))
+    deltas[key] = tuple(value + sign * count for value, count in zip(current, _counts(status)))
+
+
+def apply_deltas(connection, deltas):
+    """
+    Adds counter deltas keyed by (hour, service_id, config_id) with one upsert statement.
+    Keys are applied in sorted order, so concurrent transactions lock the counter rows in the same order.
+    """
+    rows = [
+        dict(zip(("hour_start", "service_id", "config_id") + COUNTERS, key + values))
+        for key, values in sorted(deltas.items()) if any(values)
+    ]
+    if not rows:
+        return
+    table = AlertStatsHourly.__table__
+    if connection.dialect.name == "mysql":
+        stmt = mysql_insert(table)
+        stmt = stmt.on_duplicate_key_update({name: table.c[name] + stmt.inserted[name] for name in COUNTERS})
+    else:
+        stmt = (postgresql_insert if connection.dialect.name == "postgresql" else sqlite_insert)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["hour_start", "service_id", "config_id"],
+            set_={name: table.c[name] + stmt.excluded[name] for name in COUNTERS}
+        )
+    connection.execute(stmt, rows)
+
+
+def _apply_in_session(session, deltas):
+    """
+    Applies deltas in the session's transaction; when they touch an hour within a day of now (so possibly
+    the dashboard's "today" in any timezone), the cached dashboard counters are dropped on commit.
+    """
+    apply_deltas(session.connection(), deltas)
+    now = datetime.utcnow()
+    if any(abs(hour - now) <= timedelta(days=1) for hour, _, _ in deltas):
+        invalidate_after_commit(session, *LOG_FRAGMENTS)
+
+
+def record_transitions(rows, new_status=None):
+    """
+    Counts a bulk status change (not committed). rows have scheduled_for, service_id, config_id and the old status;
+    new_status None means the rows were deleted.
+    """
+    deltas = {}
+    for row in rows:
+        _add(deltas, row.scheduled_for, row.service_id, row.config_id, row.status, -1)
+        if new_status is not None:
+            _add(deltas, row.scheduled_for, row.service_id, row.config_id, new_status, 1)
+    _apply_in_session(db.session, deltas)
+
+
+def transition_rows(query):
+    """
+    The columns record_transitions needs, for the rows a bulk statement on an AlertLog / AlertLogArchive
+    query is about to change.
+    """
+    model = query.column_descriptions[0]["entity"]
+    return query.with_entities(model.id, model.status, model.scheduled_for, model.service_id, model.config_id).all()
+
+
+def delete_logs(query):
+    """
+    Bulk-deletes the logs (or archived logs) of a query and takes them off the counters (not committed).
+    """
+    record_transitions(transition_rows(query))
+    return query.delete(synchronize_session=False)
+
+
+def _committed_value(state, name):
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else getattr(state.object, name)
+
+
+# Makes the ORM load the old value when a tracked attribute is set while expired, so the flush hook sees it
+for _name in TRACKED_ATTRIBUTES:
+    event.listen(getattr(AlertLog, _name), "set", lambda target, value, oldvalue, initiator: None, active_history=True)
+
+
+@event.listens_for(Session, "before_flush")
+def _count_orm_transitions(session, flush_context, instances):
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, AlertLog):
+            _add(deltas, obj.scheduled_for, obj.service_id, obj.config_id, obj.status or "queued", 1)
+    for obj in session.dirty:
+        if not isinstance(obj, AlertLog):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[name].history.has_changes() for name in TRACKED_ATTRIBUTES):
+            continue
+        old = {name: _committed_value(state, name) for name in TRACKED_ATTRIBUTES}
+        _add(deltas, old["scheduled_for"], old["service_id"], old["config_id"], old["status"], -1)
+        _add(deltas, obj.scheduled_for, obj.service_id, obj.config_id, obj.status, 1)
+    for obj in session.deleted:
+        if isinstance(obj, (AlertLog, AlertLogArchive)):
+            state = inspect(obj)
+            old = {name: _committed_value(state, name) for name in TRACKED_ATTRIBUTES}
+            _add(deltas, old["scheduled_for"], old["service_id"], old["config_id"], old["status"], -1)
+    if deltas:
+        _apply_in_session(session, deltas)
+
+
+def hourly_totals(start, end):
+    """
+    Dashboard counters per hour for scheduled_for in [start, end], summed over services and configs.
+    Returns {hour_start (naive UTC): {"total", "sent", "failed", "waiting"}}.
+    """
+    rows = db.session.query(
+        AlertStatsHourly.hour_start,
+        *[db.func.sum(getattr(AlertStatsHourly, name)) for name in COUNTERS]
+    ).filter(
+        AlertStatsHourly.hour_start >= hour_bucket(start),
+        AlertStatsHourly.hour_start <= to_naive_utc(end)
+    ).group_by(AlertStatsHourly.hour_start).all()
+    return {row[0]: dict(zip(COUNTERS, (int(value or 0) for value in row[1:]))) for row in rows}
+
+
+def _exported_rows(start, end, export_dir):
+    """
+    Yields (scheduled_for, service_id, config_id, status) of the logs LOG_ARCHIVE_MODE=ndjson exported and
+    deleted, scheduled in [start, end). Export files are by queued_at month, so every file is read.
+    Rows an interrupted export left in both a file and a table are skipped here (the table copy counts).
+    """
+    def in_tables(ids):
+        found = set()
+        for model in (AlertLog, AlertLogArchive):
+            found.update(row.id for row in db.session.query(model.id).filter(model.id.in_(ids)))
+        return found
+
+    chunk = []
+    for row in iter_exported_logs(export_dir=export_dir):
+        if not row.get("scheduled_for"):
+            continue
+        scheduled_for = to_naive_utc(datetime.fromisoformat(row["scheduled_for"]))
+        if (start and scheduled_for < start) or (end and scheduled_for >= end):
+            continue
+        chunk.append((row["id"], scheduled_for, row["service_id"], row["config_id"], row["status"]))
+        if len(chunk) >= 1000:
+            present = in_tables([entry[0] for entry in chunk])
+            yield from (entry[1:] for entry in chunk if entry[0] not in present)
+            chunk = []
+    if chunk:
+        present = in_tables([entry[0] for entry in chunk])
+        yield from (entry[1:] for entry in chunk if entry[0] not in present)
+
+
+def rebuild_hourly_stats(start=None, end=None, export_dir=LOG_ARCHIVE_EXPORT_DIR):
+    """
+    Recomputes the counters of the hours in [start, end) (all hours by default) from alert_log,
+    alert_log_archive and the NDJSON exports in export_dir (pass None to skip them; their hours then
+    lose the counts of exported logs). Changes made to those hours while it runs can be counted twice
+    or missed, so run it when the scheduler is quiet. Returns (rows read, counter rows written).
+    """
+    started = time.perf_counter()
+    start, end = hour_bucket(start), hour_bucket(end)
+    stats = AlertStatsHourly.query
+    if start:
+        stats = stats.filter(AlertStatsHourly.hour_start >= start)
+    if end:
+        stats = stats.filter(AlertStatsHourly.hour_start < end)
+    stats.delete(synchronize_session=False)
+
+    deltas = {}
+    read = 0
+    for model in (AlertLog, AlertLogArchive):
+        query = db.session.query(model.scheduled_for, model.service_id, model.config_id, model.status).filter(
+            model.scheduled_for.isnot(None)
+        )
+        if start:
+            query = query.filter(model.scheduled_for >= start)
+        if end:
+            query = query.filter(model.scheduled_for < end)
+        for row in query.yield_per(REBUILD_CHUNK):
+            _add(deltas, row.scheduled_for, row.service_id, row.config_id, row.status, 1)
+            read += 1
+    if export_dir:
+        for scheduled_for, service_id, config_id, status in _exported_rows(start, end, export_dir):
+            _add(deltas, scheduled_for, service_id, config_id, status, 1)
+            read += 1
+    apply_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    invalidate_dashboard(*LOG_FRAGMENTS)
+    flask_logger.info(f"Rebuilt {len(deltas)} hourly stats rows from {read} logs in {time.perf_counter() - started:.1f}s.")
+    return read, len(deltas)
@@ -0,0 +1,205 @@
+import os
+import gzip
+import json
+import time
+import pytz
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select, literal, or_
+from app.extensions import db
+from app.notification_sender.models import AlertLog, AlertLogArchive, AlertDeadLetter
+from app.logging_config import celery_logger
+
+# Retention for alert_log: finalized rows older than LOG_ARCHIVE_AFTER_DAYS leave the hot table, so the
+# scheduler, list_logs and the dashboard only ever scan recent rows.
+#   "table"  - rows move to alert_log_archive (same ids, still browsable with /alerts/logs?archived=1)
+#   "ndjson" - rows are appended to gzip NDJSON files per month in LOG_ARCHIVE_EXPORT_DIR and deleted
+LOG_ARCHIVE_MODE = os.getenv("LOG_ARCHIVE_MODE", "table").strip().lower()
+LOG_ARCHIVE_AFTER_DAYS = int(os.getenv("LOG_ARCHIVE_AFTER_DAYS", 90))
+LOG_ARCHIVE_BATCH_SIZE = int(os.getenv("LOG_ARCHIVE_BATCH_SIZE", 1000))  # rows moved per transaction
+LOG_ARCHIVE_MAX_BATCHES = int(os.getenv("LOG_ARCHIVE_MAX_BATCHES", 500))  # per run; the next run continues
+LOG_ARCHIVE_BATCH_PAUSE = float(os.getenv("LOG_ARCHIVE_BATCH_PAUSE", 0.05))  # seconds between batches, lets other writers in
+LOG_ARCHIVE_EXPORT_DIR = os.getenv("LOG_ARCHIVE_EXPORT_DIR", os.path.join("media", "log_archive"))
+
+FINAL_STATUSES = ("sent", "failed", "skipped")
+ARCHIVED_COLUMNS = (
+    "id", "sample_id", "service_id", "config_id", "sender_id", "target_user_id", "company_name", "sender_name",
+    "audience", "status", "scheduled_for", "queued_at", "sent_at", "retry_count", "error_message",
+)
+
+
+def archivable_logs_query(cutoff):
+    """
+    Logs that are final and older than cutoff. Failed logs still waiting in the dead-letter store stay hot,
+    so they can be replayed.
+    """
+    pending_dead_letter = db.session.query(AlertDeadLetter.id).filter(
+        AlertDeadLetter.log_id == AlertLog.id,
+        AlertDeadLetter.replayed_at.is_(None)
+    )
+    return db.session.query(AlertLog.id).filter(
+        AlertLog.status.in_(FINAL_STATUSES),
+        AlertLog.queued_at < cutoff,
+        or_(AlertLog.sent_at.is_(None), AlertLog.sent_at < cutoff),
+        ~pending_dead_letter.exists()
+    )
+
+
+def _copy_to_table(log_ids, now):
+    columns = [AlertLog.__table__.c[name] for name in ARCHIVED_COLUMNS]
+    db.session.execute(insert(AlertLogArchive.__table__).from_select(
+        list(ARCHIVED_COLUMNS) + ["archived_at"],
+        select(*columns, literal(now, db.DateTime)).where(AlertLog.id.in_(log_ids))
+    ))
+
+
+def _row_to_dict(row):
+    return {name: value.isoformat() if isinstance(value, datetime) else value for name, value in row._mapping.items()}
+
+
+def _export_ndjson(log_ids, export_dir):
+    """
+    Appends the rows to alert_log-<YYYY-MM>.ndjson.gz by queued_at month; each call adds a gzip member.
+    Files are synced before the rows are deleted, so a crash can repeat rows in a file but never lose them.
+    """
+    rows = db.session.query(*[AlertLog.__table__.c[name] for name in ARCHIVED_COLUMNS]).filter(
+        AlertLog.id.in_(log_ids)
+    ).order_by(AlertLog.id).all()
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row.queued_at.strftime("%Y-%m"), []).append(row)
+
+    os.makedirs(export_dir, exist_ok=True)
+    for month, month_rows in by_month.items():
+        with open(os.path.join(export_dir, f"alert_log-{month}.ndjson.gz"), "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as out:
+                for row in month_rows:
+                    out.write(json.dumps(_row_to_dict(row), separators=(",", ":")).encode() + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+def archive_batch(cutoff, batch_size=LOG_ARCHIVE_BATCH_SIZE, mode=LOG_ARCHIVE_MODE, export_dir=LOG_ARCHIVE_EXPORT_DIR):
+    """
+    Moves one batch of archivable logs, oldest first, in a single transaction. Returns the number of rows moved.
+    The batch is locked with FOR UPDATE SKIP LOCKED, so a concurrent run or a worker touching a row never collides.
+    """
+    now = datetime.now(pytz.utc)
+    try:
+        log_ids = [row.id for row in archivable_logs_query(cutoff).order_by(
+            AlertLog.queued_at, AlertLog.id
+        ).limit(batch_size).with_for_update(skip_locked=True)]
+        if not log_ids:
+            db.session.rollback()
+            return 0
+
+        if mode == "ndjson":
+            _export_ndjson(log_ids, export_dir)
+        else:
+            _copy_to_table(log_ids, now)
+        # Replayed dead letters are history of the moved logs; their rows would block (or cascade on) the delete
+        AlertDeadLetter.query.filter(AlertDeadLetter.log_id.in_(log_ids)).delete(synchronize_session=False)
+        moved = AlertLog.query.filter(AlertLog.id.in_(log_ids)).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return moved
+
+
+def archive_old_logs(older_than_days=LOG_ARCHIVE_AFTER_DAYS, batch_size=LOG_ARCHIVE_BATCH_SIZE,
+                     max_batches=LOG_ARCHIVE_MAX_BATCHES, mode=LOG_ARCHIVE_MODE, pause=LOG_ARCHIVE_BATCH_PAUSE,
+                     export_dir=LOG_ARCHIVE_EXPORT_DIR):
+    """
+    Moves finalized logs older than older_than_days out of alert_log in batches of batch_size,
+    stopping after max_batches (the next run continues). Returns counts and timing.
+    """
+    cutoff = datetime.now(pytz.utc) - timedelta(days=older_than_days)
+    started = time.perf_counter()
+    archived, batches = 0, 0
+    while batches < max_batches:
+        moved = archive_batch(cutoff, batch_size, mode, export_dir)
+        if not moved:
+            break
+        archived += moved
+        batches += 1
+        if moved < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    elapsed = time.perf_counter() - started
+    if archived:
+        celery_logger.info(
+            f"Archived {archived} alert logs older than {older_than_days} days ({mode}) in {batches} batches, {elapsed:.2f}s."
+        )
+    return {"archived": archived, "batches": batches, "mode": mode, "cutoff": cutoff.isoformat(), "seconds": elapsed}
+
+
+def iter_exported_logs(start=None, end=None, sample_id=None, export_dir=LOG_ARCHIVE_EXPORT_DIR):
+    """
+    Yields the logs exported by the "ndjson" mode as dicts, optionally limited to a queued_at range and a sample.
+    Rows repeated by an interrupted export are yielded once.
+    """
+    if not os.path.isdir(export_dir):
+        return
+    first_month = start.strftime("%Y-%m") if start else None
+    last_month = end.strftime("%Y-%m") if end else None
+    seen = set()
+    for name in sorted(os.listdir(export_dir)):
+        if not (name.startswith("alert_log-") and name.endswith(".ndjson.gz")):
+            continue
+        month = name[len("alert_log-"):-len(".ndjson.gz")]
+        if (first_month and month < first_month) or (last_month and month > last_month):
+            continue
+        with gzip.open(os.path.join(export_dir, name), "rt") as f:
+            for line in f:
+                row = json.loads(line)
+                if row["id"] in seen or (sample_id and row["sample_id"] != sample_id):
+                    continue
+                queued_at = datetime.fromisoformat(row["queued_at"]).replace(tzinfo=None)
+                if (start and queued_at < start.replace(tzinfo=None)) or (end and queued_at > end.replace(tzinfo=None)):
+                    continue
+                seen.add(row["id"])
+                yield row
+
+
+def log_status_counts(start, end, include_archive=True):
+    """
+    Counts logs scheduled in [start, end] by status, over the hot table and, if asked, the archive table.
+    """
+    counts = {}
+    models = (AlertLog, AlertLogArchive) if include_archive else (AlertLog,)
+    for model in models:
+        rows = db.session.query(model.status, func.count(model.id)).filter(
+            model.scheduled_for >= start,
+            model.scheduled_for <= end
+        ).group_by(model.status)
+        for status, count in rows:
+            counts[status] = counts.get(status, 0) + count
+    return counts
+
+
+def archive_stats():
+    """
+    Row counts and age of the hot and archive tables, plus the exported files.
+    """
+    hot_rows, oldest_hot = db.session.query(func.count(AlertLog.id), func.min(AlertLog.queued_at)).one()
+    archived_rows, oldest_archived, newest_archived = db.session.query(
+        func.count(AlertLogArchive.id), func.min(AlertLogArchive.queued_at), func.max(AlertLogArchive.queued_at)
+    ).one()
+    export_files = []
+    if os.path.isdir(LOG_ARCHIVE_EXPORT_DIR):
+        export_files = [
+            {"name": name, "bytes": os.path.getsize(os.path.join(LOG_ARCHIVE_EXPORT_DIR, name))}
+            for name in sorted(os.listdir(LOG_ARCHIVE_EXPORT_DIR)) if name.endswith(".ndjson.gz")
+        ]
+    return {
+        "mode": LOG_ARCHIVE_MODE,
+        "archive_after_days": LOG_ARCHIVE_AFTER_DAYS,
+        "hot_rows": hot_rows,
+        "oldest_hot_queued_at": oldest_hot.isoformat() if oldest_hot else None,
+        "archived_rows": archived_rows,
+        "oldest_archived_queued_at": oldest_archived.isoformat() if oldest_archived else None,
+        "newest_archived_queued_at": newest_archived.isoformat() if newest_archived else None,
+        "export_files": export_files,
+    }
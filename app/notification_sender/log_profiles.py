@@ -0,0 +1,35 @@
+from sqlalchemy.orm import joinedload, raiseload
+from app.notification_sender.models import AlertLog
+
+# Loading profiles for AlertLog / AlertLogArchive queries. The models' relationships are lazy="raise_on_sql",
+# so a query loads exactly what its profile names and a template touching anything else fails loudly
+# instead of running one query per row. Use as query.options(*list_profile()).
+
+
+def bare_profile():
+    """
+    Columns only: the scheduler, the send path, bulk updates and the per-sample history.
+    raiseload("*") applies to whichever model the query loads, so it takes no model.
+    """
+    return [raiseload("*")]
+
+
+def list_profile(model=AlertLog):
+    """
+    list_logs rows: the sender, for logs without a sender_name of their own. The whole users row is loaded:
+    the sender may be the current user, whose other columns the page reads from the same identity map.
+    """
+    return [joinedload(model.sender), raiseload("*")]
+
+
+def detail_profile(model=AlertLog):
+    """
+    detail_log: service, config, sender and target, joined in the same query.
+    """
+    return [
+        joinedload(model.service),
+        joinedload(model.config),
+        joinedload(model.sender),
+        joinedload(model.target),
+        raiseload("*"),
+    ]
@@ -0,0 +1,168 @@
+import os
+import time
+import hashlib
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy import func
+from app.extensions import db
+from app.notification_sender.models import AlertSample, AlertLog
+from app.logging_config import celery_logger
+
+# Telegram-optimized derivatives of uploaded alert photos, built in the background after upload.
+# Telegram scales photos to 1280 px on the long side anyway, so anything larger is wasted transfer.
+MEDIA_PHOTO_MAX_SIDE = int(os.getenv("MEDIA_PHOTO_MAX_SIDE", 1280))
+MEDIA_PHOTO_QUALITY = int(os.getenv("MEDIA_PHOTO_QUALITY", 85))
+MEDIA_THUMB_MAX_SIDE = int(os.getenv("MEDIA_THUMB_MAX_SIDE", 160))  # thumbnails for the list pages
+MEDIA_THUMB_QUALITY = int(os.getenv("MEDIA_THUMB_QUALITY", 75))
+
+DERIVED_DIR = "derived"  # under UPLOAD_FOLDER
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _to_rgb(image):
+    """
+    Applies the EXIF orientation and flattens transparency onto white; the result carries no metadata.
+    """
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _save_jpeg(image, max_side, quality, path):
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    # No exif= / icc_profile= arguments, so GPS and camera metadata are not written
+    image.save(path, "JPEG", quality=quality, optimize=True, progressive=True)
+    return os.path.getsize(path)
+
+
+def build_derivatives(upload_folder, filename):
+    """
+    Builds the Telegram derivative and the thumbnail of an uploaded photo.
+    Returns the AlertSample fields to set: derivative / thumbnail paths (relative to upload_folder) and sizes.
+    The derivative is only used when it is smaller than the original; animated images keep the original.
+    Files are named by the original's content hash, so identical uploads share their derivatives.
+    """
+    original_path = os.path.join(upload_folder, filename)
+    original_bytes = os.path.getsize(original_path)
+    digest = _file_digest(original_path)[:32]
+    os.makedirs(os.path.join(upload_folder, DERIVED_DIR), exist_ok=True)
+    derivative = f"{DERIVED_DIR}/{digest}.tg.jpg"
+    thumbnail = f"{DERIVED_DIR}/{digest}.thumb.jpg"
+
+    with Image.open(original_path) as image:
+        animated = getattr(image, "is_animated", False)
+        image = _to_rgb(image)
+        thumbnail_bytes = _save_jpeg(image, MEDIA_THUMB_MAX_SIDE, MEDIA_THUMB_QUALITY, os.path.join(upload_folder, thumbnail))
+        derivative_bytes = None
+        if not animated:
+            derivative_bytes = _save_jpeg(image, MEDIA_PHOTO_MAX_SIDE, MEDIA_PHOTO_QUALITY, os.path.join(upload_folder, derivative))
+
+    if derivative_bytes is None or derivative_bytes >= original_bytes:
+        if derivative_bytes is not None:
+            os.remove(os.path.join(upload_folder, derivative))
+        derivative, derivative_bytes = None, None
+    celery_logger.info(f"Media derivatives for {filename}: {original_bytes} -> {derivative_bytes or original_bytes} bytes, "
+                       f"thumbnail {thumbnail_bytes} bytes.")
+    return {
+        "photo_derivative": derivative,
+        "photo_thumbnail": thumbnail,
+        "photo_bytes": original_bytes,
+        "photo_derivative_bytes": derivative_bytes,
+    }
+
+
+def sample_photo_derivatives(sample, upload_folder):
+    """
+    Builds the derivatives of a sample's current photo and returns the fields to set on it,
+    or None when the sample has no photo or it is not a readable image.
+    """
+    if not sample.photo_upload:
+        return None
+    try:
+        return build_derivatives(upload_folder, sample.photo_upload)
+    except (UnidentifiedImageError, OSError) as e:
+        celery_logger.warning(f"No media derivatives for sample {sample.id} ({sample.photo_upload}): {e}")
+        return None
+
+
+def clear_sample_photo_derivatives(sample):
+    """
+    Drops a sample's derivatives when its photo is removed or replaced, so sends fall back to the upload.
+    The files stay until media-gc (collect_derivative_garbage) finds no other sample using them.
+    """
+    sample.photo_derivative = None
+    sample.photo_thumbnail = None
+    sample.photo_bytes = None
+    sample.photo_derivative_bytes = None
+
+
+def collect_derivative_garbage(upload_folder, grace_seconds):
+    """
+    Deletes files under derived/ that no sample's photo_derivative / photo_thumbnail points at any more (left by
+    replaced or deleted photos) once older than grace_seconds, so a build whose row update is still in flight
+    keeps its files. Returns (files removed, bytes freed).
+    """
+    folder = os.path.join(upload_folder, DERIVED_DIR)
+    if not os.path.isdir(folder):
+        return 0, 0
+    referenced = set()
+    for column in (AlertSample.photo_derivative, AlertSample.photo_thumbnail):
+        referenced.update(path for (path,) in db.session.query(column).filter(column.isnot(None)).distinct())
+    cutoff = time.time() - grace_seconds
+    removed, freed = 0, 0
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        stat = os.stat(path)
+        if f"{DERIVED_DIR}/{name}" in referenced or stat.st_mtime >= cutoff:
+            continue
+        os.remove(path)
+        removed += 1
+        freed += stat.st_size
+    if removed:
+        celery_logger.info(f"Removed {removed} unreferenced media derivatives ({freed} bytes).")
+    return removed, freed
+
+
+def media_savings_report():
+    """
+    Bytes the bot API did not have to fetch thanks to the derivatives: per sample, the size difference
+    times the number of sent logs, plus totals.
+    """
+    samples = db.session.query(
+        AlertSample.id, AlertSample.title, AlertSample.photo_bytes, AlertSample.photo_derivative_bytes
+    ).filter(AlertSample.photo_derivative.isnot(None)).all()
+    sends = dict(db.session.query(AlertLog.sample_id, func.count(AlertLog.id)).filter(
+        AlertLog.sample_id.in_([sample.id for sample in samples]),
+        AlertLog.status == "sent"
+    ).group_by(AlertLog.sample_id).all()) if samples else {}
+
+    rows = []
+    for sample_id, title, original_bytes, derivative_bytes in samples:
+        saved_per_send = original_bytes - derivative_bytes
+        rows.append({
+            "sample_id": sample_id,
+            "title": title,
+            "original_bytes": original_bytes,
+            "derivative_bytes": derivative_bytes,
+            "sends": sends.get(sample_id, 0),
+            "bytes_saved": saved_per_send * sends.get(sample_id, 0),
+        })
+    rows.sort(key=lambda row: row["bytes_saved"], reverse=True)
+    return {
+        "samples": len(rows),
+        "original_bytes": sum(row["original_bytes"] for row in rows),
+        "derivative_bytes": sum(row["derivative_bytes"] for row in rows),
+        "bytes_saved": sum(row["bytes_saved"] for row in rows),
+        "per_sample": rows,
+    }
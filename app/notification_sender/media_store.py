@@ -0,0 +1,286 @@
+import os
+import uuid
+import hashlib
+import pytz
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.notification_sender.models import MediaBlob, AlertSample
+from app.authentication.models import User
+from app.logging_config import flask_logger
+
+# Content-addressed upload store: files live under UPLOAD_FOLDER/cas/<aa>/<bb>/<sha256><ext>, so identical
+# uploads are stored once and a new upload can never overwrite an older alert's file.
+# The stored path (relative to UPLOAD_FOLDER) is what AlertSample.photo_upload / document_upload keep,
+# and User.profile_pic keeps it behind "media/uploads/".
+STORE_DIR = "cas"
+TMP_DIR = f"{STORE_DIR}/tmp"
+STREAM_CHUNK_SIZE = 64 * 1024
+PROFILE_PIC_PREFIX = "media/uploads/"
+GC_GRACE_SECONDS = int(os.getenv("MEDIA_GC_GRACE_SECONDS", 3600))  # unreferenced blobs are kept this long before removal
+
+
+def blob_path(sha256, extension):
+    return f"{STORE_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def _extension(filename):
+    return os.path.splitext(filename or "")[1].lower()[:10]
+
+
+def _add_reference(sha256, relative_path, size):
+    """
+    Records one more reference to a blob, creating its row on first use (safe against concurrent uploads).
+    """
+    updated = MediaBlob.query.filter(MediaBlob.sha256 == sha256).update(
+        {MediaBlob.ref_count: MediaBlob.ref_count + 1}, synchronize_session=False
+    )
+    if updated:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(MediaBlob(sha256=sha256, path=relative_path, size=size, ref_count=1))
+    except IntegrityError:
+        MediaBlob.query.filter(MediaBlob.sha256 == sha256).update(
+            {MediaBlob.ref_count: MediaBlob.ref_count + 1}, synchronize_session=False
+        )
+
+
+def _place(upload_folder, tmp_path, sha256, extension):
+    """
+    Moves a fully written temp file to its content address; if the content is already stored, drops the copy.
+    Returns the stored path (relative to upload_folder).
+    """
+    existing = db.session.query(MediaBlob.path).filter(MediaBlob.sha256 == sha256).scalar()
+    relative_path = existing or blob_path(sha256, extension)
+    target = os.path.join(upload_folder, relative_path)
+    if os.path.exists(target):
+        os.remove(tmp_path)
+        # A fresh mtime keeps collect_garbage from sweeping the file as an orphan before our row commits
+        os.utime(target)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+    return relative_path
+
+
+def store_stream(chunks, extension, upload_folder):
+    """
+    Saves an iterable of byte chunks into the store, hashing it while it streams to disk, and adds a reference
+    to it (not committed). Returns (stored path relative to upload_folder, size).
+    """
+    os.makedirs(os.path.join(upload_folder, TMP_DIR), exist_ok=True)
+    tmp_path = os.path.join(upload_folder, TMP_DIR, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            for chunk in chunks:
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    sha256 = digest.hexdigest()
+    relative_path = _place(upload_folder, tmp_path, sha256, extension)
+    _add_reference(sha256, relative_path, size)
+    return relative_path, size
+
+
+def store_upload(file_storage, upload_folder):
+    """
+    Saves an uploaded werkzeug FileStorage into the store and adds a reference to it (not committed).
+    Returns the stored path, relative to upload_folder.
+    """
+    relative_path, size = store_stream(
+        iter(lambda: file_storage.stream.read(STREAM_CHUNK_SIZE), b""), _extension(file_storage.filename), upload_folder
+    )
+    flask_logger.info(f"Stored upload {file_storage.filename} as {relative_path} ({size} bytes).")
+    return relative_path
+
+
+def ingest_file(file_path, upload_folder, move=True):
+    """
+    Adds an existing file to the store (used by the migration) and adds a reference to it (not committed).
+    Returns the stored path, relative to upload_folder.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    size = os.path.getsize(file_path)
+    os.makedirs(os.path.join(upload_folder, TMP_DIR), exist_ok=True)
+    tmp_path = os.path.join(upload_folder, TMP_DIR, uuid.uuid4().hex)
+    if move:
+        os.replace(file_path, tmp_path)
+    else:
+        with open(file_path, "rb") as src, open(tmp_path, "wb") as out:
+            for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                out.write(chunk)
+    relative_path = _place(upload_folder, tmp_path, sha256, _extension(file_path))
+    _add_reference(sha256, relative_path, size)
+    return relative_path
+
+
+def add_reference(relative_path):
+    """
+    Adds one reference to an already stored file (not committed). Returns False if the path is not in the store.
+    """
+    if not is_stored(relative_path):
+        return False
+    return bool(MediaBlob.query.filter(MediaBlob.path == relative_path).update(
+        {MediaBlob.ref_count: MediaBlob.ref_count + 1}, synchronize_session=False
+    ))
+
+
+def is_stored(relative_path):
+    return bool(relative_path) and relative_path.startswith(f"{STORE_DIR}/")
+
+
+def release(relative_path):
+    """
+    Drops one reference to a stored file (not committed). Files outside the store are left alone.
+    Unreferenced blobs are deleted later by collect_garbage, so a concurrent upload of the same bytes can still claim them.
+    """
+    if not is_stored(relative_path):
+        return
+    MediaBlob.query.filter(MediaBlob.path == relative_path, MediaBlob.ref_count > 0).update(
+        {MediaBlob.ref_count: MediaBlob.ref_count - 1}, synchronize_session=False
+    )
+
+
+def profile_pic_path(relative_path):
+    return f"{PROFILE_PIC_PREFIX}{relative_path}"
+
+
+def release_profile_pic(profile_pic):
+    if profile_pic and profile_pic.startswith(PROFILE_PIC_PREFIX):
+        release(profile_pic[len(PROFILE_PIC_PREFIX):])
+
+
+def referenced_paths():
+    """
+    Counts the references to stored files held by AlertSample and User rows.
+    """
+    counts = {}
+    for column in (AlertSample.photo_upload, AlertSample.document_upload):
+        for path, count in db.session.query(column, func.count()).filter(column.like(f"{STORE_DIR}/%")).group_by(column):
+            counts[path] = counts.get(path, 0) + count
+    # Images extracted from sample bodies, one reference per sample (see body_images.py)
+    for (body_images,) in db.session.query(AlertSample.body_images).filter(AlertSample.body_images.isnot(None)):
+        for path in body_images.split():
+            counts[path] = counts.get(path, 0) + 1
+    for profile_pic, count in db.session.query(User.profile_pic, func.count()).filter(
+        User.profile_pic.like(f"{PROFILE_PIC_PREFIX}{STORE_DIR}/%")
+    ).group_by(User.profile_pic):
+        path = profile_pic[len(PROFILE_PIC_PREFIX):]
+        counts[path] = counts.get(path, 0) + count
+    return counts
+
+
+def recount_references():
+    """
+    Recomputes every blob's ref_count from the referencing rows (repairs drift, e.g. after a failed request).
+    Returns the number of blobs whose count changed.
+    """
+    counts = referenced_paths()
+    changed = 0
+    for blob in MediaBlob.query.all():
+        actual = counts.get(blob.path, 0)
+        if blob.ref_count != actual:
+            blob.ref_count = actual
+            changed += 1
+    db.session.commit()
+    return changed
+
+
+def _orphan_files(upload_folder, cutoff):
+    """
+    Yields (path, size) of files under cas/ older than cutoff that have no MediaBlob row: written by a request
+    that failed or was rolled back after storing them.
+    """
+    store_folder = os.path.join(upload_folder, STORE_DIR)
+    if not os.path.isdir(store_folder):
+        return
+    for root, dirs, files in os.walk(store_folder):
+        if root == store_folder:
+            dirs[:] = [name for name in dirs if name != os.path.basename(TMP_DIR)]
+        old = {}
+        for name in files:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            if stat.st_mtime < cutoff.timestamp():
+                old[os.path.relpath(path, upload_folder).replace(os.sep, "/")] = stat.st_size
+        paths = list(old)
+        for offset in range(0, len(paths), 500):
+            chunk = paths[offset:offset + 500]
+            known = {path for (path,) in db.session.query(MediaBlob.path).filter(MediaBlob.path.in_(chunk))}
+            for path in chunk:
+                if path not in known:
+                    yield path, old[path]
+
+
+def collect_garbage(upload_folder, grace_seconds=GC_GRACE_SECONDS):
+    """
+    Deletes blobs nobody referenced for grace_seconds, files in the store without a blob row (left by failed
+    requests) and temp files left by interrupted uploads, once older than grace_seconds.
+    Returns (blobs and files removed, bytes freed).
+    """
+    cutoff = datetime.now(pytz.utc) - timedelta(seconds=grace_seconds)
+    removed, freed = 0, 0
+    candidates = db.session.query(MediaBlob.id, MediaBlob.path, MediaBlob.size).filter(
+        MediaBlob.ref_count <= 0, MediaBlob.updated_at < cutoff
+    ).all()
+    for blob_id, path, size in candidates:
+        # Re-check under the delete so a blob re-referenced meanwhile survives
+        deleted = MediaBlob.query.filter(MediaBlob.id == blob_id, MediaBlob.ref_count <= 0).delete(synchronize_session=False)
+        db.session.commit()
+        if not deleted:
+            continue
+        try:
+            os.remove(os.path.join(upload_folder, path))
+        except FileNotFoundError:
+            pass
+        removed += 1
+        freed += size
+
+    for path, size in list(_orphan_files(upload_folder, cutoff)):
+        try:
+            os.remove(os.path.join(upload_folder, path))
+        except FileNotFoundError:
+            continue
+        flask_logger.info(f"Removed orphaned media file {path} ({size} bytes).")
+        removed += 1
+        freed += size
+
+    tmp_folder = os.path.join(upload_folder, TMP_DIR)
+    if os.path.isdir(tmp_folder):
+        for name in os.listdir(tmp_folder):
+            path = os.path.join(tmp_folder, name)
+            if os.path.getmtime(path) < cutoff.timestamp():
+                os.remove(path)
+    return removed, freed
+
+
+def store_stats():
+    """
+    Blob count, stored bytes, references and the bytes the references would take without deduplication.
+    """
+    blobs, stored_bytes, references, logical_bytes = db.session.query(
+        func.count(MediaBlob.id),
+        func.coalesce(func.sum(MediaBlob.size), 0),
+        func.coalesce(func.sum(MediaBlob.ref_count), 0),
+        func.coalesce(func.sum(MediaBlob.size * MediaBlob.ref_count), 0),
+    ).one()
+    unreferenced = db.session.query(func.count(MediaBlob.id)).filter(MediaBlob.ref_count <= 0).scalar()
+    return {
+        "blobs": blobs,
+        "stored_bytes": int(stored_bytes),
+        "references": int(references),
+        "bytes_without_dedupe": int(logical_bytes),
+        "unreferenced_blobs": unreferenced,
+    }
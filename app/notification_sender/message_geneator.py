@@ -3,8 +3,17 @@ import html
 import re
 from datetime import datetime
 import pytz
+from app.notification_sender.render_cache import get_template
 
-def get_messages(sample):
+LOCAL_TZ = pytz.timezone("Asia/Dhaka")
+TIME_PLACEHOLDER = "\x00TIME\x00"  # filled in per send; never appears in user content
+TAG_RE = re.compile(r'<[^<]+?>')
+
+
+def render_static_message(sample):
+    """
+    Renders everything of the message except the send time, which is left as TIME_PLACEHOLDER.
+    """
     cleaned_body = ""
 
     # Process the body text
@@ -13,7 +22,7 @@ def get_messages(sample):
         body = body.replace('<br>', '\n').replace('<br/>', '\n')
         body = body.replace('</p>', '\n')
         # Remove any remaining HTML tags
-        cleaned_body = re.sub(r'<[^<]+?>', '', body).strip()
+        cleaned_body = TAG_RE.sub('', body).strip()
 
     # Add the document name as an underlined clickable link with visible URL
     if sample.document_upload:
@@ -23,22 +32,28 @@ def get_messages(sample):
         escaped_doc_name = html.escape(sample.document_upload)
         cleaned_body += f'\n\n----------------------------------------\n\n <a href="{doc_url}">🟢 Click here to download attachment </a>'
 
-    LOCAL_TZ = pytz.timezone("Asia/Dhaka")
-    now_local = datetime.now(LOCAL_TZ)
-    formatted_time = now_local.strftime("%B %d, %Y at %I:%M %p")
-
-    # HTML-escape title, formatted_time, and author
+    # HTML-escape title and author
     escaped_title = html.escape(sample.title) if sample.title else "N/A"
-    escaped_formatted_time = html.escape(formatted_time)
     escaped_author = html.escape(sample.sender_name) if sample.sender_name else "N/A"
 
     # Construct final message
     message = (
         f"📢 Announcement: {escaped_title}\n\n"
-        f"🕒 Time: {escaped_formatted_time}\n\n"
+        f"🕒 Time: {TIME_PLACEHOLDER}\n\n"
         f"👤 Author: {escaped_author}\n\n"
         "----------------------------------------\n\n"
         f"📬 Message:\n\n{cleaned_body}"
     )
 
-    return message
\ No newline at end of file
+    return message
+
+
+def get_messages(sample):
+    template = get_template(sample, render_static_message)
+
+    now_local = datetime.now(LOCAL_TZ)
+    formatted_time = now_local.strftime("%B %d, %Y at %I:%M %p")
+
+    # HTML-escape formatted_time
+    escaped_formatted_time = html.escape(formatted_time)
+    return template.replace(TIME_PLACEHOLDER, escaped_formatted_time, 1)
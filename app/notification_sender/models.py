@@ -1,4 +1,6 @@
 # app/notification_sender/models.py
+import re
+import html
 from datetime import datetime
 import pytz # Added import for pytz
 from ..extensions import db  # use the shared db from extensions
@@ -6,6 +8,20 @@ from ..authentication.models import User  # your user model
 
 # DO NOT create a new db = SQLAlchemy() here
 
+BODY_PREVIEW_LENGTH = 200  # characters of plain text kept in AlertSample.body_preview
+_TAG_RE = re.compile(r"<[^>]*>")
+
+
+def body_preview_text(body, length=BODY_PREVIEW_LENGTH):
+    """
+    Plain-text start of an HTML body: tags (with any inline base64 image in them) dropped,
+    entities unescaped and whitespace collapsed.
+    """
+    if not body:
+        return None
+    text = _TAG_RE.sub(" ", body)[:length * 8]  # entities and whitespace shrink the text, tags are gone
+    return " ".join(html.unescape(text).split())[:length]
+
 class AlertService(db.Model):
     __tablename__ = "alert_service"
 
@@ -57,19 +73,28 @@ class AlertSample(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
 
     title = db.Column(db.String(255), nullable=False)
-    body = db.Column(db.Text(length=4294967295), nullable=True) # Use LONGTEXT for large content
+    body = db.deferred(db.Column(db.Text(length=4294967295), nullable=True)) # Use LONGTEXT for large content; loaded only when read (or undefer())
+    body_preview = db.Column(db.String(255), nullable=True)  # set with body, see _summarize_body
+    body_size = db.Column(db.Integer, nullable=True)  # bytes of body (UTF-8)
+    body_images = db.Column(db.Text, nullable=True)  # stored images the body links to, one path per line (body_images.py)
     category = db.Column(db.Integer, nullable=True)
 
     # File uploads
     photo_upload = db.Column(db.String(255), nullable=True)  # For image files
     document_upload = db.Column(db.String(255), nullable=True) # For other document types
+    # Built in the background from photo_upload, see media_pipeline.py (paths relative to UPLOAD_FOLDER)
+    photo_derivative = db.Column(db.String(255), nullable=True)  # resized / recompressed / EXIF-free copy sent to Telegram
+    photo_thumbnail = db.Column(db.String(255), nullable=True)  # small preview for the list pages
+    photo_bytes = db.Column(db.Integer, nullable=True)
+    photo_derivative_bytes = db.Column(db.Integer, nullable=True)
 
     # Scheduling fields
     start_date = db.Column(db.Date, default=lambda: datetime.now(pytz.utc).date(), nullable=False)
     start_time = db.Column(db.Time, default=lambda: datetime.now(pytz.utc).time(), nullable=False)
     end_date = db.Column(db.Date, nullable=True)
     is_recurring = db.Column(db.Boolean, default=False)
-    recurrence_interval = db.Column(db.String(50), nullable=True)  # e.g., 'daily', 'weekly', 'monthly'
+    recurrence_interval = db.Column(db.String(50), nullable=True)  # e.g., 'daily', 'weekly', 'monthly' or 'FREQ=MONTHLY;INTERVAL=3'
+    next_run_at = db.Column(db.DateTime, nullable=True, index=True)  # next occurrence of a recurring sample (UTC), see recurrence.py
 
     # Type field
     type = db.Column(db.String(50), nullable=True)  # e.g., "One-Time", "Recurring", "Special"
@@ -82,6 +107,20 @@ class AlertSample(db.Model):
     def __repr__(self):
         return f"<AlertSample {self.id}>"
 
+    @db.validates("body")
+    def _summarize_body(self, key, body):
+        # Lists and details show these instead of loading the (possibly multi-MB) body
+        self.body_preview = body_preview_text(body)
+        self.body_size = len(body.encode("utf-8")) if body else 0
+        return body
+
+    @property
+    def photo_for_send(self):
+        """
+        The photo file sends should use: the Telegram derivative once it is built, else the upload.
+        """
+        return self.photo_derivative or self.photo_upload
+
     @property
     def category_name(self):
         category_map = {1: "System Alert", 2: "User Alert"}
@@ -93,6 +132,16 @@ class AlertSample(db.Model):
 
 class AlertLog(db.Model):
     __tablename__ = "alert_log"
+    __table_args__ = (
+        # Scheduler claim: status = 'queued' AND scheduled_for <= now ORDER BY scheduled_for, id (covering)
+        db.Index("ix_alert_log_status_scheduled_for", "status", "scheduled_for", "id", "sample_id"),
+        # Per-sample history: sample_id = ? ORDER BY queued_at DESC (list_logs, detail_sample)
+        db.Index("ix_alert_log_sample_queued_at", "sample_id", "queued_at"),
+        # Last sent log of a recurring sample: sample_id = ? AND status = 'sent' ORDER BY sent_at DESC
+        db.Index("ix_alert_log_sample_status_sent_at", "sample_id", "status", "sent_at"),
+        # Dashboard day-range aggregation over scheduled_for, counted by status (covering)
+        db.Index("ix_alert_log_scheduled_for_status", "scheduled_for", "status"),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
 
@@ -111,7 +160,7 @@ class AlertLog(db.Model):
 
     # Audience & state
     audience = db.Column(db.String(20), nullable=False, default="all")  # "single" | "common" | "all"
-    status   = db.Column(db.String(20), nullable=False, default="queued", index=True)  # "queued" | "scheduled" | "sent" | "failed" | "skipped"
+    status   = db.Column(db.String(20), nullable=False, default="queued", index=True)  # "queued" | "sending" | "delivering" | "sent" | "failed" | "skipped"
 
     # Timing
     scheduled_for = db.Column(db.DateTime, nullable=True, index=True)
@@ -122,16 +171,126 @@ class AlertLog(db.Model):
     retry_count   = db.Column(db.Integer, nullable=False, default=0)
     error_message = db.Column(db.Text, nullable=True)
 
-    # Relationships
-    sample  = db.relationship("AlertSample", backref="logs")
-    service = db.relationship("AlertService", lazy="joined")
-    config  = db.relationship("AlertConfig", lazy="joined")
-    sender  = db.relationship("User", foreign_keys=[sender_id], lazy="joined")
-    target  = db.relationship("User", foreign_keys=[target_user_id], lazy="joined")
+    # Scheduler claim (set when a batch is claimed for dispatch)
+    claim_token      = db.Column(db.String(32), nullable=True, index=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+
+    # Relationships (never loaded implicitly: queries pick what they need from log_profiles.py)
+    sample  = db.relationship("AlertSample", backref="logs", lazy="raise_on_sql")
+    service = db.relationship("AlertService", lazy="raise_on_sql")
+    config  = db.relationship("AlertConfig", lazy="raise_on_sql")
+    sender  = db.relationship("User", foreign_keys=[sender_id], lazy="raise_on_sql")
+    target  = db.relationship("User", foreign_keys=[target_user_id], lazy="raise_on_sql")
 
     def __repr__(self):
         return f"<AlertLog sample={self.sample_id} status={self.status} queued_at={self.queued_at}>"
 
+class AlertLogArchive(db.Model):
+    """
+    Finalized AlertLog rows moved out of the hot table by the retention job (log_archive.py).
+    Rows keep their alert_log id, so links to a log keep working after it is archived.
+    """
+    __tablename__ = "alert_log_archive"
+    __table_args__ = (
+        db.Index("ix_alert_log_archive_sample_queued_at", "sample_id", "queued_at"),
+        db.Index("ix_alert_log_archive_scheduled_for_status", "scheduled_for", "status"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # the alert_log id
+
+    sample_id = db.Column(db.Integer, db.ForeignKey("alert_sample.id", ondelete="CASCADE"), nullable=False)
+    service_id = db.Column(db.Integer, db.ForeignKey("alert_service.id"), nullable=True, index=True)
+    config_id = db.Column(db.Integer, db.ForeignKey("alert_config.id"), nullable=True, index=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    target_user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+
+    company_name = db.Column(db.String(255), nullable=True)
+    sender_name = db.Column(db.String(255), nullable=True)
+    audience = db.Column(db.String(20), nullable=False, default="all")
+    status = db.Column(db.String(20), nullable=False)  # "sent" | "failed" | "skipped"
+
+    scheduled_for = db.Column(db.DateTime, nullable=True)
+    queued_at = db.Column(db.DateTime, nullable=False, index=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    retry_count = db.Column(db.Integer, nullable=False, default=0)
+    error_message = db.Column(db.Text, nullable=True)
+
+    archived_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.utc))
+
+    # Relationships (as on AlertLog, loaded only through log_profiles.py)
+    sample  = db.relationship("AlertSample", lazy="raise_on_sql")
+    service = db.relationship("AlertService", lazy="raise_on_sql")
+    config  = db.relationship("AlertConfig", lazy="raise_on_sql")
+    sender  = db.relationship("User", foreign_keys=[sender_id], lazy="raise_on_sql")
+    target  = db.relationship("User", foreign_keys=[target_user_id], lazy="raise_on_sql")
+
+    def __repr__(self):
+        return f"<AlertLogArchive sample={self.sample_id} status={self.status} queued_at={self.queued_at}>"
+
+class AlertStatsHourly(db.Model):
+    """
+    Per-hour AlertLog counters for the dashboard, kept current on every log status change (hourly_stats.py).
+    Buckets are UTC hours of scheduled_for, so any whole-hour local timezone reads them as local hours.
+    """
+    __tablename__ = "alert_stats_hourly"
+    __table_args__ = (
+        db.UniqueConstraint("hour_start", "service_id", "config_id", name="uq_alert_stats_hourly_bucket"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    hour_start = db.Column(db.DateTime, nullable=False)  # UTC, minutes and seconds zero
+    service_id = db.Column(db.Integer, nullable=False, default=0)  # 0 = log without a service
+    config_id = db.Column(db.Integer, nullable=False, default=0)  # 0 = log without a config
+
+    total = db.Column(db.Integer, nullable=False, default=0)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    waiting = db.Column(db.Integer, nullable=False, default=0)  # status 'queued' or 'sending'
+
+    def __repr__(self):
+        return f"<AlertStatsHourly {self.hour_start} service={self.service_id} config={self.config_id} total={self.total}>"
+
+class AlertDeadLetter(db.Model):
+    __tablename__ = "alert_dead_letter"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    log_id = db.Column(db.Integer, db.ForeignKey("alert_log.id", ondelete="CASCADE"), nullable=False, index=True)
+    sample_id = db.Column(db.Integer, db.ForeignKey("alert_sample.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    reason = db.Column(db.String(20), nullable=False, index=True)  # "permanent" | "exhausted"
+    error_message = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=1)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.utc), index=True)
+    replayed_at = db.Column(db.DateTime, nullable=True, index=True)  # set when the log was queued again
+
+    # Relationships
+    log = db.relationship("AlertLog", backref=db.backref("dead_letters", passive_deletes=True))
+
+    def __repr__(self):
+        return f"<AlertDeadLetter log={self.log_id} reason={self.reason}>"
+
+class MediaBlob(db.Model):
+    """
+    One stored upload in the content-addressed store (media_store.py), shared by every reference to the same bytes.
+    """
+    __tablename__ = "media_blob"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    sha256 = db.Column(db.String(64), nullable=False, unique=True)
+    path = db.Column(db.String(255), nullable=False, unique=True)  # relative to UPLOAD_FOLDER, e.g. "cas/ab/cd/abcd....jpg"
+    size = db.Column(db.BigInteger, nullable=False)
+    # AlertSample photo/document/body_images and User profile_pic columns pointing at this blob; 0 = garbage
+    ref_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.utc))
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.utc),
+                           onupdate=lambda: datetime.now(pytz.utc))
+
+    def __repr__(self):
+        return f"<MediaBlob {self.sha256[:12]} refs={self.ref_count}>"
+
 class TestCredentials(db.Model):
     __tablename__ = "test_credentials"
 
@@ -0,0 +1,98 @@
+import os
+import uuid
+import mimetypes
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("BOT_UPLOAD_CHUNK_SIZE", 64 * 1024))  # bytes read from disk per chunk
+
+
+class MultipartStream:
+    """
+    A multipart/form-data body with one file part that is read from disk in chunks while it is sent,
+    so an upload never holds more than UPLOAD_CHUNK_SIZE bytes of the file in memory.
+
+    Works as a file-like body for requests (read / len, sent with a Content-Length) and as an async
+    iterable for aiohttp. Use it as a context manager: the file is closed on exit, also when the request fails.
+
+        with MultipartStream(payload, "document", file_path) as body:
+            http_post(url, data=body, headers=body.headers)
+    """
+    def __init__(self, fields, file_field, file_path, filename=None, chunk_size=UPLOAD_CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        filename = filename or os.path.basename(file_path)
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+        head = []
+        for name, value in fields.items():
+            if value is None:
+                continue
+            head.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+            )
+        quoted_filename = filename.replace('"', "%22")
+        head.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{quoted_filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode("utf-8")
+        )
+        self._head = b"".join(head)
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+        self._file = open(file_path, "rb")
+        self.len = len(self._head) + os.fstat(self._file.fileno()).st_size + len(self._tail)
+        self._parts = [self._head, self._file, self._tail]
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @property
+    def headers(self):
+        return {"Content-Type": self.content_type, "Content-Length": str(self.len)}
+
+    def __len__(self):
+        return self.len
+
+    def read(self, size=-1):
+        """
+        Returns up to `size` bytes of the body (at most one chunk of the file), b"" at the end.
+        """
+        if size is None or size < 0:
+            size = self.chunk_size
+        while self._parts:
+            part = self._parts[0]
+            if isinstance(part, bytes):
+                chunk, rest = part[:size], part[size:]
+                if rest:
+                    self._parts[0] = rest
+                else:
+                    self._parts.pop(0)
+            else:
+                chunk = part.read(min(size, self.chunk_size))
+                if not chunk:
+                    self._parts.pop(0)
+                    continue
+            if chunk:
+                return chunk
+        return b""
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    async def __aiter__(self):
+        # Chunks are small, so the blocking disk read stays far below a scheduling tick
+        for chunk in self:
+            yield chunk
+
+    def close(self):
+        self._file.close()
+        self._parts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
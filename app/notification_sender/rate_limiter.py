@@ -0,0 +1,230 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import redis
+from app.redis_client import get_redis, redis_available, mark_redis_unavailable
+from app.logging_config import telegram_logger
+from app.celery_config import str_to_bool
+
+RATE_LIMIT_ENABLED = str_to_bool(os.getenv("BOT_RATE_LIMIT_ENABLED", "true"))
+BOT_RATE_PER_SECOND = float(os.getenv("BOT_RATE_LIMIT_PER_SECOND", 30))  # per bot token
+CHAT_RATE_PER_MINUTE = float(os.getenv("BOT_CHAT_RATE_LIMIT_PER_MINUTE", 20))  # per group/chat
+RATE_LIMIT_MAX_WAIT = float(os.getenv("BOT_RATE_LIMIT_MAX_WAIT", 120))  # seconds a send may wait for a token
+RATE_LIMIT_429_RETRIES = int(os.getenv("BOT_RATE_LIMIT_429_RETRIES", 2))
+
+KEY_PREFIX = "ratelimit"
+
+# Token buckets for every key in KEYS[1..n] plus retry_after holds in KEYS[n+1..].
+# ARGV: n, then capacity and refill rate (tokens per ms) for each bucket.
+# Takes one token from every bucket, or none at all, and returns 0 or the ms to wait.
+TOKEN_BUCKET_SCRIPT = """
+pcall(redis.replicate_commands)
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local n = tonumber(ARGV[1])
+local wait = 0
+for i = n + 1, #KEYS do
+    local pttl = redis.call('PTTL', KEYS[i])
+    if pttl > wait then wait = pttl end
+end
+if wait > 0 then return wait end
+local levels = {}
+for i = 1, n do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < 1 then
+        local need = math.ceil((1 - tokens) / rate)
+        if need > wait then wait = need end
+    end
+end
+if wait > 0 then return wait end
+for i = 1, n do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    redis.call('HSET', KEYS[i], 'tokens', tostring(levels[i] - 1), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], math.ceil(capacity / rate) + 1000)
+end
+return 0
+"""
+
+
+class RateLimitTimeout(Exception):
+    """
+    Raised when a send could not get a token within the allowed wait.
+    """
+
+
+def token_fingerprint(auth_token):
+    # Bot tokens never appear in Redis keys
+    return hashlib.sha1(auth_token.encode()).hexdigest()[:16]
+
+
+def chat_key_part(chat_id):
+    # Telegram's per-group limit is shared by every thread of the group ("<chat_id>_<thread_id>")
+    return str(chat_id).split("_", 1)[0] if chat_id else None
+
+
+def extract_retry_after(status_code, headers, body):
+    """
+    Returns the retry_after seconds of a 429 reply, or None if the reply is not a rate limit.
+    Understands Telegram's {"error_code": 429, "parameters": {"retry_after": N}}, a
+    "retry after N" description and the Retry-After header.
+    """
+    data = {}
+    if isinstance(body, dict):
+        data = body
+    elif body:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = {}
+    if not isinstance(data, dict):
+        data = {}
+
+    if status_code != 429 and data.get("error_code") != 429 and "Too Many Requests" not in str(data.get("description") or data.get("error") or ""):
+        return None
+
+    parameters = data.get("parameters") or {}
+    if parameters.get("retry_after") is not None:
+        return float(parameters["retry_after"])
+    match = re.search(r"retry after (\d+)", str(data.get("description") or data.get("error") or ""))
+    if match:
+        return float(match.group(1))
+    if headers and headers.get("Retry-After", "").isdigit():
+        return float(headers["Retry-After"])
+    return 1.0
+
+
+class TelegramRateLimiter:
+    """
+    Distributed token-bucket limiter shared by all workers through Redis.
+    Every send takes one token from its bot bucket and one from its chat bucket.
+    When Redis is unreachable the limiter fails open so alerts keep flowing.
+    """
+    def __init__(self, enabled=RATE_LIMIT_ENABLED, bot_per_second=BOT_RATE_PER_SECOND, chat_per_minute=CHAT_RATE_PER_MINUTE):
+        self.enabled = enabled
+        self.bot_capacity = bot_per_second
+        self.bot_rate = bot_per_second / 1000.0
+        self.chat_capacity = chat_per_minute
+        self.chat_rate = chat_per_minute / 60000.0
+        self._script = None
+
+    def _keys(self, auth_token, chat_id):
+        fingerprint = token_fingerprint(auth_token)
+        chat = chat_key_part(chat_id)
+        buckets = [(f"{KEY_PREFIX}:bot:{fingerprint}", self.bot_capacity, self.bot_rate)]
+        holds = [f"{KEY_PREFIX}:hold:bot:{fingerprint}"]
+        if chat:
+            buckets.append((f"{KEY_PREFIX}:chat:{fingerprint}:{chat}", self.chat_capacity, self.chat_rate))
+            holds.append(f"{KEY_PREFIX}:hold:chat:{fingerprint}:{chat}")
+        return buckets, holds
+
+    def try_acquire(self, auth_token, chat_id=None):
+        """
+        Takes a token for this bot/chat if available. Returns 0, or the seconds to wait before trying again.
+        """
+        if not redis_available():
+            return 0.0
+        if self._script is None:
+            self._script = get_redis().register_script(TOKEN_BUCKET_SCRIPT)
+        buckets, holds = self._keys(auth_token, chat_id)
+        args = [len(buckets)]
+        for _, capacity, rate in buckets:
+            args.extend([capacity, rate])
+        wait_ms = self._script(keys=[key for key, _, _ in buckets] + holds, args=args)
+        return int(wait_ms) / 1000.0
+
+    def acquire(self, auth_token, chat_id=None, max_wait=RATE_LIMIT_MAX_WAIT):
+        """
+        Blocks until a token is available and returns the seconds waited.
+        Raises RateLimitTimeout if that would take longer than max_wait.
+        """
+        if not (self.enabled and auth_token):
+            return 0.0
+        waited = 0.0
+        while True:
+            try:
+                wait = self.try_acquire(auth_token, chat_id)
+            except redis.RedisError as e:
+                mark_redis_unavailable(e, telegram_logger, "sending without rate limits")
+                return waited
+            if wait <= 0:
+                if waited:
+                    telegram_logger.debug(f"Waited {waited:.2f}s for a rate limit token (chat {chat_key_part(chat_id)})")
+                return waited
+            if waited + wait > max_wait:
+                raise RateLimitTimeout(f"Rate limit wait for chat {chat_key_part(chat_id)} exceeds {max_wait:.0f}s")
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, auth_token, chat_id=None, max_wait=RATE_LIMIT_MAX_WAIT):
+        """
+        asyncio version of acquire: waits without blocking the event loop. The Redis round trip runs in the
+        loop's default executor, so a slow or unreachable Redis stalls only this send, not the whole batch.
+        """
+        if not (self.enabled and auth_token):
+            return 0.0
+        loop = asyncio.get_running_loop()
+        waited = 0.0
+        while True:
+            try:
+                wait = await loop.run_in_executor(None, self.try_acquire, auth_token, chat_id)
+            except redis.RedisError as e:
+                mark_redis_unavailable(e, telegram_logger, "sending without rate limits")
+                return waited
+            if wait <= 0:
+                return waited
+            if waited + wait > max_wait:
+                raise RateLimitTimeout(f"Rate limit wait for chat {chat_key_part(chat_id)} exceeds {max_wait:.0f}s")
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def penalize(self, auth_token, chat_id, retry_after):
+        """
+        Holds every send to this chat (or the whole bot, without a chat) for retry_after seconds after a 429.
+        """
+        if not (self.enabled and auth_token and redis_available()):
+            return
+        _, holds = self._keys(auth_token, chat_id)
+        try:
+            get_redis().set(holds[-1], retry_after, px=max(int(retry_after * 1000), 1))
+        except redis.RedisError as e:
+            mark_redis_unavailable(e, telegram_logger, "not recording retry_after holds")
+
+    async def penalize_async(self, auth_token, chat_id, retry_after):
+        """
+        asyncio version of penalize, with the Redis write in the loop's default executor.
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.penalize, auth_token, chat_id, retry_after)
+
+    def bucket_levels(self):
+        """
+        Returns the current token level of every live bucket and the remaining 429 holds.
+        """
+        client = get_redis()
+        now_ms = time.time() * 1000
+        levels = {"buckets": {}, "holds": {}}
+        for key in client.scan_iter(match=f"{KEY_PREFIX}:*", count=500):
+            if key.startswith(f"{KEY_PREFIX}:hold:"):
+                pttl = client.pttl(key)
+                if pttl > 0:
+                    levels["holds"][key] = pttl / 1000.0
+                continue
+            tokens, ts = client.hmget(key, "tokens", "ts")
+            if tokens is None:
+                continue
+            capacity, rate = (self.bot_capacity, self.bot_rate) if key.startswith(f"{KEY_PREFIX}:bot:") else (self.chat_capacity, self.chat_rate)
+            current = min(capacity, float(tokens) + max(0.0, now_ms - float(ts or now_ms)) * rate)
+            levels["buckets"][key] = {"tokens": round(current, 2), "capacity": capacity}
+        return levels
+
+
+rate_limiter = TelegramRateLimiter()
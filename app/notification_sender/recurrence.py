@@ -0,0 +1,224 @@
+import calendar
+import pytz
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# Legacy recurrence_interval values, kept working as RRULE shorthands
+LEGACY_INTERVALS = {
+    "hourly": "FREQ=HOURLY",
+    "daily": "FREQ=DAILY",
+    "weekly": "FREQ=WEEKLY",
+    "monthly": "FREQ=MONTHLY",
+    "yearly": "FREQ=YEARLY",
+}
+
+FREQUENCIES = ("HOURLY", "DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+
+# Fixed-length frequencies step with plain timedelta arithmetic; MONTHLY/YEARLY step by calendar month
+FIXED_STEPS = {
+    "HOURLY": timedelta(hours=1),
+    "DAILY": timedelta(days=1),
+    "WEEKLY": timedelta(weeks=1),
+}
+
+Rule = namedtuple("Rule", ["freq", "interval", "count", "until", "bymonthday"])
+
+
+class InvalidRecurrenceRule(ValueError):
+    pass
+
+
+def _parse_until(value):
+    for fmt in ("%Y%m%dT%H%M%SZ", "%Y%m%dT%H%M%S", "%Y%m%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise InvalidRecurrenceRule(f"Invalid UNTIL value: {value}")
+
+
+def parse_rule(recurrence_interval):
+    """
+    Parses a recurrence_interval into a Rule.
+
+    Accepts the legacy 'daily' / 'weekly' / 'monthly' values and RRULE-style strings such as
+    'FREQ=MONTHLY;INTERVAL=3', 'RRULE:FREQ=WEEKLY;INTERVAL=2;COUNT=10' or
+    'FREQ=MONTHLY;BYMONTHDAY=-1' (last day of every month).
+    Returns None for an empty value and raises InvalidRecurrenceRule for anything else it cannot read.
+    """
+    if not recurrence_interval:
+        return None
+    text = recurrence_interval.strip()
+    text = LEGACY_INTERVALS.get(text.lower(), text)
+    if text.upper().startswith("RRULE:"):
+        text = text[len("RRULE:"):]
+
+    parts = {}
+    for part in text.split(";"):
+        if not part.strip():
+            continue
+        key, sep, value = part.partition("=")
+        if not sep:
+            raise InvalidRecurrenceRule(f"Invalid recurrence rule part: {part}")
+        parts[key.strip().upper()] = value.strip()
+
+    freq = parts.get("FREQ", "").upper()
+    if freq not in FREQUENCIES:
+        raise InvalidRecurrenceRule(f"Unsupported recurrence frequency: {recurrence_interval}")
+
+    try:
+        interval = int(parts.get("INTERVAL", 1))
+        count = int(parts["COUNT"]) if "COUNT" in parts else None
+        bymonthday = int(parts["BYMONTHDAY"]) if "BYMONTHDAY" in parts else None
+    except ValueError:
+        raise InvalidRecurrenceRule(f"Invalid number in recurrence rule: {recurrence_interval}")
+    if interval < 1 or (count is not None and count < 1):
+        raise InvalidRecurrenceRule(f"INTERVAL and COUNT must be positive: {recurrence_interval}")
+    if bymonthday is not None and (freq not in ("MONTHLY", "YEARLY") or not (bymonthday == -1 or 1 <= bymonthday <= 31)):
+        raise InvalidRecurrenceRule(f"BYMONTHDAY must be 1..31 or -1 on a MONTHLY/YEARLY rule: {recurrence_interval}")
+    until = _parse_until(parts["UNTIL"]) if "UNTIL" in parts else None
+
+    return Rule(freq, interval, count, until, bymonthday)
+
+
+def to_naive_utc(value):
+    """
+    Normalises a datetime to naive UTC (the form DateTime columns come back in).
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def sample_anchor(sample):
+    """
+    Returns the first occurrence of a sample (its start date and time, UTC, naive).
+    """
+    if not (sample.start_date and sample.start_time):
+        return None
+    return datetime.combine(sample.start_date, sample.start_time)
+
+
+def occurrence(anchor, rule, k):
+    """
+    Returns the k-th occurrence (k = 0 is the anchor itself).
+
+    Every occurrence is computed from the anchor rather than from the previous one, so a monthly
+    rule anchored on the 31st lands on Feb 28/29 and goes back to the 31st in March instead of
+    drifting to the 28th for good.
+    """
+    step = FIXED_STEPS.get(rule.freq)
+    if step is not None:
+        return anchor + step * (k * rule.interval)
+    months = k * rule.interval * (12 if rule.freq == "YEARLY" else 1)
+    year, month = divmod(anchor.month - 1 + months, 12)
+    year += anchor.year
+    month += 1
+    last_day = calendar.monthrange(year, month)[1]
+    if rule.bymonthday == -1:
+        day = last_day
+    else:
+        day = min(rule.bymonthday or anchor.day, last_day)
+    return anchor.replace(year=year, month=month, day=day)
+
+
+def _first_index_after(anchor, rule, after):
+    """
+    Returns the smallest k whose occurrence is strictly after `after`, without stepping through history.
+    """
+    # Nothing runs before the anchor (BYMONTHDAY can move the first occurrence earlier in its month)
+    after = max(after, anchor - timedelta(microseconds=1)) if after is not None else anchor - timedelta(microseconds=1)
+    step = FIXED_STEPS.get(rule.freq)
+    if step is not None:
+        k = max(int((after - anchor) // (step * rule.interval)), 0)
+    else:
+        months = (after.year - anchor.year) * 12 + (after.month - anchor.month)
+        if rule.freq == "YEARLY":
+            months //= 12
+        k = max(months // rule.interval - 1, 0)
+    # The estimate is at most one or two steps short (month lengths, clamping); finish by walking
+    while occurrence(anchor, rule, k) <= after:
+        k += 1
+    return k
+
+
+def _within_bounds(rule, k, value, end_date):
+    if rule.count is not None and k >= rule.count:
+        return False
+    if rule.until is not None and value > rule.until:
+        return False
+    if end_date is not None and value.date() > end_date:
+        return False
+    return True
+
+
+def next_occurrence_after(anchor, rule, after, end_date=None):
+    """
+    Returns the first occurrence strictly after `after` (naive UTC), or None when the rule is exhausted
+    (COUNT, UNTIL or the sample's end_date).
+    """
+    anchor = to_naive_utc(anchor)
+    after = to_naive_utc(after)
+    k = _first_index_after(anchor, rule, after)
+    value = occurrence(anchor, rule, k)
+    return value if _within_bounds(rule, k, value, end_date) else None
+
+
+def compute_next_run_at(sample, after):
+    """
+    Returns the next run of a recurring sample strictly after `after` as an aware UTC datetime,
+    or None when the sample does not recur (any more).
+    """
+    if not (sample.is_recurring and sample.recurrence_interval):
+        return None
+    anchor = sample_anchor(sample)
+    if anchor is None:
+        return None
+    rule = parse_rule(sample.recurrence_interval)
+    next_run = next_occurrence_after(anchor, rule, after, end_date=sample.end_date)
+    return next_run.replace(tzinfo=pytz.utc) if next_run else None
+
+
+def iter_occurrences(anchor, rule, after=None, end_date=None):
+    """
+    Yields the occurrences of a rule strictly after `after` (all of them from the anchor when None),
+    in order, until the rule is exhausted.
+    """
+    anchor = to_naive_utc(anchor)
+    k = _first_index_after(anchor, rule, to_naive_utc(after))
+    while True:
+        value = occurrence(anchor, rule, k)
+        if not _within_bounds(rule, k, value, end_date):
+            return
+        yield value
+        k += 1
+
+
+def expand_occurrences(samples, n, after=None):
+    """
+    Expands the next n occurrences of many samples in one pass, with no database access.
+    Returns {sample_id: [aware UTC datetimes]}; samples that do not recur or have an
+    unreadable rule map to an empty list.
+    """
+    after = after or datetime.now(pytz.utc)
+    rules = {}
+    expanded = {}
+    for sample in samples:
+        expanded[sample.id] = []
+        anchor = sample_anchor(sample)
+        if not (sample.is_recurring and sample.recurrence_interval and anchor):
+            continue
+        # Samples share a handful of distinct rules; parse each one once
+        key = sample.recurrence_interval
+        if key not in rules:
+            try:
+                rules[key] = parse_rule(key)
+            except InvalidRecurrenceRule:
+                rules[key] = None
+        rule = rules[key]
+        if rule is None:
+            continue
+        occurrences = iter_occurrences(anchor, rule, after=after, end_date=sample.end_date)
+        for _, value in zip(range(n), occurrences):
+            expanded[sample.id].append(value.replace(tzinfo=pytz.utc))
+    return expanded
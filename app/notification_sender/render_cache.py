@@ -0,0 +1,146 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import redis
+from app.redis_client import get_redis, redis_available, mark_redis_unavailable
+from app.logging_config import celery_logger
+
+RENDER_CACHE_TTL = int(os.getenv("RENDER_CACHE_TTL", 7 * 24 * 3600))  # seconds a rendered template lives in Redis
+RENDER_CACHE_LOCAL_SIZE = int(os.getenv("RENDER_CACHE_LOCAL_SIZE", 256))  # templates kept in process memory (LRU)
+RENDER_CACHE_STATS_LOG_EVERY = int(os.getenv("RENDER_CACHE_STATS_LOG_EVERY", 1000))
+
+KEY_PREFIX = "msgcache"
+STATS_KEY = f"{KEY_PREFIX}:stats"
+
+_local = OrderedDict()
+_local_lock = threading.Lock()
+_local_stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+# Redis hits not yet added to the shared counters; they ride along with the next write to Redis
+# (a miss, or the periodic stats log) instead of costing every cached render a round trip
+_unflushed = {"hits": 0}
+
+
+def content_hash(sample):
+    """
+    Hash of every sample field the static part of the message depends on.
+    """
+    digest = hashlib.sha1()
+    for value in (sample.title, sample.sender_name, sample.body, sample.document_upload, os.getenv("MEDIA_BASE_URL")):
+        digest.update((value or "").encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+def _remember(key, template):
+    with _local_lock:
+        _local[key] = template
+        _local.move_to_end(key)
+        while len(_local) > RENDER_CACHE_LOCAL_SIZE:
+            _local.popitem(last=False)
+
+
+def _flush_hits(pipe):
+    hits, _unflushed["hits"] = _unflushed["hits"], 0
+    if hits:
+        pipe.hincrby(STATS_KEY, "hits", hits)
+    return hits
+
+
+def _count(stat):
+    _local_stats[stat] += 1
+    if stat == "redis_hits":
+        _unflushed["hits"] += 1
+    total = sum(_local_stats.values())
+    if RENDER_CACHE_STATS_LOG_EVERY and total % RENDER_CACHE_STATS_LOG_EVERY == 0:
+        hits = _local_stats["local_hits"] + _local_stats["redis_hits"]
+        celery_logger.info(f"Message render cache: {hits}/{total} hits ({hits / total:.0%}), {_local_stats}")
+        if redis_available() and _unflushed["hits"]:
+            try:
+                pipe = get_redis().pipeline(transaction=False)
+                _flush_hits(pipe)
+                pipe.execute()
+            except redis.RedisError as e:
+                mark_redis_unavailable(e, celery_logger, "rendering messages without the shared cache")
+
+
+def get_template(sample, render):
+    """
+    Returns the rendered static template of a sample, calling render(sample) only on a cache miss.
+    Templates are looked up in a small in-process LRU, then in Redis (per sample, with a TTL).
+    Keys carry a content hash, so an edited sample never gets a stale template.
+    """
+    if not sample.id:
+        return render(sample)
+
+    digest = content_hash(sample)
+    local_key = (sample.id, digest)
+    with _local_lock:
+        template = _local.get(local_key)
+        if template is not None:
+            _local.move_to_end(local_key)
+    if template is not None:
+        _count("local_hits")
+        return template
+
+    redis_key = f"{KEY_PREFIX}:{sample.id}"
+    if redis_available():
+        try:
+            cached = get_redis().get(redis_key)
+            if cached:
+                entry = json.loads(cached)
+                if entry.get("hash") == digest:
+                    _remember(local_key, entry["template"])
+                    _count("redis_hits")
+                    return entry["template"]
+        except redis.RedisError as e:
+            mark_redis_unavailable(e, celery_logger, "rendering messages without the shared cache")
+        except ValueError:
+            pass
+
+    template = render(sample)
+    _remember(local_key, template)
+    _count("misses")
+    if redis_available():
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.set(redis_key, json.dumps({"hash": digest, "template": template}), ex=RENDER_CACHE_TTL)
+            pipe.hincrby(STATS_KEY, "misses", 1)
+            _flush_hits(pipe)
+            pipe.execute()
+        except redis.RedisError as e:
+            mark_redis_unavailable(e, celery_logger, "rendering messages without the shared cache")
+    return template
+
+
+def invalidate_sample(sample_id):
+    """
+    Drops the cached template of a sample (called when it is edited or deleted).
+    """
+    with _local_lock:
+        for key in [key for key in _local if key[0] == sample_id]:
+            del _local[key]
+    # Entries are keyed by content hash, so one left behind during an outage is never served stale
+    if not redis_available():
+        return
+    try:
+        get_redis().delete(f"{KEY_PREFIX}:{sample_id}")
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, celery_logger, f"leaving the cached template of sample {sample_id} to expire")
+
+
+def cache_stats():
+    """
+    Returns this process' hit counters and the shared Redis counters (Redis hits/misses across all workers;
+    each worker adds its Redis hits in batches).
+    """
+    stats = {"process": dict(_local_stats), "shared": None}
+    if not redis_available():
+        return stats
+    try:
+        shared = get_redis().hgetall(STATS_KEY)
+        stats["shared"] = {key: int(value) for key, value in shared.items()}
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, celery_logger, "showing render cache stats without the shared counters")
+    return stats
@@ -0,0 +1,94 @@
+import os
+import re
+import random
+from collections import namedtuple
+from app.notification_sender.rate_limiter import extract_retry_after
+
+# Attempts a log gets (first send included) before it is dead-lettered
+SEND_MAX_ATTEMPTS = int(os.getenv("SEND_RETRY_MAX_ATTEMPTS", 5))
+# Exponential backoff: base * 2 ** attempt seconds, capped, with jitter
+RETRY_BASE_DELAY = float(os.getenv("SEND_RETRY_BASE_DELAY", 15))
+RETRY_MAX_DELAY = float(os.getenv("SEND_RETRY_MAX_DELAY", 1800))
+
+PERMANENT = "permanent"
+TRANSIENT = "transient"
+
+# Telegram / configuration errors that no retry will fix
+PERMANENT_ERROR_RE = re.compile(
+    r"unauthorized|forbidden|invalid bot token|chat not found|kicked from the|bot was blocked|"
+    r"user is deactivated|not enough rights|have no rights|chat_id is empty|peer_id_invalid|"
+    r"group chat was upgraded|message is too long|can't parse entities|wrong file identifier|"
+    r"configuration or auth_token missing|no valid target chat_id|sample not found|file not found",
+    re.IGNORECASE,
+)
+
+SendFailure = namedtuple("SendFailure", ["kind", "message", "retry_after"])
+
+
+class SendError(Exception):
+    """
+    Raised by the send tasks for a failed send; carries the classified failure.
+    """
+    def __init__(self, failure):
+        super().__init__(f"Failed to send message: {failure.message}")
+        self.failure = failure
+
+
+def is_send_failure(response):
+    """
+    True for a group_message result that did not deliver: our {"error": ...} dicts and Telegram's {"ok": false, ...}.
+    """
+    return "error" in response or response.get("ok") is False
+
+
+def classify_message(message, status_code=None):
+    if status_code is not None and 500 <= status_code < 600:
+        return TRANSIENT
+    if PERMANENT_ERROR_RE.search(message or ""):
+        return PERMANENT
+    if status_code in (400, 401, 403, 404):
+        return PERMANENT
+    return TRANSIENT
+
+
+def classify_response(response):
+    """
+    Classifies a failed group_message result. Rate limits are transient and carry Telegram's retry_after.
+    """
+    status_code = response.get("error_code") or response.get("status_code")
+    message = str(response.get("description") or response.get("error") or f"HTTP {status_code}")
+    retry_after = extract_retry_after(status_code, None, response)
+    if retry_after is not None:
+        return SendFailure(TRANSIENT, message, retry_after)
+    return SendFailure(classify_message(message, status_code), message, None)
+
+
+def classify_exception(exc):
+    """
+    Classifies an exception raised while preparing or sending (network errors and anything unknown are transient).
+    """
+    if isinstance(exc, SendError):
+        return exc.failure
+    response = getattr(exc, "response", None)
+    status_code = getattr(response, "status_code", None)
+    return SendFailure(classify_message(str(exc), status_code), str(exc), None)
+
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Seconds to wait before retry number `attempt` (0-based): exponential backoff with equal jitter,
+    never shorter than the server's retry_after.
+    """
+    ceiling = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+    delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+    if retry_after is not None:
+        # A little jitter on top keeps every rate-limited send from retrying in the same instant
+        delay = max(delay, retry_after + random.uniform(0, min(retry_after, 5)))
+    return delay
+
+
+def should_retry(failure, attempts):
+    """
+    True when a failure after `attempts` attempts (first send included) deserves another try.
+    """
+    return failure.kind == TRANSIENT and attempts < SEND_MAX_ATTEMPTS
@@ -0,0 +1,156 @@
+import os
+import uuid
+import pytz
+import redis
+from datetime import datetime, timedelta
+from sqlalchemy import exists
+from app.extensions import db
+from app.redis_client import get_redis, redis_available, mark_redis_unavailable
+from app.notification_sender.models import AlertLog, AlertDeadLetter
+from app.notification_sender.hourly_stats import transition_rows, record_transitions
+from app.logging_config import celery_logger
+
+# Exactly-once delivery guard keyed by AlertLog.id. A log is only sent by the worker that wins both
+#   1. a Redis SET NX lease (cheap, filters most duplicates without touching the database), and
+#   2. a conditional UPDATE moving the log from an expected status to 'delivering'.
+# The UPDATE is the source of truth; the lease only keeps duplicate work away from MySQL.
+DELIVERY_LEASE_SECONDS = int(os.getenv("SEND_GUARD_LEASE_SECONDS", 900))  # longest a batch may take, rate-limit waits included
+KEY_PREFIX = "sendguard"
+STATS_KEY = f"{KEY_PREFIX}:stats"
+
+# Statuses a log may be delivered from: batches get claimed logs, single sends also take retries.
+# A dead-lettered log is 'failed' too, but is never delivered until it is replayed (see _deliverable).
+BATCH_PRIOR_STATUSES = ("queued", "sending")
+RETRY_PRIOR_STATUSES = ("queued", "sending", "failed")
+
+# Deletes each lease key only if it still holds our token (ARGV[1])
+RELEASE_SCRIPT = """
+local released = 0
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('DEL', key)
+        released = released + 1
+    end
+end
+return released
+"""
+
+_release_script = None
+_local_stats = {"acquired": 0, "redis_duplicates": 0, "db_duplicates": 0}
+
+
+def _lease_key(log_id):
+    return f"{KEY_PREFIX}:{log_id}"
+
+
+def _acquire_leases(log_ids, token):
+    if not redis_available():
+        return list(log_ids)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for log_id in log_ids:
+            pipe.set(_lease_key(log_id), token, nx=True, ex=DELIVERY_LEASE_SECONDS)
+        results = pipe.execute()
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, celery_logger, "guarding deliveries with the database only")
+        return list(log_ids)
+    return [log_id for log_id, ok in zip(log_ids, results) if ok]
+
+
+def release_delivery(log_ids, token):
+    """
+    Drops this worker's Redis leases (after the outcome is committed) so retries can take them.
+    """
+    global _release_script
+    if not log_ids or not redis_available():
+        return
+    try:
+        if _release_script is None:
+            _release_script = get_redis().register_script(RELEASE_SCRIPT)
+        _release_script(keys=[_lease_key(log_id) for log_id in log_ids], args=[token])
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, celery_logger, "guarding deliveries with the database only")
+
+
+def _record(acquired, redis_duplicates, db_duplicates):
+    _local_stats["acquired"] += acquired
+    _local_stats["redis_duplicates"] += redis_duplicates
+    _local_stats["db_duplicates"] += db_duplicates
+    if not (redis_duplicates or db_duplicates):
+        return
+    celery_logger.warning(f"Send guard suppressed {redis_duplicates + db_duplicates} duplicate deliveries "
+                          f"({redis_duplicates} by lease, {db_duplicates} by status).")
+    if not redis_available():
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(STATS_KEY, "redis_duplicates", redis_duplicates)
+        pipe.hincrby(STATS_KEY, "db_duplicates", db_duplicates)
+        pipe.execute()
+    except redis.RedisError as e:
+        mark_redis_unavailable(e, celery_logger, "keeping send guard counters in process only")
+
+
+def _deliverable(log_ids, prior_statuses):
+    """
+    Filter for the logs that may move to 'delivering': in prior_statuses and, for retries, without a pending
+    dead letter, so a late duplicate task (countdown retry, manual re-enqueue) cannot resend a dead-lettered log.
+    """
+    conditions = [AlertLog.id.in_(log_ids), AlertLog.status.in_(prior_statuses)]
+    if "failed" in prior_statuses:
+        conditions.append(~exists().where(
+            AlertDeadLetter.log_id == AlertLog.id,
+            AlertDeadLetter.replayed_at.is_(None)
+        ))
+    return conditions
+
+
+def acquire_delivery(log_ids, prior_statuses, now=None):
+    """
+    Takes the right to deliver each log, before any HTTP call.
+    Returns (token, acquired_ids): the logs now 'delivering' under this token, in input order.
+    Logs held by another worker, already sent, dead-lettered or in any status outside prior_statuses are skipped.
+    """
+    now = now or datetime.now(pytz.utc)
+    token = uuid.uuid4().hex
+    log_ids = list(dict.fromkeys(log_ids))
+    if not log_ids:
+        return token, []
+
+    leased = _acquire_leases(log_ids, token)
+    acquired = []
+    if leased:
+        try:
+            deliverable = _deliverable(leased, prior_statuses)
+            rows = transition_rows(AlertLog.query.filter(*deliverable).with_for_update())
+            AlertLog.query.filter(*deliverable).update({
+                AlertLog.status: "delivering",
+                AlertLog.claim_token: token,
+                AlertLog.lease_expires_at: now + timedelta(seconds=DELIVERY_LEASE_SECONDS)
+            }, synchronize_session=False)
+            won = {row.id for row in db.session.query(AlertLog.id).filter(
+                AlertLog.id.in_(leased), AlertLog.claim_token == token
+            )}
+            record_transitions([row for row in rows if row.id in won], "delivering")
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            release_delivery(leased, token)
+            raise
+        acquired = [log_id for log_id in leased if log_id in won]
+        release_delivery([log_id for log_id in leased if log_id not in won], token)
+
+    _record(len(acquired), len(log_ids) - len(leased), len(leased) - len(acquired))
+    return token, acquired
+
+
+def send_guard_stats():
+    """
+    Returns this process' counters and the shared duplicate counters of all workers.
+    """
+    stats = {"process": dict(_local_stats)}
+    try:
+        stats["shared"] = {key: int(value) for key, value in get_redis().hgetall(STATS_KEY).items()}
+    except redis.RedisError:
+        stats["shared"] = None
+    return stats
@@ -3,21 +3,45 @@ import pytz
 import re
 import html
 import json
+import time
+import uuid
 from pathlib import Path
 from flask import url_for
 from app.notification_sender.telegram_bot import TelegramBot
+from app.notification_sender.async_sender import AsyncTelegramBot
 from app.notification_sender.models import AlertSample, AlertLog, AlertConfig, TestCredentials
 from app.authentication.models import User
 from app.notification_sender.message_geneator import get_messages
+from app.notification_sender.claim_engine import claim_due_logs, release_expired_leases, mark_dispatch_failed, LEASE_SECONDS
+from app.notification_sender.recurrence import compute_next_run_at, sample_anchor, InvalidRecurrenceRule, to_naive_utc
+from app.notification_sender.delay_queue import DELAY_QUEUE_ENABLED, schedule_logs, record_lag
+from app.notification_sender.retry_policy import (
+    SendError, SendFailure, PERMANENT, is_send_failure, classify_response, classify_exception, retry_delay, should_retry
+)
+from app.notification_sender.dead_letter import dead_letter
+from app.notification_sender.send_guard import acquire_delivery, release_delivery, BATCH_PRIOR_STATUSES, RETRY_PRIOR_STATUSES
+from app.notification_sender.media_pipeline import sample_photo_derivatives
+from app.notification_sender.log_archive import archive_old_logs
 from app.extensions import db
+from app.notification_sender.log_profiles import bare_profile
+from sqlalchemy.orm import undefer
 from datetime import datetime,timedelta
-from app.celery_config import celery
+from app.celery_config import celery, queue_depths, QUEUE_SCHEDULED
+from app.worker_app import get_worker_app
 from app.logging_config import celery_logger, test_message_logger, scheduled_alerts_logger
 from werkzeug.utils import secure_filename
 from flask import current_app
 
+SEND_BATCH_SIZE = int(os.getenv("SEND_BATCH_SIZE", 100))  # logs per send_alert_batch_task
+# With the delay queue on, the DB reconciliation only claims logs overdue by this much (the dispatcher owns the rest)
+RECONCILE_GRACE_SECONDS = int(os.getenv("SCHEDULER_RECONCILE_GRACE_SECONDS", 10))
+# ...and re-adds queued logs due within this horizon to the delay queue, in case Redis lost them
+RECONCILE_HORIZON_SECONDS = int(os.getenv("SCHEDULER_RECONCILE_HORIZON_SECONDS", 3600))
+QUEUE_DEPTH_WARN = int(os.getenv("QUEUE_DEPTH_WARN", 1000))  # waiting messages per queue before report_queue_depths warns
+
 # Initialize TelegramBot
 telegram_bot = TelegramBot()
+async_telegram_bot = AsyncTelegramBot()
 
 def get_images_path_for_bot(image_path_name_with_folder):
     media_base_url = os.getenv("MEDIA_BASE_URL")
@@ -41,246 +65,488 @@ def redact_token(message, token):
         return message.replace(token, "[REDACTED_AUTH_TOKEN]")
     return message
 
-@celery.task(bind=True, max_retries=3)
+
+def resolve_target_chat(user, config):
+    """
+    Returns (target_chat_id, thread_id): the user's private chat if set, otherwise the config's group.
+    """
+    target_chat_id = None
+    thread_id = None
+    if user and user.telegram_chat_id:
+        target_chat_id = user.telegram_chat_id
+    elif config.group_id:
+        group_id_str = str(config.group_id)
+        if "_" in group_id_str:
+            parts = group_id_str.split("_", 1)
+            if len(parts) == 2 and parts[1].isdigit():
+                target_chat_id, thread_id = parts
+            else:
+                target_chat_id = group_id_str
+        else:
+            target_chat_id = group_id_str
+    return target_chat_id, thread_id
+
+
+def prepare_alert_message(sample, user, config):
+    """
+    Validates the sample's configuration and builds the group_message arguments for it.
+    Raises an Exception when the alert cannot be sent.
+    """
+    # Basic validation
+    if not (config and config.auth_token):
+        raise Exception("Configuration or auth_token missing.")
+
+    target_chat_id, thread_id = resolve_target_chat(user, config)
+    if not target_chat_id:
+        raise Exception("No valid target chat_id found for user or group.")
+
+    message = get_messages(sample=sample)
+
+    # Convert local photo filename to URL for the bot (the optimized derivative once it is built)
+    image_filename = sample.photo_for_send
+    celery_logger.debug(f"DEBUG: photo before URL construction: {image_filename}")
+    image_url_for_bot = get_images_path_for_bot(image_filename) if image_filename else None
+
+    return {
+        "auth_token": config.auth_token,
+        "group_id": target_chat_id, # group_message will parse thread_id from this if present
+        "message": message,
+        "images_path": image_url_for_bot, # Pass the URL here
+    }
+
+
+def schedule_next_recurrence(sample, sent_log=None):
+    """
+    Adds the queued AlertLog for the next occurrence of a recurring sample and moves
+    sample.next_run_at to it (not committed).
+    The next occurrence follows the slot sent_log was scheduled for, so no send history is queried.
+    """
+    if not (sample.is_recurring and sample.recurrence_interval):
+        sample.next_run_at = None
+        return None
+
+    # The slot that was just sent: the log's scheduled_for, else the precomputed next run, else the start
+    base_datetime = (sent_log.scheduled_for if sent_log else None) or sample.next_run_at or sample_anchor(sample)
+    try:
+        next_scheduled_for = compute_next_run_at(sample, base_datetime)
+    except InvalidRecurrenceRule as e:
+        celery_logger.error(f"Sample {sample.id} has an invalid recurrence rule: {e}")
+        next_scheduled_for = None
+
+    sample.next_run_at = next_scheduled_for
+    if not next_scheduled_for:
+        return None
+
+    # Create a new log entry for the next recurrence
+    new_log = AlertLog(
+        sample_id=sample.id,
+        service_id=sample.service_id,
+        config_id=sample.config_id,
+        sender_id=sample.user_id,
+        sender_name=sample.sender_name,
+        target_user_id=sample.user_id,
+        audience="all", # Assuming recurring alerts are always for "all"
+        status="queued",
+        scheduled_for=next_scheduled_for,
+        queued_at=datetime.now(pytz.utc)
+    )
+    db.session.add(new_log)
+    celery_logger.info(f"Scheduled next recurrence for sample {sample.id} at {next_scheduled_for}")
+    return new_log
+
+
+def describe_send_error(exc):
+    """
+    Turns a send exception into the message stored on the AlertLog.
+    """
+    error_message_for_log = str(exc)
+    if isinstance(exc, Exception) and hasattr(exc, 'response') and exc.response:
+        try:
+            # Attempt to parse JSON error from Telegram API response
+            api_error_response = exc.response.json()
+            if "description" in api_error_response:
+                error_message_from_api = api_error_response["description"]
+                if "Unauthorized" in error_message_from_api or "Forbidden" in error_message_for_log or "invalid bot token" in error_message_for_log:
+                    error_message_for_log = "Wrong token. Please check your authentication token."
+                elif "chat not found" in error_message_for_log or "kicked from the group chat" in error_message_for_log:
+                    error_message_for_log = "Wrong group ID. Please check the group ID."
+                else:
+                    error_message_for_log = f"Telegram API Error: {error_message_from_api}"
+            elif "error" in api_error_response: # Fallback for simpler error structures
+                error_message_for_log = f"Telegram API Error: {api_error_response['error']}"
+        except (json.JSONDecodeError, AttributeError):
+            # If response is not JSON or doesn't have expected structure
+            error_message_for_log = f"API Error: {exc.response.text}"
+    elif "error" in str(exc): # Catch errors from telegram_bot.py's return dict
+        if "Unauthorized" in str(exc) or "Forbidden" in str(exc) or "invalid bot token" in str(exc):
+            error_message_for_log = "Wrong token. Please check your authentication token."
+        elif "chat not found" in str(exc) or "kicked from the group chat" in str(exc):
+            error_message_for_log = "Wrong group ID. Please check the group ID."
+        else:
+            error_message_for_log = str(exc)
+    return error_message_for_log
+
+
+@celery.task(bind=True, max_retries=None)
 def send_alert_task(self, sample_id, log_id=None):
     """
     Celery task to send an alert with photo and document support.
+    Transient failures are retried with exponential backoff (honoring Telegram's retry_after) until
+    SEND_MAX_ATTEMPTS; permanent ones and exhausted logs go to the dead-letter store.
     """
     celery_logger.info(f"send_alert_task received for sample {sample_id}, log {log_id}") # Added log
-    from app.app import create_app
-    app = create_app()
+    app = get_worker_app()
     with app.app_context():
-        sample = AlertSample.query.get(sample_id)
-        log = AlertLog.query.get(log_id) if log_id else AlertLog.query.filter_by(sample_id=sample_id).order_by(AlertLog.queued_at.desc()).first()
+        if not log_id:
+            latest = db.session.query(AlertLog.id).filter_by(sample_id=sample_id).order_by(AlertLog.queued_at.desc()).first()
+            log_id = latest.id if latest else None
+
+        # Exactly-once guard: skip before any HTTP call if another worker holds or already delivered this log
+        guard_token = None
+        if log_id:
+            guard_token, acquired = acquire_delivery([log_id], RETRY_PRIOR_STATUSES)
+            if not acquired:
+                celery_logger.info(f"Log {log_id} is delivered or being delivered elsewhere, skipping duplicate send.")
+                return f"Log {log_id} duplicate skipped"
+        try:
+            return deliver_alert(self, sample_id, log_id)
+        finally:
+            if guard_token:
+                release_delivery([log_id], guard_token)
 
-        if not sample:
-            if log:
-                log.status = "failed"
-                log.error_message = "Sample not found"
-                db.session.commit()
-            celery_logger.error(f"Sample {sample_id} not found")
-            return "Sample not found"
 
-        try:
-            user = User.query.get(sample.user_id) if sample.user_id else None
-            config = AlertConfig.query.get(sample.config_id)
-
-            # Basic validation
-            if not (config and config.auth_token):
-                raise Exception("Configuration or auth_token missing.")
-
-            # Determine target chat_id and thread_id
-            target_chat_id = None
-            thread_id = None
-            if user and user.telegram_chat_id:
-                target_chat_id = user.telegram_chat_id
-            elif config.group_id:
-                group_id_str = str(config.group_id)
-                if "_" in group_id_str:
-                    parts = group_id_str.split("_", 1)
-                    if len(parts) == 2 and parts[1].isdigit():
-                        target_chat_id, thread_id = parts
-                    else:
-                        target_chat_id = group_id_str
-                else:
-                    target_chat_id = group_id_str
+def deliver_alert(task, sample_id, log_id):
+    """
+    Body of send_alert_task, run once the log's delivery guard is held.
+    """
+    sample = AlertSample.query.options(undefer(AlertSample.body)).get(sample_id)
+    log = AlertLog.query.options(*bare_profile()).get(log_id) if log_id else None
 
-            if not target_chat_id:
-                raise Exception("No valid target chat_id found for user or group.")
-            
-            message = get_messages(sample=sample)
+    if not sample:
+        if log:
+            dead_letter(log, SendFailure(PERMANENT, "Sample not found", None), (log.retry_count or 0) + 1)
+            db.session.commit()
+        celery_logger.error(f"Sample {sample_id} not found")
+        return "Sample not found"
 
+    config = None
+    try:
+        user = User.query.get(sample.user_id) if sample.user_id else None
+        config = AlertConfig.query.get(sample.config_id)
 
-            # Define file paths
-            photo_path = os.path.join(app.config['UPLOAD_FOLDER'], sample.photo_upload) if sample.photo_upload else None
-            document_path = os.path.join(app.config['UPLOAD_FOLDER'], sample.document_upload) if sample.document_upload else None
+        # --- Sending Logic ---
+        # The group_message method handles both text and photo, and thread_id parsing
+        # It will send a photo with caption if images_path is provided,
+        # otherwise it will send a text message.
+        prepared = prepare_alert_message(sample, user, config)
 
-            # --- Sending Logic ---
-            # The group_message method handles both text and photo, and thread_id parsing
-            # It will send a photo with caption if photo_path is provided and exists,
-            # otherwise it will send a text message.
-            
-            # Check if photo exists and is valid
-            # We don't need to check os.path.exists here, as get_images_path_for_bot will construct the URL
-            # based on the filename stored in sample.photo_upload
-            
-            image_filename = sample.photo_upload if sample.photo_upload else None
-            celery_logger.debug(f"DEBUG: sample.photo_upload before URL construction: {image_filename}") # ADD THIS LINE
-            
-            # Convert local photo filename to URL for the bot
-            image_url_for_bot = get_images_path_for_bot(image_filename) if image_filename else None
+        celery_logger.info(f"Sending message for alert {sample.id} to {prepared['group_id']} with photo: {prepared['images_path']}")
 
-            celery_logger.info(f"Sending message for alert {sample.id} to {target_chat_id} with photo: {image_url_for_bot}")
+        response = telegram_bot.group_message(**prepared)
 
-            response = telegram_bot.group_message(
-                auth_token=config.auth_token,
-                group_id=target_chat_id, # group_message will parse thread_id from this if present
-                message=message,
-                images_path=image_url_for_bot # Pass the URL here
-            )
+        if is_send_failure(response):
+            raise SendError(classify_response(response))
 
-            if "error" in response:
-                raise Exception(f"Failed to send message: {response['error']}")
+        # The document sending logic was commented out in the original tasks.py,
+        # so I will keep it commented out. If it needs to be re-enabled,
+        # it would require a separate call to group_message or a new method
+        # in telegram_bot.py for documents.
 
-            # The document sending logic was commented out in the original tasks.py,
-            # so I will keep it commented out. If it needs to be re-enabled,
-            # it would require a separate call to group_message or a new method
-            # in telegram_bot.py for documents.
-            
-            
-            # if document_path and os.path.exists(document_path):
-            #     celery_logger.info(f"Sending document for alert {sample.id} to {target_chat_id}")
-            #     doc_caption = f"Attached document for: {sample.title}"
-            #     response = telegram_bot.send_document(
-            #         auth_token=config.auth_token, chat_id=target_chat_id, file_path=document_path, caption=doc_caption, thread_id=thread_id
-            #     )
-            #     if "error" in response:
-            #         raise Exception(f"Failed to send document: {response['error']}")
-
-            # # Mark the alert as sent
-            sample.sent_at = datetime.now(pytz.utc)
-            if log:
-                log.status = "sent"
-                log.sent_at = sample.sent_at
-
-            # Handle recurring alerts
-            if sample.is_recurring and sample.recurrence_interval:
-                # Find the last scheduled/sent datetime for this sample
-                last_log = AlertLog.query.filter_by(sample_id=sample.id, status="sent").order_by(AlertLog.sent_at.desc()).first()
-                if last_log and last_log.scheduled_for:
-                    # Use the scheduled_for of the last sent log as the base for the next calculation
-                    base_datetime = last_log.scheduled_for
-                else:
-                    # If no previous sent log, use the sample's start_datetime
-                    base_datetime = datetime.combine(sample.start_date, sample.start_time).replace(tzinfo=pytz.utc)
-
-                next_scheduled_for = None
-                if sample.recurrence_interval == "daily":
-                    next_scheduled_for = base_datetime + timedelta(days=1)
-                elif sample.recurrence_interval == "weekly":
-                    next_scheduled_for = base_datetime + timedelta(weeks=1)
-                elif sample.recurrence_interval == "monthly":
-                    # This is more complex. Need to handle month-end dates.
-                    # Add one month, then adjust day if necessary.
-                    year = base_datetime.year
-                    month = base_datetime.month + 1
-                    if month > 12:
-                        month = 1
-                        year += 1
-                    
-                    day = base_datetime.day
-                    # Get the last day of the next month
-                    # This calculation needs to be robust for month boundaries
-                    try:
-                        next_scheduled_for = datetime(year, month, day, base_datetime.hour, base_datetime.minute, base_datetime.second, tzinfo=pytz.utc)
-                    except ValueError: # Day out of range for month
-                        # Set to the last day of the next month
-                        last_day_of_next_month = (datetime(year, month + 1, 1, tzinfo=pytz.utc) - timedelta(days=1)).day if month < 12 else (datetime(year + 1, 1, 1, tzinfo=pytz.utc) - timedelta(days=1)).day
-                        next_scheduled_for = datetime(year, month, last_day_of_next_month, base_datetime.hour, base_datetime.minute, base_datetime.second, tzinfo=pytz.utc)
-                
-                if next_scheduled_for and (not sample.end_date or next_scheduled_for.date() <= sample.end_date):
-                    # Create a new log entry for the next recurrence
-                    new_log = AlertLog(
-                        sample_id=sample.id,
-                        service_id=sample.service_id,
-                        config_id=sample.config_id,
-                        sender_id=sample.user_id,
-                        sender_name=sample.sender_name,
-                        target_user_id=sample.user_id,
-                        audience="all", # Assuming recurring alerts are always for "all"
-                        status="queued",
-                        scheduled_for=next_scheduled_for,
-                        queued_at=datetime.now(pytz.utc)
-                    )
-                    db.session.add(new_log)
-                    celery_logger.info(f"Scheduled next recurrence for sample {sample.id} at {next_scheduled_for}")
 
+        # if document_path and os.path.exists(document_path):
+        #     celery_logger.info(f"Sending document for alert {sample.id} to {target_chat_id}")
+        #     doc_caption = f"Attached document for: {sample.title}"
+        #     response = telegram_bot.send_document(
+        #         auth_token=config.auth_token, chat_id=target_chat_id, file_path=document_path, caption=doc_caption, thread_id=thread_id
+        #     )
+        #     if "error" in response:
+        #         raise Exception(f"Failed to send document: {response['error']}")
+
+        # # Mark the alert as sent
+        sample.sent_at = datetime.now(pytz.utc)
+        if log:
+            log.status = "sent"
+            log.sent_at = sample.sent_at
+
+        # Handle recurring alerts
+        schedule_next_recurrence(sample, sent_log=log)
+
+        db.session.commit()
+        celery_logger.info(f"Alert {sample.id} processed successfully.")
+        return f"Alert {sample.id} sent"
+
+    except Exception as exc:
+        failure = classify_exception(exc)
+        error_message_for_log = redact_token(describe_send_error(exc), config.auth_token if config else None)
+        attempts = ((log.retry_count or 0) if log else task.request.retries) + 1
+        celery_logger.error(redact_token(f"Error sending alert {sample_id} ({failure.kind}, attempt {attempts}): {exc}", config.auth_token if config else None))
+
+        if not should_retry(failure, attempts):
+            if log:
+                dead_letter(log, failure, attempts, error_message=error_message_for_log)
             db.session.commit()
-            celery_logger.info(f"Alert {sample.id} processed successfully.")
-            return f"Alert {sample.id} sent"
+            return f"Alert {sample_id} dead-lettered"
+
+        if log:
+            log.status = "failed"
+            log.error_message = error_message_for_log
+            log.retry_count = attempts
+        db.session.commit()
+        # Retry on the queue this attempt came from, so retries of scheduled batches stay off the immediate queue
+        queue = (task.request.delivery_info or {}).get("routing_key")
+        raise task.retry(exc=exc, countdown=retry_delay(attempts - 1, failure.retry_after), queue=queue)
+
 
+def load_batch(log_ids):
+    """
+    Loads the logs of a batch with their samples, configs and users in one IN (...) query per table.
+    Returns (logs, samples, configs, users), the last three keyed by id.
+    """
+    logs = AlertLog.query.options(*bare_profile()).filter(AlertLog.id.in_(log_ids)).order_by(AlertLog.id).all()
+
+    sample_ids = {log.sample_id for log in logs}
+    samples = {sample.id: sample for sample in AlertSample.query.options(undefer(AlertSample.body)).filter(
+        AlertSample.id.in_(sample_ids)
+    )} if sample_ids else {}
+
+    config_ids = {sample.config_id for sample in samples.values() if sample.config_id}
+    configs = {config.id: config for config in AlertConfig.query.filter(AlertConfig.id.in_(config_ids))} if config_ids else {}
+
+    user_ids = {sample.user_id for sample in samples.values() if sample.user_id}
+    users = {user.id: user for user in User.query.filter(User.id.in_(user_ids))} if user_ids else {}
+
+    return logs, samples, configs, users
+
+
+@celery.task(bind=True)
+def send_alert_batch_task(self, log_ids):
+    """
+    Sends a batch of alert logs concurrently through the asyncio sender and records every result in one commit.
+    Samples, configs and users are preloaded with a few IN (...) queries.
+    Logs that fail transiently are handed to send_alert_task with a backoff so they keep its retry policy;
+    permanent failures are dead-lettered right away.
+    Logs another worker is delivering (or already delivered) are skipped by the send guard.
+    """
+    celery_logger.info(f"send_alert_batch_task received {len(log_ids)} logs")
+    app = get_worker_app()
+    with app.app_context():
+        guard_token, acquired = acquire_delivery(log_ids, BATCH_PRIOR_STATUSES)
+        if not acquired:
+            celery_logger.info(f"send_alert_batch_task: all {len(log_ids)} logs delivered or being delivered elsewhere, skipping.")
+            return {"sent": 0, "failed": 0, "skipped": len(log_ids), "seconds": 0.0}
+        try:
+            result = deliver_batch(acquired)
+        finally:
+            release_delivery(acquired, guard_token)
+        result["skipped"] = len(log_ids) - len(acquired)
+        return result
+
+
+def deliver_batch(log_ids):
+    """
+    Body of send_alert_batch_task, run once the delivery guard of every log is held.
+    """
+    logs, samples, configs, users = load_batch(log_ids)
+
+    prepared = []
+    failed = 0
+    for log in logs:
+        sample = samples.get(log.sample_id)
+        if not sample:
+            dead_letter(log, SendFailure(PERMANENT, "Sample not found", None), (log.retry_count or 0) + 1)
+            failed += 1
+            continue
+        user = users.get(sample.user_id) if sample.user_id else None
+        config = configs.get(sample.config_id)
+        try:
+            prepared.append((log, sample, config, prepare_alert_message(sample, user, config)))
         except Exception as exc:
-            error_message_for_log = str(exc)
-            if isinstance(exc, Exception) and hasattr(exc, 'response') and exc.response:
+            # Missing config, token or target: no retry will fix these
+            error_message = redact_token(describe_send_error(exc), config.auth_token if config else None)
+            dead_letter(log, classify_exception(exc), (log.retry_count or 0) + 1, error_message=error_message)
+            failed += 1
+
+    started = time.perf_counter()
+    responses = async_telegram_bot.send_batch_sync([item for _, _, _, item in prepared])
+    elapsed = time.perf_counter() - started
+
+    retry_logs = []
+    sent = 0
+    sent_at = datetime.now(pytz.utc)
+    for (log, sample, config, item), response in zip(prepared, responses):
+        if is_send_failure(response):
+            exc = SendError(classify_response(response))
+            attempts = (log.retry_count or 0) + 1
+            error_message = redact_token(describe_send_error(exc), config.auth_token)
+            if should_retry(exc.failure, attempts):
+                log.status = "failed"
+                log.error_message = error_message
+                log.retry_count = attempts
+                retry_logs.append((log.sample_id, log.id, retry_delay(attempts - 1, exc.failure.retry_after)))
+            else:
+                dead_letter(log, exc.failure, attempts, error_message=error_message)
+            failed += 1
+            continue
+        log.status = "sent"
+        log.sent_at = sent_at
+        sent += 1
+        if sample.is_recurring and sample.recurrence_interval:
+            schedule_next_recurrence(sample, sent_log=log)
+
+    db.session.commit()
+
+    for sample_id, log_id, countdown in retry_logs:
+        send_alert_task.apply_async((sample_id,), {"log_id": log_id}, countdown=countdown, queue=QUEUE_SCHEDULED)
+
+    celery_logger.info(f"send_alert_batch_task: {sent} sent, {failed} failed, {len(prepared)} sent concurrently in {elapsed:.2f}s")
+    return {"sent": sent, "failed": failed, "seconds": elapsed}
+
+
+def dispatch_claimed_batch(claimed, chunk_size=SEND_BATCH_SIZE):
+    """
+    Publishes send_alert_batch_task for a claimed batch, chunk_size logs per task, over one producer connection.
+    Returns the log ids whose publish failed.
+    """
+    log_ids = [log_id for log_id, _ in claimed]
+    failed_log_ids = []
+    try:
+        with celery.producer_or_acquire() as producer:
+            for offset in range(0, len(log_ids), chunk_size):
+                chunk = log_ids[offset:offset + chunk_size]
                 try:
-                    # Attempt to parse JSON error from Telegram API response
-                    api_error_response = exc.response.json()
-                    if "description" in api_error_response:
-                        error_message_from_api = api_error_response["description"]
-                        if "Unauthorized" in error_message_from_api or "Forbidden" in error_message_for_log or "invalid bot token" in error_message_for_log:
-                            error_message_for_log = "Wrong token. Please check your authentication token."
-                        elif "chat not found" in error_message_for_log or "kicked from the group chat" in error_message_for_log:
-                            error_message_for_log = "Wrong group ID. Please check the group ID."
-                        else:
-                            error_message_for_log = f"Telegram API Error: {error_message_from_api}"
-                    elif "error" in api_error_response: # Fallback for simpler error structures
-                        error_message_for_log = f"Telegram API Error: {api_error_response['error']}"
-                except (json.JSONDecodeError, AttributeError):
-                    # If response is not JSON or doesn't have expected structure
-                    error_message_for_log = f"API Error: {exc.response.text}"
-            elif "error" in str(exc): # Catch errors from telegram_bot.py's return dict
-                if "Unauthorized" in str(exc) or "Forbidden" in str(exc) or "invalid bot token" in str(exc):
-                    error_message_for_log = "Wrong token. Please check your authentication token."
-                elif "chat not found" in str(exc) or "kicked from the group chat" in str(exc):
-                    error_message_for_log = "Wrong group ID. Please check the group ID."
-                else:
-                    error_message_for_log = str(exc)
+                    send_alert_batch_task.apply_async((chunk,), producer=producer)
+                except Exception as dispatch_e:
+                    scheduled_alerts_logger.exception(f"Error dispatching send_alert_batch_task for logs {chunk[0]}..{chunk[-1]}: {dispatch_e}")
+                    failed_log_ids.extend(chunk)
+    except Exception as producer_e:
+        scheduled_alerts_logger.exception(f"Error acquiring producer for batch dispatch: {producer_e}")
+        return log_ids
+    return failed_log_ids
 
 
-            if log:
-                log.status = "failed"
-                log.error_message = redact_token(error_message_for_log, config.auth_token if config else None)
-                log.retry_count = (log.retry_count or 0) + 1
-            db.session.commit()
-            celery_logger.exception(redact_token(f"Error sending alert {sample_id}: {exc}", config.auth_token if config else None))
-            raise self.retry(exc=exc, countdown=60)
+def dispatch_lags_ms(claim, dispatched_at):
+    """
+    Scheduler lag of each claimed log: dispatch time minus scheduled_for, in milliseconds.
+    """
+    dispatched_at = to_naive_utc(dispatched_at)
+    return [
+        (dispatched_at - scheduled_for).total_seconds() * 1000
+        for scheduled_for in claim["scheduled_for"].values() if scheduled_for
+    ]
+
+
+def requeue_upcoming_logs(horizon_seconds=RECONCILE_HORIZON_SECONDS, now=None):
+    """
+    Re-adds queued logs due within the horizon to the delay queue (ZADD is idempotent).
+    Covers logs created while Redis was down or lost with it.
+    """
+    now = now or datetime.now(pytz.utc)
+    rows = db.session.query(AlertLog.id, AlertLog.scheduled_for).filter(
+        AlertLog.status == 'queued',
+        AlertLog.scheduled_for <= now + timedelta(seconds=horizon_seconds)
+    ).all()
+    requeued = 0
+    for offset in range(0, len(rows), 5000):
+        chunk = rows[offset:offset + 5000]
+        if not schedule_logs([(row.id, row.scheduled_for) for row in chunk]):
+            break
+        requeued += len(chunk)
+    return requeued
 
 
 @celery.task
 def check_scheduled_alerts():
     """
-    Finds queued logs that are due and dispatches them for sending.
+    Claims queued logs that are due in fixed-size batches and dispatches them for sending.
+    With the delay queue enabled this is the periodic reconciliation: the dispatcher sends logs on time,
+    and this only picks up logs overdue by more than RECONCILE_GRACE_SECONDS and re-seeds the queue.
     """
-    from app.app import create_app
-    app = create_app()
+    app = get_worker_app()
     try:
         with app.app_context():
             scheduled_alerts_logger.info("Starting check_scheduled_alerts task.")
-            now = datetime.now(pytz.utc)
-            
-            # Find all log entries that are queued and past their scheduled time.
-            logs_to_process = AlertLog.query.filter(
-                AlertLog.status == 'queued',
-                AlertLog.scheduled_for <= now
-            ).all()
-
-            for log in logs_to_process:
-                # Mark as 'sending' to prevent this worker, or another one,
-                # from picking up the same log in the next scheduler run.
-                log.status = 'sending'
-                db.session.commit()
-                
-                celery_logger.info(f"Dispatching alert from log {log.id} for sample {log.sample_id}")
-                scheduled_alerts_logger.info(f"Dispatching alert from log {log.id} for sample {log.sample_id}.")
-                try:
-                    send_alert_task.delay(log.sample_id, log_id=log.id)
-                except Exception as dispatch_e:
-                    scheduled_alerts_logger.exception(f"Error dispatching send_alert_task for log {log.id}: {dispatch_e}")
-                    log.status = 'dispatch_failed' # Update log status
-                    db.session.commit()
-            scheduled_alerts_logger.info("Finished check_scheduled_alerts task.")
+            started = time.perf_counter()
+            release_expired_leases()
+
+            total_claimed = 0
+            total_failed = 0
+            batches = 0
+            while True:
+                now = datetime.now(pytz.utc)
+                due_before = now - timedelta(seconds=RECONCILE_GRACE_SECONDS) if DELAY_QUEUE_ENABLED else now
+                claim = claim_due_logs(now=now, due_before=due_before)
+                claimed = claim["claimed"]
+                if not claimed:
+                    break
+
+                batches += 1
+                total_claimed += len(claimed)
+                scheduled_alerts_logger.info(
+                    f"Claimed {len(claimed)}/{claim['requested']} logs in {claim['claim_ms']:.1f} ms (token {claim['token']})."
+                )
+
+                failed_log_ids = dispatch_claimed_batch(claimed)
+                if failed_log_ids:
+                    total_failed += mark_dispatch_failed(failed_log_ids)
+                record_lag(dispatch_lags_ms(claim, datetime.now(pytz.utc)), "reconcile" if DELAY_QUEUE_ENABLED else "poll")
+
+                # A short batch means nothing else is due (or the rest is locked by another scheduler)
+                if len(claimed) < claim["requested"]:
+                    break
+
+            requeued = requeue_upcoming_logs() if DELAY_QUEUE_ENABLED else 0
+
+            elapsed = time.perf_counter() - started
+            if DELAY_QUEUE_ENABLED and total_claimed:
+                scheduled_alerts_logger.warning(f"Reconciliation dispatched {total_claimed} overdue logs the delay queue missed.")
+            scheduled_alerts_logger.info(
+                f"Finished check_scheduled_alerts task: {total_claimed} claimed in {batches} batches, "
+                f"{total_failed} dispatch failures, {requeued} re-queued, {elapsed:.2f}s."
+            )
+            return {"claimed": total_claimed, "batches": batches, "dispatch_failed": total_failed, "requeued": requeued, "seconds": elapsed}
     except Exception as e:
         scheduled_alerts_logger.exception(f"Error in check_scheduled_alerts task: {e}")
 
 
 
+@celery.task
+def report_queue_depths():
+    """
+    Logs how many messages wait in each Celery queue and warns about queues above QUEUE_DEPTH_WARN.
+    """
+    try:
+        depths = queue_depths()
+    except Exception as e:
+        scheduled_alerts_logger.error(f"Error reading queue depths: {e}")
+        return None
+    scheduled_alerts_logger.info(f"Queue depths: {depths}")
+    for name, depth in depths.items():
+        if depth is not None and depth > QUEUE_DEPTH_WARN:
+            scheduled_alerts_logger.warning(f"Queue '{name}' has {depth} waiting messages (warn above {QUEUE_DEPTH_WARN}).")
+    return depths
+
+
+@celery.task
+def archive_old_logs_task():
+    """
+    Moves finalized alert logs past the retention window out of alert_log (see log_archive.py).
+    """
+    app = get_worker_app()
+    with app.app_context():
+        try:
+            return archive_old_logs()
+        except Exception as e:
+            celery_logger.exception(f"Error in archive_old_logs_task: {e}")
+            return None
+
+
+
 # @celery.task(bind=True, max_retries=3)
 # def send_test_alert_task(self, sample_id, test_credential_id):
 #     """
 #     Celery task to send a test alert.
 #     """
-#     from app.app import create_app
-#     app = create_app()
+#     app = get_worker_app()
 #     with app.app_context():
 #         sample = AlertSample.query.get(sample_id)
 #         test_message_logger.info(f"image_path_name_with_folder: {get_images_path_for_bot(sample.photo_upload)} ---------------")
@@ -338,11 +604,10 @@ def send_test_alert_task(self, sample_id, test_credential_id):
     """
     Celery task to send a test alert.
     """
-    from app.app import create_app
-    app = create_app()
+    app = get_worker_app()
     with app.app_context():
-        sample = AlertSample.query.get(sample_id)
-        test_message_logger.info(f"image_path_name_with_folder: {get_images_path_for_bot(sample.photo_upload)} ---------------")
+        sample = AlertSample.query.options(undefer(AlertSample.body)).get(sample_id)
+        test_message_logger.info(f"image_path_name_with_folder: {get_images_path_for_bot(sample.photo_for_send) if sample else None} ---------------")
         test_credential = TestCredentials.query.get(test_credential_id)
 
         if not sample:
@@ -357,19 +622,19 @@ def send_test_alert_task(self, sample_id, test_credential_id):
             message = get_messages(sample)
             
             # Define file paths
-            photo_path = os.path.join(app.config['UPLOAD_FOLDER'], sample.photo_upload) if sample.photo_upload else None
+            photo_path = os.path.join(app.config['UPLOAD_FOLDER'], sample.photo_for_send) if sample.photo_for_send else None
             # document_path = os.path.join(app.config['UPLOAD_FOLDER'], sample.document_upload) if sample.document_upload else None
 
             # --- Sending Logic ---
 
-            celery_logger.info(f"Final photo path: {get_images_path_for_bot(sample.photo_upload)}, Type: {type(get_images_path_for_bot(sample.photo_upload))}")
+            celery_logger.info(f"Final photo path: {get_images_path_for_bot(sample.photo_for_send)}, Type: {type(get_images_path_for_bot(sample.photo_for_send))}")
 
-            if get_images_path_for_bot(sample.photo_upload):
+            if get_images_path_for_bot(sample.photo_for_send):
                 response = telegram_bot.group_message(
                     auth_token=test_credential.auth_token,
                     group_id=test_credential.group_id,
                     message=message,
-                    full_file_path=get_images_path_for_bot(sample.photo_upload)
+                    full_file_path=get_images_path_for_bot(sample.photo_for_send)
                 )
             else:
                 response = telegram_bot.group_message(
@@ -398,8 +663,7 @@ def process_sample_creation_task(self, sample_id, scheduled_for_utc_str, queued_
     """
     Celery task to handle file uploads and AlertLog creation for a new sample.
     """
-    from app.app import create_app
-    app = create_app()
+    app = get_worker_app()
     with app.app_context():
         try:
             sample = AlertSample.query.get(sample_id)
@@ -415,6 +679,11 @@ def process_sample_creation_task(self, sample_id, scheduled_for_utc_str, queued_
             scheduled_for_utc = datetime.fromisoformat(scheduled_for_utc_str) if scheduled_for_utc_str else None
             queued_at_utc = datetime.fromisoformat(queued_at_utc_str)
 
+            # A log due now is created already claimed and sent straight from here on the immediate queue,
+            # instead of waiting for the delay queue dispatcher and a scheduled batch
+            now = datetime.now(pytz.utc)
+            send_now = scheduled_for_utc is None or scheduled_for_utc <= now
+
             # Create AlertLog entry
             log = AlertLog(
                 sample_id=sample.id,
@@ -424,16 +693,51 @@ def process_sample_creation_task(self, sample_id, scheduled_for_utc_str, queued_
                 sender_name=sender_name,
                 target_user_id=target_user_id,
                 audience=audience,
-                status="queued",
-                scheduled_for=scheduled_for_utc,
+                status="sending" if send_now else "queued",
+                scheduled_for=scheduled_for_utc or now,
                 queued_at=queued_at_utc
             )
+            if send_now:
+                # If this worker dies before publishing, release_expired_leases puts the log back in the queue
+                log.claim_token = uuid.uuid4().hex
+                log.lease_expires_at = now + timedelta(seconds=LEASE_SECONDS)
             db.session.add(log)
             db.session.commit()
             celery_logger.info(f"Sample {sample_id} processed and log created successfully by Celery task.")
+
+            if send_now:
+                try:
+                    send_alert_task.apply_async((sample.id,), {"log_id": log.id})
+                except Exception as dispatch_e:
+                    celery_logger.exception(f"Error dispatching send_alert_task for log {log.id}: {dispatch_e}")
+                    mark_dispatch_failed([log.id])
+                    return "Sample processed, send dispatch failed"
+                return "Sample processed and log sent to the immediate queue"
             return "Sample processed and log created"
 
         except Exception as e:
             db.session.rollback()
             celery_logger.exception(f"Error in process_sample_creation_task for sample {sample_id}:")
-            raise # Re-raise to allow Celery to handle retries if configured
\ No newline at end of file
+            raise # Re-raise to allow Celery to handle retries if configured
+
+@celery.task(bind=True)
+def process_sample_media_task(self, sample_id, photo_upload):
+    """
+    Builds the Telegram derivative and thumbnail of a sample's photo after upload.
+    photo_upload is the file the task was queued for; if the sample's photo changed since, a newer task handles it.
+    """
+    app = get_worker_app()
+    with app.app_context():
+        sample = AlertSample.query.get(sample_id)
+        if not sample or sample.photo_upload != photo_upload:
+            celery_logger.info(f"Skipping media processing for sample {sample_id}: photo changed or sample removed.")
+            return "Skipped"
+        fields = sample_photo_derivatives(sample, app.config['UPLOAD_FOLDER'])
+        if not fields:
+            return "No derivatives"
+        # Only if the photo was not replaced while the derivatives were being built
+        AlertSample.query.filter(
+            AlertSample.id == sample_id, AlertSample.photo_upload == photo_upload
+        ).update(fields, synchronize_session=False)
+        db.session.commit()
+        return f"Derivatives built for sample {sample_id}"
@@ -1,15 +1,122 @@
 import requests
 import json
 import os
+import re
+import time
+import socket
+import threading
 import html # Added this line for html.escape
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
 from app.logging_config import telegram_logger
+from app.notification_sender.rate_limiter import rate_limiter, extract_retry_after, RateLimitTimeout, RATE_LIMIT_429_RETRIES
+from app.notification_sender import file_id_cache
+from app.notification_sender.multipart import MultipartStream
 
 # Load environment variables
 load_dotenv()
 
 bot_group_api = os.getenv("BOT_GROUP_API")
 bot_private_api = os.getenv("BOT_PRIVATE_API")
+telegram_api_base = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")  # or a local Bot API server
+
+# HTTP connection pool settings
+HTTP_POOL_CONNECTIONS = int(os.getenv("BOT_HTTP_POOL_CONNECTIONS", 10))  # number of hosts kept pooled
+HTTP_POOL_MAXSIZE = int(os.getenv("BOT_HTTP_POOL_MAXSIZE", 20))  # connections kept per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv("BOT_HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.getenv("BOT_HTTP_READ_TIMEOUT", 10))
+HTTP_UPLOAD_READ_TIMEOUT = float(os.getenv("BOT_HTTP_UPLOAD_READ_TIMEOUT", 30))
+HTTP_KEEPALIVE_IDLE = int(os.getenv("BOT_HTTP_KEEPALIVE_IDLE", 60))  # seconds before TCP keep-alive probes
+HTTP_STATS_LOG_EVERY = int(os.getenv("BOT_HTTP_STATS_LOG_EVERY", 1000))
+
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+HTTP_UPLOAD_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_UPLOAD_READ_TIMEOUT)
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that enables TCP keep-alive on pooled sockets so idle connections survive NAT/proxies.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        # Keep urllib3's defaults (TCP_NODELAY) and add keep-alive probes
+        socket_options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, HTTP_KEEPALIVE_IDLE))
+        kwargs["socket_options"] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+_http_session = None
+_http_session_pid = None
+_http_session_lock = threading.Lock()
+_http_request_count = 0
+
+
+def get_http_session():
+    """
+    Returns the pooled requests session of this process.
+    The session is rebuilt after a fork so worker processes never share sockets.
+    """
+    global _http_session, _http_session_pid
+    if _http_session is None or _http_session_pid != os.getpid():
+        with _http_session_lock:
+            if _http_session is None or _http_session_pid != os.getpid():
+                session = requests.Session()
+                adapter = KeepAliveAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Connection": "keep-alive"})
+                _http_session = session
+                _http_session_pid = os.getpid()
+    return _http_session
+
+
+def get_connection_stats():
+    """
+    Returns per-host connection reuse stats of this process' pooled session.
+    'reused' is the number of requests served over an already open connection.
+    """
+    stats = {}
+    if _http_session is None or _http_session_pid != os.getpid():
+        return stats
+    for adapter in set(_http_session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{key.key_scheme}://{key.key_host}:{key.key_port or ''}".rstrip(":")
+            host_stats = stats.setdefault(host, {"requests": 0, "connections": 0, "reused": 0})
+            host_stats["requests"] += pool.num_requests
+            host_stats["connections"] += pool.num_connections
+            host_stats["reused"] = host_stats["requests"] - host_stats["connections"]
+    return stats
+
+
+def log_connection_stats():
+    for host, host_stats in get_connection_stats().items():
+        telegram_logger.info(
+            f"HTTP pool {host}: {host_stats['requests']} requests over {host_stats['connections']} connections "
+            f"({host_stats['reused']} reused)"
+        )
+
+
+def http_post(url, **kwargs):
+    """
+    POSTs through the pooled session and periodically logs connection reuse.
+    """
+    global _http_request_count
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    response = get_http_session().post(url, **kwargs)
+    _http_request_count += 1
+    if HTTP_STATS_LOG_EVERY and _http_request_count % HTTP_STATS_LOG_EVERY == 0:
+        log_connection_stats()
+    return response
+
+# Telegram's 400 replies for a file_id it no longer accepts
+STALE_FILE_ID_RE = re.compile(r"wrong (remote )?file identifier|file reference|wrong file_id", re.IGNORECASE)
+
 
 def redact_token_from_url(url, token):
     if token and token in url:
@@ -27,6 +134,7 @@ class TelegramBot2:
         # These URLs are not directly used by group_message, but kept for consistency if individual_message uses them
         self.private_url = bot_private_api
         self.group_url = bot_group_api
+        self.api_base = telegram_api_base
 
     def individual_message(self, mobile_number, message, image_url=None, file_path=None):
         """
@@ -55,7 +163,7 @@ class TelegramBot2:
 
         headers = {"Content-Type": "application/json"}
         try:
-            response = requests.post(self.private_url, headers=headers, data=json.dumps(payload), timeout=10)
+            response = http_post(self.private_url, headers=headers, data=json.dumps(payload))
             response.raise_for_status()  # Raise an exception for bad status codes
             telegram_logger.info(f"Individual API response: {response.text}")
             return response.json()
@@ -93,12 +201,12 @@ class TelegramBot2:
         if thread_id:
             payload["message_thread_id"] = thread_id
 
-        files = {}
+        media_kind = None
         if file_path and os.path.exists(file_path):
             file_extension = os.path.splitext(file_path)[1].lower()
             if file_extension in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']:# <--- This line
                 telegram_logger.info(f"Attempting to send photo from: {file_path} to chat_id: {chat_id}")
-                url = f"https://api.telegram.org/bot{auth_token}/sendPhoto"
+                url = f"{self.api_base}/bot{auth_token}/sendPhoto"
                 
                 caption = message # Use original message for caption, assuming it's already escaped where needed
                 if len(caption) > 1024: # Telegram caption limit
@@ -106,15 +214,10 @@ class TelegramBot2:
                     caption = caption[:1020] + "..." # Truncate and add ellipsis
 
                 payload["caption"] = caption # Use caption for photo
-                
-                try:
-                    files = {'photo': (os.path.basename(file_path), open(file_path, 'rb'))}
-                except FileNotFoundError:
-                    telegram_logger.error(f"File not found at {file_path} for group message.")
-                    return {"error": "File not found"}
+                media_kind = "photo"
             else: # Assume it's a document if not a recognized image type
                 telegram_logger.info(f"Attempting to send document from: {file_path} to chat_id: {chat_id}")
-                url = f"https://api.telegram.org/bot{auth_token}/sendDocument"
+                url = f"{self.api_base}/bot{auth_token}/sendDocument"
                 
                 caption = message # Use original message for caption, assuming it's already escaped where needed
                 if len(caption) > 1024: # Telegram caption limit
@@ -122,27 +225,32 @@ class TelegramBot2:
                     caption = caption[:1020] + "..." # Truncate and add ellipsis
 
                 payload["caption"] = caption # Use caption for document
-                
-                try:
-                    files = {'document': (os.path.basename(file_path), open(file_path, 'rb'))}
-                except FileNotFoundError:
-                    telegram_logger.error(f"File not found at {file_path} for group message.")
-                    return {"error": "File not found"}
+                media_kind = "document"
         else:
-            url = f"https://api.telegram.org/bot{auth_token}/sendMessage"
+            url = f"{self.api_base}/bot{auth_token}/sendMessage"
             payload["text"] = message # Use original message for text, assuming it's already escaped where needed
 
         log_payload = payload.copy()
         telegram_logger.info(f"Sending group message to {chat_id}. URL: {redact_token_from_url(url, auth_token)}. Payload: {json.dumps(log_payload)}")
 
         try:
-            if files:
-                response = requests.post(url, data=payload, files=files, timeout=15) # Increased timeout for file uploads
+            rate_limiter.acquire(auth_token, chat_id)
+            if media_kind:
+                response = self._post_media(url, auth_token, chat_id, media_kind, file_path, payload)
             else:
-                response = requests.post(url, json=payload, timeout=10)
+                response = http_post(url, json=payload)
+            retry_after = extract_retry_after(response.status_code, response.headers, response.text)
+            if retry_after is not None:
+                rate_limiter.penalize(auth_token, chat_id, retry_after)
             response.raise_for_status()
             telegram_logger.info(f"Group API response: {response.text}")
             return response.json()
+        except FileNotFoundError:
+            telegram_logger.error(f"File not found at {file_path} for group message.")
+            return {"error": "File not found"}
+        except RateLimitTimeout as e:
+            telegram_logger.error(f"Rate limit wait failed for group message to {chat_id}: {e}")
+            return {"error": str(e)}
         except requests.exceptions.RequestException as e:
             telegram_logger.error(f"Error sending group message to {redact_token_from_url(url, auth_token)}: {e}")
             if e.response:
@@ -153,11 +261,43 @@ class TelegramBot2:
             # Keeping it for now as per user's request to keep the code, but noting it.
             return {"status_code": response.status_code, "text": response.text}
 
+    def _post_media(self, url, auth_token, chat_id, kind, file_path, payload):
+        """
+        Posts a photo / document. If this bot already uploaded the same file content, its cached file_id
+        is sent instead of the bytes; otherwise the file is uploaded and the returned file_id cached.
+        A file_id Telegram rejects is dropped and the file uploaded again.
+        """
+        digest, size = file_id_cache.file_digest(file_path)
+        cached = file_id_cache.lookup(auth_token, kind, digest)
+        if cached:
+            response = http_post(url, json={**payload, kind: cached["file_id"]})
+            if response.status_code != 400 or not STALE_FILE_ID_RE.search(response.text):
+                if response.ok:
+                    file_id_cache.record_hit(cached)
+                return response
+            telegram_logger.warning(f"Cached {kind} file_id for {os.path.basename(file_path)} rejected, uploading again.")
+            file_id_cache.forget(auth_token, kind, digest)
+            rate_limiter.acquire(auth_token, chat_id)
+
+        started = time.perf_counter()
+        # Streamed from disk in chunks; the file is closed even when the request fails
+        with MultipartStream(payload, kind, file_path) as body:
+            response = http_post(url, data=body, headers=body.headers, timeout=HTTP_UPLOAD_TIMEOUT) # Longer read timeout for file uploads
+        upload_ms = (time.perf_counter() - started) * 1000
+        if response.ok:
+            try:
+                file_id = file_id_cache.extract_file_id(kind, response.json())
+            except ValueError:
+                file_id = None
+            if file_id:
+                file_id_cache.store(auth_token, kind, digest, file_id, size, upload_ms)
+        return response
+
     def send_document(self, auth_token, chat_id, file_path, caption=None, thread_id=None):
         """
         Sends a document to a group or individual chat.
         """
-        url = f"https://api.telegram.org/bot{auth_token}/sendDocument"
+        url = f"{self.api_base}/bot{auth_token}/sendDocument"
         
         payload = {
             "chat_id": chat_id,
@@ -169,16 +309,21 @@ class TelegramBot2:
             payload["message_thread_id"] = thread_id
 
         try:
-            with open(file_path, 'rb') as f:
-                files = {'document': (os.path.basename(file_path), f)}
-                telegram_logger.info(f"Sending document from: {file_path} to chat_id: {chat_id}. URL: {redact_token_from_url(url, auth_token)}")
-                response = requests.post(url, data=payload, files=files, timeout=30) # Increased timeout for file uploads
-                response.raise_for_status()
-                telegram_logger.info(f"Document API response: {response.text}")
-                return response.json()
+            rate_limiter.acquire(auth_token, chat_id)
+            telegram_logger.info(f"Sending document from: {file_path} to chat_id: {chat_id}. URL: {redact_token_from_url(url, auth_token)}")
+            response = self._post_media(url, auth_token, chat_id, "document", file_path, payload)
+            retry_after = extract_retry_after(response.status_code, response.headers, response.text)
+            if retry_after is not None:
+                rate_limiter.penalize(auth_token, chat_id, retry_after)
+            response.raise_for_status()
+            telegram_logger.info(f"Document API response: {response.text}")
+            return response.json()
         except FileNotFoundError:
             telegram_logger.error(f"File not found at {file_path} for sending document.")
             return {"error": "File not found"}
+        except RateLimitTimeout as e:
+            telegram_logger.error(f"Rate limit wait failed for document to {chat_id}: {e}")
+            return {"error": str(e)}
         except requests.exceptions.RequestException as e:
             telegram_logger.error(f"Error sending document to {redact_token_from_url(url, auth_token)}: {e}")
             if e.response:
@@ -190,6 +335,30 @@ class TelegramBot2:
 
 
 
+def build_group_payload(auth_token, group_id, message, images_path=None, full_file_path=None):
+    """
+    Builds the BOT_GROUP_API payload, splitting an optional thread id off "<group_id>_<thread_id>".
+    """
+    thread_id = None
+    if '_' in group_id:
+        group_id, thread_id = group_id.split('_', 1)
+
+    payload = {
+        "api_token": auth_token,
+        "group_id": group_id,
+        "message": message
+    }
+    if thread_id:
+        payload['thread_id'] = thread_id
+
+    # Use a consistent key for image URLs
+    if images_path: # This comes from send_alert_task
+        payload['image_url'] = images_path
+    elif full_file_path: # This comes from send_test_alert_task
+        payload['image_url'] = full_file_path
+    return payload
+
+
 class TelegramBot:
 
     def __init__(self):
@@ -212,38 +381,28 @@ class TelegramBot:
         headers = {
             'Content-Type': 'application/json'
         }
-        response = requests.request(
-            "POST", self.url, headers=headers, data=payload, timeout=10)
+        response = http_post(self.url, headers=headers, data=payload)
         print(response.json())
 
     def group_message(self, auth_token, group_id, message, images_path=None, file_path=None, full_file_path=None):
-        thread_id = None
-        if '_' in group_id:
-            group_id, thread_id = group_id.split('_', 1)
-
-        payload = {
-            "api_token": auth_token,
-            "group_id": group_id,
-            "message": message
-        }
-        if thread_id:
-            payload['thread_id'] = thread_id
-
-        # Use a consistent key for image URLs
-        if images_path: # This comes from send_alert_task
-            payload['image_url'] = images_path
-        elif full_file_path: # This comes from send_test_alert_task
-            payload['image_url'] = full_file_path
+        payload = build_group_payload(auth_token, group_id, message, images_path=images_path, full_file_path=full_file_path)
 
         headers = {"Content-Type": "application/json"}
 
         try:
-            response = requests.post(
-                self.group_url,
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=10
-            )
+            for attempt in range(RATE_LIMIT_429_RETRIES + 1):
+                # Wait for this bot's and this group's rate limit tokens instead of running into 429s
+                rate_limiter.acquire(auth_token, payload["group_id"])
+                response = http_post(
+                    self.group_url,
+                    headers=headers,
+                    data=json.dumps(payload)
+                )
+                retry_after = extract_retry_after(response.status_code, response.headers, response.text)
+                if retry_after is None or attempt == RATE_LIMIT_429_RETRIES:
+                    break
+                telegram_logger.warning(f"Rate limited for group {payload['group_id']}, retrying after {retry_after}s")
+                rate_limiter.penalize(auth_token, payload["group_id"], retry_after)
 
             # Log raw response for debugging
             telegram_logger.debug(f"Telegram response status={response.status_code}, text={response.text}")
@@ -259,6 +418,9 @@ class TelegramBot:
                     "raw": response.text
                 }
 
+        except RateLimitTimeout as e:
+            telegram_logger.error(f"Telegram rate limit wait failed: {str(e)}")
+            return {"ok": False, "error": str(e)}
         except requests.RequestException as e:
             telegram_logger.error(f"Telegram request failed: {str(e)}")
             return {"ok": False, "error": str(e)}
\ No newline at end of file
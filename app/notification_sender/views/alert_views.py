@@ -1,15 +1,31 @@
-from sqlalchemy.orm import joinedload
 
 import html
+from sqlalchemy.orm import undefer
 from flask import Blueprint, render_template, redirect, url_for, request, flash, session, current_app, jsonify
 from app.extensions import db
-from app.notification_sender.models import AlertService, AlertConfig, AlertSample, AlertLog, TestCredentials
+from app.notification_sender.models import AlertService, AlertConfig, AlertSample, AlertLog, AlertLogArchive, TestCredentials
 from app.authentication.models import User
 from datetime import datetime, date, time
-from app.notification_sender.tasks import send_alert_task, send_test_alert_task
+from app.notification_sender.tasks import send_alert_task, send_test_alert_task, process_sample_media_task
 import time
 from app.notification_sender.telegram_bot import TelegramBot
 from app.notification_sender.message_geneator import get_messages
+from app.notification_sender.rate_limiter import rate_limiter
+from app.notification_sender.render_cache import invalidate_sample, cache_stats
+from app.notification_sender.recurrence import parse_rule, InvalidRecurrenceRule
+from app.notification_sender.delay_queue import lag_stats
+from app.notification_sender.send_guard import send_guard_stats
+from app.notification_sender.file_id_cache import file_id_stats
+from app.notification_sender.media_pipeline import clear_sample_photo_derivatives, media_savings_report
+from app.notification_sender.media_store import store_upload, release, store_stats
+from app.notification_sender.body_images import set_sample_body, release_body_images
+from app.celery_config import queue_depths, QUEUE_IMMEDIATE
+from app.notification_sender.dead_letter import pending_dead_letters, dead_letter_summary, replay_dead_letters
+from app.notification_sender.log_archive import archive_stats, log_status_counts
+from app.pagination import keyset_paginate
+from app.notification_sender.log_profiles import bare_profile, list_profile, detail_profile
+from app.notification_sender.hourly_stats import delete_logs
+from app.dashboard_cache import invalidate_dashboard
 
 import logging
 import pytz
@@ -39,19 +55,33 @@ if not logger.handlers:
     logger.addHandler(handler)
 
 
+def queue_media_processing(sample_id, photo_filename):
+    """
+    Queues the derivative / thumbnail build of a new photo. Not fatal if it fails: sends use the original.
+    """
+    try:
+        process_sample_media_task.delay(sample_id, photo_filename)
+    except Exception as e:
+        logger.warning(f"Could not queue media processing for sample {sample_id}: {e}")
+
+
 @alert_bp.route('/logs')
 def list_logs():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = request.args.get('per_page', 10, type=int)
 
     sample_id = request.args.get('sample_id', type=int)
-    query = AlertLog.query.options(joinedload(AlertLog.sender)) # Explicitly load sender
+    archived = request.args.get('archived', 0, type=int)  # 1 = browse logs moved to the archive table
+    log_model = AlertLogArchive if archived else AlertLog
+    query = log_model.query.options(*list_profile(log_model))
     if sample_id:
         query = query.filter_by(sample_id=sample_id)
     
-    logs_pagination = query.order_by(AlertLog.queued_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    logs_pagination = keyset_paginate(query, (log_model.queued_at, log_model.id), cursor=cursor, per_page=per_page)
     logs = logs_pagination.items
+    current_user = User.query.get(session.get('user_id'))
 
+    # Display-only conversions below: nothing is queried afterwards, so they are never autoflushed
     for log in logs:
         if log.queued_at:
             log.queued_at = pytz.utc.localize(log.queued_at).astimezone(LOCAL_TZ)
@@ -59,22 +89,22 @@ def list_logs():
             log.sent_at = pytz.utc.localize(log.sent_at).astimezone(LOCAL_TZ)
         if log.scheduled_for:
             log.scheduled_for = pytz.utc.localize(log.scheduled_for).astimezone(LOCAL_TZ)
-    current_user_id = session.get('user_id')
-    current_user = User.query.get(current_user_id)
-    return render_template('list_logs.html', logs=logs, current_user=current_user, sample_id=sample_id, logs_pagination=logs_pagination)
+    return render_template('list_logs.html', logs=logs, current_user=current_user, sample_id=sample_id, archived=archived, logs_pagination=logs_pagination)
 
 
 @alert_bp.route('/logs/<int:id>')
 def detail_log(id):
-    log = AlertLog.query.options(joinedload(AlertLog.sender)).get_or_404(id)
+    # Archived logs keep their id, so old links still resolve
+    log = AlertLog.query.options(*detail_profile()).get(id) or \
+        AlertLogArchive.query.options(*detail_profile(AlertLogArchive)).get_or_404(id)
+    current_user = User.query.get(session.get('user_id'))
+
     if log.queued_at:
         log.queued_at = pytz.utc.localize(log.queued_at).astimezone(LOCAL_TZ)
     if log.sent_at:
         log.sent_at = pytz.utc.localize(log.sent_at).astimezone(LOCAL_TZ)
     if log.scheduled_for:
         log.scheduled_for = pytz.utc.localize(log.scheduled_for).astimezone(LOCAL_TZ)
-    current_user_id = session.get('user_id')
-    current_user = User.query.get(current_user_id)
 
     return render_template(
         'detail_log.html',
@@ -85,7 +115,8 @@ def detail_log(id):
 
 @alert_bp.route('/logs/delete/<int:id>', methods=['POST'])
 def delete_log(id):
-    log = AlertLog.query.get_or_404(id)
+    log = AlertLog.query.options(*bare_profile()).get(id) or \
+        AlertLogArchive.query.options(*bare_profile()).get_or_404(id)
     db.session.delete(log)
     db.session.commit()
     flash('Alert Log deleted successfully!')
@@ -94,10 +125,10 @@ def delete_log(id):
 
 @alert_bp.route('/services')
 def list_services():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = request.args.get('per_page', 10, type=int)
 
-    services_pagination = AlertService.query.paginate(page=page, per_page=per_page, error_out=False)
+    services_pagination = keyset_paginate(AlertService.query, (AlertService.id,), cursor=cursor, per_page=per_page, descending=False)
     services = services_pagination.items
 
     current_user = User.query.get(session.get('user_id'))
@@ -140,10 +171,12 @@ def delete_service(id):
     service = AlertService.query.get_or_404(id)
     for config in service.configs:
         AlertSample.query.filter_by(config_id=config.id).delete()
-        AlertLog.query.filter_by(config_id=config.id).delete()
+        delete_logs(AlertLog.query.filter_by(config_id=config.id))
+        delete_logs(AlertLogArchive.query.filter_by(config_id=config.id))
     AlertConfig.query.filter_by(service_id=service.id).delete()
     db.session.delete(service)
     db.session.commit()
+    invalidate_dashboard('service_groups')
     flash('Service and related configs & samples deleted!')
     return redirect(url_for('alert.list_services'))
 
@@ -157,10 +190,10 @@ def detail_service(id):
 
 @alert_bp.route('/configs')
 def list_configs():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = request.args.get('per_page', 10, type=int)
 
-    configs_pagination = AlertConfig.query.paginate(page=page, per_page=per_page, error_out=False)
+    configs_pagination = keyset_paginate(AlertConfig.query, (AlertConfig.id,), cursor=cursor, per_page=per_page, descending=False)
     configs = configs_pagination.items
 
     current_user = User.query.get(session.get('user_id'))
@@ -194,6 +227,7 @@ def create_config():
 
         db.session.add(config)
         db.session.commit()
+        invalidate_dashboard('service_groups')
         flash('Alert Config created successfully!')
         return redirect(url_for('alert.list_configs'))
 
@@ -224,6 +258,7 @@ def edit_config(id):
         config.senderid = request.form.get('senderid')
 
         db.session.commit()
+        invalidate_dashboard('service_groups')
         flash('Alert Config updated successfully!')
         return redirect(url_for('alert.list_configs'))
 
@@ -236,9 +271,11 @@ def edit_config(id):
 def delete_config(id):
     config = AlertConfig.query.get_or_404(id)
     AlertSample.query.filter_by(config_id=config.id).delete()
-    AlertLog.query.filter_by(config_id=config.id).delete()
+    delete_logs(AlertLog.query.filter_by(config_id=config.id))
+    delete_logs(AlertLogArchive.query.filter_by(config_id=config.id))
     db.session.delete(config)
     db.session.commit()
+    invalidate_dashboard('service_groups')
     flash('Alert Config and related logs deleted!')
     return redirect(url_for('alert.list_configs'))
 
@@ -251,10 +288,10 @@ def detail_config(id):
 # ---------------- ALERT SAMPLES ----------------
 @alert_bp.route('/samples')
 def list_samples():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = request.args.get('per_page', 10, type=int)
 
-    samples_pagination = AlertSample.query.order_by(AlertSample.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    samples_pagination = keyset_paginate(AlertSample.query, (AlertSample.id,), cursor=cursor, per_page=per_page)
     samples = samples_pagination.items
 
     current_user = User.query.get(session.get('user_id'))
@@ -288,6 +325,9 @@ def create_sample():
                 return redirect(url_for('alert.create_sample'))
 
             config = AlertConfig.query.get(request.form['config_id'])
+            if not config:
+                flash('Invalid configuration selected.', 'error')
+                return redirect(url_for('alert.create_sample'))
             user = User.query.get(request.form.get('user_id')) if request.form.get('user_id') else None
             
             current_user_id_for_task = current_user.id if current_user else None
@@ -302,18 +342,6 @@ def create_sample():
             logger.info(f"Photo file received: {bool(photo_file)} - Filename: {photo_file.filename if photo_file else 'N/A'}")
             logger.info(f"Document file received: {bool(document_file)} - Filename: {document_file.filename if document_file else 'N/A'}")
 
-            if photo_file and photo_file.filename != '':
-                photo_filename = secure_filename(photo_file.filename)
-                logger.info(f"Saving photo: {photo_filename}")
-                photo_file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], photo_filename))
-                logger.info(f"Photo saved: {photo_filename}")
-
-            if document_file and document_file.filename != '':
-                document_filename = secure_filename(document_file.filename)
-                logger.info(f"Saving document: {document_filename}")
-                document_file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], document_filename))
-                logger.info(f"Document saved: {document_filename}")
-
             start_date_str = request.form.get('start_date')
             start_time_str = request.form.get('start_time')
             end_date_str = request.form.get('end_date')
@@ -329,6 +357,12 @@ def create_sample():
 
             is_recurring = 'is_recurring' in request.form
             received_recurrence_interval = request.form.get('recurrence_interval')
+            if is_recurring:
+                try:
+                    parse_rule(received_recurrence_interval)
+                except InvalidRecurrenceRule as e:
+                    flash(f'Invalid recurrence interval: {e}', 'error')
+                    return redirect(url_for('alert.create_sample'))
             
             sender_name_from_form = request.form.get('sender_name')
             if sender_name_from_form:
@@ -338,6 +372,17 @@ def create_sample():
             else:
                 final_sender_name = "System"
 
+            # Files go to the store only once the form is valid: an early return rolls back their rows
+            if photo_file and photo_file.filename != '':
+                logger.info(f"Saving photo: {photo_file.filename}")
+                photo_filename = store_upload(photo_file, current_app.config['UPLOAD_FOLDER'])
+                logger.info(f"Photo saved: {photo_filename}")
+
+            if document_file and document_file.filename != '':
+                logger.info(f"Saving document: {document_file.filename}")
+                document_filename = store_upload(document_file, current_app.config['UPLOAD_FOLDER'])
+                logger.info(f"Document saved: {document_filename}")
+
             new_sample = AlertSample(
                 company_name=request.form.get('company_name'),
                 sender_name=final_sender_name,
@@ -346,7 +391,6 @@ def create_sample():
                 user_id=user.id if user else None,
                 device_type_id=int(request.form.get('device_type_id')) if request.form.get('device_type_id') else None,
                 title=request.form['title'],
-                body=request.form.get('body'),
                 photo_upload=photo_filename,
                 document_upload=document_filename,
                 start_date=start_datetime.astimezone(pytz.utc).date() if start_datetime else None,
@@ -354,8 +398,11 @@ def create_sample():
                 end_date=end_date,
                 is_recurring=is_recurring,
                 recurrence_interval=received_recurrence_interval if is_recurring else None,
+                next_run_at=start_datetime.astimezone(pytz.utc) if is_recurring and start_datetime else None,
                 type="Recurring" if is_recurring else "One-Time"
             )
+            # Inline base64 images go to the media store (the form is validated by now); the body keeps links to them
+            set_sample_body(new_sample, request.form.get('body'), current_app.config['UPLOAD_FOLDER'])
             db.session.add(new_sample)
             db.session.commit()
             db.session.refresh(new_sample)
@@ -365,10 +412,12 @@ def create_sample():
 
             from app.notification_sender.tasks import process_sample_creation_task
             
+            # "Send now" samples skip the maintenance pool, which also runs archiving and reconciliation
+            send_now = not start_datetime or start_datetime <= datetime.now(pytz.utc)
             max_retries = 3
             for i in range(max_retries):
                 try:
-                    process_sample_creation_task.delay(
+                    process_sample_creation_task.apply_async((
                         new_sample.id,
                         start_datetime.astimezone(pytz.utc).isoformat() if start_datetime else None,
                         datetime.now(pytz.utc).isoformat(),
@@ -378,7 +427,7 @@ def create_sample():
                         service.id,
                         config.id,
                         new_sample.sender_name
-                    )
+                    ), queue=QUEUE_IMMEDIATE if send_now else None)
                     break # If successful, break the loop
                 except Exception as celery_e:
                     logger.warning(f"Attempt {i+1}/{max_retries} to dispatch Celery task failed: {celery_e}")
@@ -386,6 +435,8 @@ def create_sample():
                         time.sleep(1) # Wait a bit before retrying
                     else:
                         raise # Re-raise if all retries fail
+            if photo_filename:
+                queue_media_processing(new_sample.id, photo_filename)
             flash('Alert Sample created successfully!', 'success')
             db.session.close() # Explicitly close the session
             return redirect(url_for('alert.list_samples'))
@@ -401,13 +452,13 @@ def create_sample():
 
 @alert_bp.route('/samples/edit/<int:id>', methods=['GET', 'POST'])
 def edit_sample(id):
-    sample = AlertSample.query.get_or_404(id)
+    sample = AlertSample.query.options(undefer(AlertSample.body)).get_or_404(id)  # the editor needs the full body
     services = AlertService.query.all()
     configs = AlertConfig.query.all()
     users = User.query.all()
     current_user = User.query.get(session.get('user_id'))
 
-    log = AlertLog.query.filter_by(sample_id=sample.id).order_by(AlertLog.queued_at.desc()).first()
+    log = AlertLog.query.options(*bare_profile()).filter_by(sample_id=sample.id).order_by(AlertLog.queued_at.desc()).first()
 
     for config_item in configs:
         config_item.service = AlertService.query.get(config_item.service_id)
@@ -420,7 +471,38 @@ def edit_sample(id):
             return redirect(url_for('alert.edit_sample', id=id))
 
         config = AlertConfig.query.get(request.form['config_id'])
+        if not config:
+            flash('Invalid configuration selected.', 'error')
+            return redirect(url_for('alert.edit_sample', id=id))
         user = User.query.get(request.form.get('user_id')) if request.form.get('user_id') else None
+        title = request.form['title']
+
+        # Validate the whole form before storing anything: files written to the store before an
+        # early return would be left on disk without a blob row
+        is_recurring = 'is_recurring' in request.form
+        if is_recurring:
+            try:
+                parse_rule(request.form.get('recurrence_interval'))
+            except InvalidRecurrenceRule as e:
+                flash(f'Invalid recurrence interval: {e}', 'error')
+                return redirect(url_for('alert.edit_sample', id=id))
+
+        start_date_str = request.form.get('start_date')
+        start_time_str = request.form.get('start_time')
+        end_date_str = request.form.get('end_date')
+
+        try:
+            start_datetime = None
+            if start_date_str and start_time_str:
+                start_datetime = datetime.strptime(f"{start_date_str} {start_time_str}", "%Y-%m-%d %H:%M")
+                start_datetime = LOCAL_TZ.localize(start_datetime)
+
+            end_date = None
+            if end_date_str:
+                end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
+        except ValueError as e:
+            flash(f'Invalid start or end date: {e}', 'error')
+            return redirect(url_for('alert.edit_sample', id=id))
 
         # Handle photo and document uploads
         photo_file = request.files.get('photo_upload')
@@ -429,38 +511,35 @@ def edit_sample(id):
         # Handle removal of existing photo
         remove_photo_existing = request.form.get('remove_photo_existing')
         if remove_photo_existing == '1' and sample.photo_upload:
-            try:
-                os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], sample.photo_upload))
-                sample.photo_upload = None
-                logger.info(f"Existing photo {sample.photo_upload} removed.")
-            except OSError as e:
-                logger.error(f"Error removing existing photo {sample.photo_upload}: {e}")
+            # Stored files are shared by content; dropping the reference lets the store collect it
+            release(sample.photo_upload)
+            logger.info(f"Existing photo {sample.photo_upload} removed.")
+            sample.photo_upload = None
+            clear_sample_photo_derivatives(sample)
 
         # Handle removal of existing document
         remove_document_existing = request.form.get('remove_document_existing')
         if remove_document_existing == '1' and sample.document_upload:
-            try:
-                os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], sample.document_upload))
-                sample.document_upload = None
-                logger.info(f"Existing document {sample.document_upload} removed.")
-            except OSError as e:
-                logger.error(f"Error removing existing document {sample.document_upload}: {e}")
+            release(sample.document_upload)
+            logger.info(f"Existing document {sample.document_upload} removed.")
+            sample.document_upload = None
 
         logger.info(f"Edit Sample - Photo file received: {bool(photo_file)} - Filename: {photo_file.filename if photo_file else 'N/A'}")
         logger.info(f"Edit Sample - Document file received: {bool(document_file)} - Filename: {document_file.filename if document_file else 'N/A'}")
 
         if photo_file and photo_file.filename != '':
-            photo_filename = secure_filename(photo_file.filename)
-            logger.info(f"Edit Sample - Saving photo: {photo_filename}")
-            photo_file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], photo_filename))
+            logger.info(f"Edit Sample - Saving photo: {photo_file.filename}")
+            photo_filename = store_upload(photo_file, current_app.config['UPLOAD_FOLDER'])
             logger.info(f"Edit Sample - Photo saved: {photo_filename}")
+            release(sample.photo_upload)
             sample.photo_upload = photo_filename
+            clear_sample_photo_derivatives(sample)
 
         if document_file and document_file.filename != '':
-            document_filename = secure_filename(document_file.filename)
-            logger.info(f"Edit Sample - Saving document: {document_filename}")
-            document_file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], document_filename))
+            logger.info(f"Edit Sample - Saving document: {document_file.filename}")
+            document_filename = store_upload(document_file, current_app.config['UPLOAD_FOLDER'])
             logger.info(f"Edit Sample - Document saved: {document_filename}")
+            release(sample.document_upload)
             sample.document_upload = document_filename
 
         sender_name_from_form = request.form.get('sender_name')
@@ -476,10 +555,8 @@ def edit_sample(id):
 
         sample.service_id = service.id
         sample.config_id = config.id
-        sample.title = request.form['title']
-        sample.body = request.form.get('body')
+        sample.title = title
         
-        is_recurring = 'is_recurring' in request.form
         sample.is_recurring = is_recurring
         
         if sample.is_recurring:
@@ -492,24 +569,17 @@ def edit_sample(id):
 
         sample.type = "Recurring" if is_recurring else "One-Time"
 
-        start_date_str = request.form.get('start_date')
-        start_time_str = request.form.get('start_time')
-        end_date_str = request.form.get('end_date')
-
-        start_datetime = None
-        if start_date_str and start_time_str:
-            start_datetime = datetime.strptime(f"{start_date_str} {start_time_str}", "%Y-%m-%d %H:%M")
-            start_datetime = LOCAL_TZ.localize(start_datetime)
-
-        end_date = None
-        if end_date_str:
-            end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-
         sample.start_date=start_datetime.astimezone(pytz.utc).date() if start_datetime else None
         sample.start_time=start_datetime.astimezone(pytz.utc).time() if start_datetime else None
         sample.end_date=end_date
+        sample.next_run_at = start_datetime.astimezone(pytz.utc) if is_recurring and start_datetime else None
+        # Last step before the commit: it writes the body's inline images to the store
+        set_sample_body(sample, request.form.get('body'), current_app.config['UPLOAD_FOLDER'])
 
         db.session.commit()
+        invalidate_sample(sample.id)
+        if photo_file and photo_file.filename != '':
+            queue_media_processing(sample.id, sample.photo_upload)
 
         new_log = AlertLog(
             sample_id=sample.id,
@@ -555,11 +625,16 @@ def delete_sample(id):
     sample = AlertSample.query.get_or_404(id)
     
     # Delete related logs first
-    AlertLog.query.filter_by(sample_id=sample.id).delete()
+    delete_logs(AlertLog.query.filter_by(sample_id=sample.id))
+    delete_logs(AlertLogArchive.query.filter_by(sample_id=sample.id))
     
-    # Delete the sample itself
+    # Delete the sample itself, dropping its references to stored uploads
+    release(sample.photo_upload)
+    release(sample.document_upload)
+    release_body_images(sample)
     db.session.delete(sample)
     db.session.commit()
+    invalidate_sample(id)
     
     flash('🗑️ Alert Sample and its logs deleted successfully!', 'success')
     return redirect(url_for('alert.list_samples'))
@@ -568,7 +643,7 @@ def delete_sample(id):
 
 @alert_bp.route('/samples/<int:id>')
 def detail_sample(id):
-    sample = AlertSample.query.get_or_404(id)
+    sample = AlertSample.query.options(undefer(AlertSample.body)).get_or_404(id)  # the only page showing the full message
     service = AlertService.query.get(sample.service_id)
     config = AlertConfig.query.get(sample.config_id)
     user = User.query.get(sample.user_id) if sample.user_id else None
@@ -583,7 +658,7 @@ def detail_sample(id):
         start_datetime = pytz.utc.localize(naive_start_datetime).astimezone(LOCAL_TZ)
     sample.start_datetime_str = start_datetime.strftime("%I:%M %p %Y-%m-%d") if start_datetime else ""
 
-    logs = AlertLog.query.filter_by(sample_id=sample.id).order_by(AlertLog.queued_at.desc()).all()
+    logs = AlertLog.query.options(*bare_profile()).filter_by(sample_id=sample.id).order_by(AlertLog.queued_at.desc()).all()
     for log in logs:
         if log.queued_at:
             log.queued_at = pytz.utc.localize(log.queued_at).astimezone(LOCAL_TZ)
@@ -597,10 +672,10 @@ def detail_sample(id):
 # ---------------- TEST CREDENTIALS ----------------
 @alert_bp.route('/test_credentials')
 def list_test_credentials():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = request.args.get('per_page', 10, type=int)
 
-    test_credentials_pagination = TestCredentials.query.order_by(TestCredentials.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    test_credentials_pagination = keyset_paginate(TestCredentials.query, (TestCredentials.id,), cursor=cursor, per_page=per_page)
     test_credentials = test_credentials_pagination.items
 
     current_user = User.query.get(session.get('user_id'))
@@ -720,3 +795,138 @@ def test_sample_message(sample_id):
     send_test_alert_task.delay(sample.id, test_credential.id)
     return jsonify({"show_modal": True, "title": "Request in Process", "message": "Your test message is being processed.", "category": "success"})
 
+
+@alert_bp.route('/rate_limits')
+def rate_limits():
+    current_user = User.query.get(session.get('user_id'))
+    if not current_user:
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        return jsonify(rate_limiter.bucket_levels())
+    except Exception as e:
+        logger.exception("Error reading rate limit buckets:")
+        return jsonify({"error": str(e)}), 503
+
+
+@alert_bp.route('/render_cache')
+def render_cache_stats():
+    current_user = User.query.get(session.get('user_id'))
+    if not current_user:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(cache_stats())
+
+
+@alert_bp.route('/scheduler_lag')
+def scheduler_lag():
+    current_user = User.query.get(session.get('user_id'))
+    if not current_user:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(lag_stats())
+
+
+@alert_bp.route('/queues')
+def queues():
+    current_user = User.query.get(session.get('user_id'))
+    if not current_user:
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        return jsonify(queue_depths())
+    except Exception as e:
+        logger.exception("Error reading queue depths:")
+        return jsonify({"error": str(e)}), 503
+
+
+@alert_bp.route('/send_guard')
+def send_guard():
+    current_user = User.query.get(session.get('user_id'))
+    if not current_user:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(send_guard_stats())
+
+
+@alert_bp.route('/media_savings')
+def media_savings():
+    current_user = User.query.get(session.get('user_id'))
+    if not current_user:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(media_savings_report())
+
+
+@alert_bp.route('/media_store')
+def media_store():
+    current_user = User.query.get(session.get('user_id'))
+    if not current_user:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(store_stats())
+
+
+@alert_bp.route('/file_ids')
+def file_ids():
+    current_user = User.query.get(session.get('user_id'))
+    if not current_user:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(file_id_stats())
+
+
+@alert_bp.route('/log_archive')
+def log_archive():
+    current_user = User.query.get(session.get('user_id'))
+    if not current_user:
+        return jsonify({"error": "Unauthorized"}), 401
+    stats = archive_stats()
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD adds status counts over the hot and archived logs scheduled in that range
+    start, end = request.args.get('start'), request.args.get('end')
+    if start and end:
+        try:
+            start_utc = datetime.strptime(start, "%Y-%m-%d")
+            end_utc = datetime.combine(datetime.strptime(end, "%Y-%m-%d").date(), datetime.max.time())
+        except ValueError:
+            return jsonify({"error": "start and end must be YYYY-MM-DD"}), 400
+        stats["status_counts"] = log_status_counts(start_utc, end_utc, include_archive=request.args.get('archived', 1, type=int) == 1)
+    return jsonify(stats)
+
+
+@alert_bp.route('/dead_letters')
+def dead_letters():
+    current_user = User.query.get(session.get('user_id'))
+    if not current_user:
+        return jsonify({"error": "Unauthorized"}), 401
+    entries = pending_dead_letters(
+        reason=request.args.get('reason'),
+        sample_id=request.args.get('sample_id', type=int),
+        limit=min(request.args.get('limit', 100, type=int), 1000),
+        before_id=request.args.get('before_id', type=int),
+    )
+    return jsonify({
+        "summary": dead_letter_summary(),
+        "items": [{
+            "id": entry.id,
+            "log_id": entry.log_id,
+            "sample_id": entry.sample_id,
+            "reason": entry.reason,
+            "error_message": entry.error_message,
+            "attempts": entry.attempts,
+            "created_at": entry.created_at.isoformat() if entry.created_at else None,
+        } for entry in entries],
+    })
+
+
+@alert_bp.route('/dead_letters/replay', methods=['POST'])
+def replay_dead_letters_view():
+    current_user = User.query.get(session.get('user_id'))
+    if not current_user:
+        return jsonify({"error": "Unauthorized"}), 401
+    data = request.get_json(silent=True) or request.form
+    ids = data.getlist('ids') if hasattr(data, 'getlist') else data.get('ids')
+    dead_letter_ids = [int(value) for value in ids or []]
+    reason = data.get('reason')
+    sample_id = int(data['sample_id']) if data.get('sample_id') else None
+    if not (dead_letter_ids or reason or sample_id):
+        return jsonify({"error": "Pass ids, reason or sample_id"}), 400
+    try:
+        replayed = replay_dead_letters(dead_letter_ids=dead_letter_ids, reason=reason, sample_id=sample_id)
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Error replaying dead letters:")
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"replayed": replayed})
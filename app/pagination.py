@@ -0,0 +1,144 @@
+import os
+import json
+import base64
+from datetime import datetime, date
+from sqlalchemy import and_, or_, inspect
+
+# Keyset (cursor) pagination for the list views: each page continues from the sort key of the last row
+# shown, so page N costs the same as page 1 (no OFFSET scan), and no COUNT(*) runs over the whole table.
+PAGINATION_MAX_PER_PAGE = int(os.getenv("PAGINATION_MAX_PER_PAGE", 100))
+PAGINATION_COUNT_LIMIT = int(os.getenv("PAGINATION_COUNT_LIMIT", 1000))  # rows counted for the total, "1000+" beyond
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated query. next_cursor / prev_cursor are opaque strings for the ?cursor= argument;
+    start is the position of the first row (for row numbering), total the row count or None above count_limit.
+    """
+
+    def __init__(self, items, per_page, start, next_cursor, prev_cursor, total, count_limit):
+        self.items = items
+        self.per_page = per_page
+        self.start = start
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.count_limit = count_limit
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def total_display(self):
+        return f"{self.count_limit}+" if self.total is None else str(self.total)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(direction, keys, start):
+    payload = json.dumps({"dir": direction, "keys": [_encode_value(key) for key in keys], "start": start}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Returns (direction, keys, start), or None for a missing or malformed cursor (which shows the first page).
+    """
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        direction = payload["dir"]
+        if direction not in ("next", "prev"):
+            return None
+        return direction, [_decode_value(key) for key in payload["keys"]], max(int(payload.get("start", 0)), 0)
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _beyond(columns, keys, descending, forward):
+    """
+    WHERE clause selecting rows after (forward) or before the given sort key: a <= x AND ((a < x) OR (a = x AND b < y)).
+    The redundant bound on the leading column lets the database range-scan its index instead of filtering from the top.
+    """
+    after = descending == forward  # moving towards smaller keys
+    clauses = []
+    for i, (column, key) in enumerate(zip(columns, keys)):
+        comparison = column < key if after else column > key
+        clauses.append(and_(*[columns[j] == keys[j] for j in range(i)], comparison))
+    leading_bound = columns[0] <= keys[0] if after else columns[0] >= keys[0]
+    return and_(leading_bound, or_(*clauses))
+
+
+def count_capped(query, count_limit=PAGINATION_COUNT_LIMIT):
+    """
+    Counts the rows of a query up to count_limit; returns None when there are more.
+    """
+    if not count_limit:
+        return None
+    # Only the primary key: wide (e.g. deferred LONGTEXT) columns stay out of the derived table MySQL materializes
+    primary_key = inspect(query.column_descriptions[0]["entity"]).primary_key
+    counted = query.order_by(None).with_entities(*primary_key).limit(count_limit + 1).count()
+    return counted if counted <= count_limit else None
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=10, descending=True, count_limit=PAGINATION_COUNT_LIMIT):
+    """
+    Pages a query by the given non-null sort columns, which must end in a unique one (e.g. (queued_at, id) or (id,)).
+    cursor is the ?cursor= value of a previous page. The total is counted up to count_limit rows only.
+    """
+    per_page = min(max(per_page, 1), PAGINATION_MAX_PER_PAGE)
+    decoded = decode_cursor(cursor)
+    if decoded and len(decoded[1]) != len(columns):
+        decoded = None
+    direction, keys, start = decoded or ("next", None, 0)
+    forward = direction == "next"
+
+    page_query = query
+    if keys:
+        page_query = page_query.filter(_beyond(columns, keys, descending, forward))
+    ordering = [column.desc() if descending == forward else column.asc() for column in columns]
+    rows = page_query.order_by(*ordering).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    def row_keys(row):
+        return [getattr(row, column.key) for column in columns]
+
+    if not keys:
+        has_next, has_prev = more, False
+    elif forward:
+        has_next, has_prev = more, True
+    else:
+        # Walking back: the page we came from follows; if nothing precedes this page, it is the first one
+        has_next, has_prev = True, more
+        if not more:
+            start = 0
+    if not rows:
+        has_next = False
+
+    next_cursor = encode_cursor("next", row_keys(rows[-1]), start + len(rows)) if has_next and rows else None
+    prev_cursor = encode_cursor("prev", row_keys(rows[0]), max(start - per_page, 0)) if has_prev and rows else None
+    return KeysetPage(rows, per_page, start, next_cursor, prev_cursor, count_capped(query, count_limit), count_limit)
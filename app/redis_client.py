@@ -0,0 +1,50 @@
+import os
+import time
+import redis
+from dotenv import load_dotenv
+from app.celery_config import str_to_bool
+
+load_dotenv()
+
+# Shared Redis client for application state (rate limits, caches, queues).
+# Uses the same server as the Celery broker; REDIS_APP_DB can move it to another database.
+_redis_client = None
+
+# After a connection error, Redis-backed helpers skip Redis for this many seconds instead of
+# paying a connect timeout on every call
+REDIS_RETRY_INTERVAL = int(os.getenv("REDIS_RETRY_INTERVAL", 30))
+_unavailable_until = 0.0
+
+
+def get_redis():
+    """
+    Returns the process-wide Redis client. redis-py resets its connection pool after a fork,
+    so the client is safe to create before Celery forks its workers.
+    """
+    global _redis_client
+    if _redis_client is None:
+        using_redis_password = str_to_bool(os.getenv("USING_REDIS_PASSWORD", "false"))
+        _redis_client = redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=int(os.getenv("REDIS_APP_DB", os.getenv("REDIS_DB", 0))),
+            password=os.getenv("REDIS_PASSWORD") if using_redis_password else None,
+            decode_responses=True,
+            socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", 2)),
+            socket_connect_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", 2)),
+            health_check_interval=30,
+        )
+    return _redis_client
+
+
+def redis_available():
+    return time.monotonic() >= _unavailable_until
+
+
+def mark_redis_unavailable(error, logger, action="continuing without it"):
+    """
+    Records a Redis failure so callers fall back for REDIS_RETRY_INTERVAL seconds.
+    """
+    global _unavailable_until
+    _unavailable_until = time.monotonic() + REDIS_RETRY_INTERVAL
+    logger.warning(f"Redis unavailable, {action} for {REDIS_RETRY_INTERVAL}s: {error}")
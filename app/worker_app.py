@@ -0,0 +1,56 @@
+from celery.signals import worker_process_init, worker_process_shutdown
+from sqlalchemy import text
+from app.extensions import db
+from app.logging_config import celery_logger
+from app.notification_sender.telegram_bot import log_connection_stats
+
+# One Flask app per worker process, built on worker_process_init and reused by every task
+_worker_app = None
+
+
+def get_worker_app():
+    """
+    Returns the Flask app for this worker process, building it on first use.
+    Tasks push a fresh app context per run, so the session is still scoped per task
+    while the engine and its connection pool survive across tasks.
+    """
+    global _worker_app
+    if _worker_app is None:
+        from app.app import create_app
+        _worker_app = create_app()
+        celery_logger.info("Worker Flask app created.")
+    return _worker_app
+
+
+@worker_process_init.connect
+def init_worker_app(**kwargs):
+    """
+    Builds the app once per forked worker process and warms the connection pool.
+    """
+    global _worker_app
+    # Never reuse an app (and its pooled sockets) inherited from the parent process
+    _worker_app = None
+    app = get_worker_app()
+    try:
+        with app.app_context():
+            db.session.execute(text("SELECT 1"))
+        celery_logger.info("Worker database pool warmed up.")
+    except Exception as e:
+        celery_logger.error(f"Error warming up worker database pool: {e}")
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_app(**kwargs):
+    """
+    Logs HTTP connection reuse and closes pooled database connections when the worker process exits.
+    """
+    global _worker_app
+    log_connection_stats()
+    if _worker_app is None:
+        return
+    try:
+        with _worker_app.app_context():
+            db.engine.dispose()
+    except Exception as e:
+        celery_logger.error(f"Error disposing worker database engine: {e}")
+    _worker_app = None
@@ -0,0 +1,56 @@
+"""
+Throughput of the asyncio batch sender vs the one-message-per-task path.
+
+The baseline mimics a prefork worker with -c 4: four processes' worth of threads each
+sending one message at a time through TelegramBot.group_message. The async path sends
+the same messages in batches through AsyncTelegramBot. Both target a local stub server
+that answers after a fixed delay to stand in for the Telegram round trip.
+
+Usage:
+    python -m benchmarks.bench_async_sender [messages] [delay_ms] [concurrency] [batch_size]
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.notification_sender.telegram_bot import TelegramBot
+from app.notification_sender.async_sender import AsyncTelegramBot
+from benchmarks.common import quiet_loggers
+from benchmarks.stub_server import StubServer
+
+PREFORK_CONCURRENCY = 4
+
+
+def message(i):
+    return {"auth_token": "token", "group_id": "-100123", "message": f"Benchmark {i}"}
+
+
+if __name__ == "__main__":
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    delay_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    batch_size = int(sys.argv[4]) if len(sys.argv) > 4 else 500
+    quiet_loggers()
+
+    with StubServer(delay=delay_ms / 1000) as stub:
+        group_url = stub.url + "/send-message-group"
+        print(f"{messages} messages, stub latency {delay_ms:.0f} ms")
+
+        bot = TelegramBot()
+        bot.group_url = group_url
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=PREFORK_CONCURRENCY) as pool:
+            results = list(pool.map(lambda i: bot.group_message(**message(i)), range(messages)))
+        elapsed = time.perf_counter() - started
+        errors = sum(1 for result in results if "error" in result)
+        print(f"one message per task (-c {PREFORK_CONCURRENCY}):  {messages / elapsed:8.0f} msg/s  errors={errors}")
+
+        async_bot = AsyncTelegramBot(concurrency=concurrency, group_url=group_url)
+        stub.reset_stats()
+        started = time.perf_counter()
+        results = []
+        for offset in range(0, messages, batch_size):
+            results.extend(async_bot.send_batch_sync([message(i) for i in range(offset, min(offset + batch_size, messages))]))
+        elapsed = time.perf_counter() - started
+        errors = sum(1 for result in results if "error" in result)
+        print(f"async batches (concurrency {concurrency}): {messages / elapsed:8.0f} msg/s  errors={errors}  "
+              f"tcp connections={stub.stats['connections']}")
@@ -0,0 +1,92 @@
+"""
+Sample body size and the cost of the paths that read the body, before and after moving inline base64 images
+to the media store (body_images.py), on samples whose bodies carry pasted images.
+
+    migration      - extract_existing_body_images over the seeded samples (one run)
+    load bodies    - one batch of samples with their bodies (undefer), as the send path loads them
+    render         - render_static_message for every sample of the batch (no render cache)
+
+Usage:
+    python -m benchmarks.bench_body_images [samples] [image_kib] [images_per_body]
+"""
+import os
+import sys
+import time
+import base64
+import shutil
+import tempfile
+from sqlalchemy.orm import undefer
+from app.app import create_app
+from app.extensions import db
+from app.notification_sender.models import AlertSample, MediaBlob
+from app.notification_sender.body_images import extract_existing_body_images, body_size_stats
+from app.notification_sender.message_geneator import render_static_message
+from benchmarks.common import quiet_loggers, seed_sample, cleanup_bench_data, summarize, BENCH_COMPANY
+
+REPEATS = 10
+BATCH = 50
+
+
+def seed_samples(count, image_kib, images_per_body):
+    started = time.perf_counter()
+    for i in range(count):
+        images = "".join(
+            f'<img src="data:image/png;base64,{base64.b64encode(os.urandom(image_kib * 1024)).decode()}">'
+            for _ in range(images_per_body)
+        )
+        seed_sample(title=f"Benchmark sample {i}", body=f"<p>Benchmark body {i} &amp; more</p>{images}<p>Thanks</p>")
+    print(f"Seeded {count} samples with {images_per_body} x {image_kib} KiB images in {time.perf_counter() - started:.1f}s")
+
+
+def measure(label):
+    ids = [row.id for row in db.session.query(AlertSample.id).filter(
+        AlertSample.company_name == BENCH_COMPANY
+    ).order_by(AlertSample.id).limit(BATCH)]
+    loading, rendering = [], []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        samples = AlertSample.query.options(undefer(AlertSample.body)).filter(AlertSample.id.in_(ids)).all()
+        loaded = time.perf_counter()
+        for sample in samples:
+            render_static_message(sample)
+        loading.append((loaded - started) * 1000)
+        rendering.append((time.perf_counter() - loaded) * 1000)
+        db.session.rollback()
+        db.session.expunge_all()
+    summarize(f"{label} load bodies", loading)
+    summarize(f"{label} render", rendering)
+
+
+def print_stats(label, stats):
+    print(f"{label}: avg body {stats['avg_body_bytes']} bytes, max {stats['max_body_bytes']}, "
+          f"total {stats['total_body_bytes'] / 1024 / 1024:.1f} MiB, {stats['bodies_with_inline_images']} with inline images")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    image_kib = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    images_per_body = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    quiet_loggers()
+    app = create_app()
+    upload_folder = tempfile.mkdtemp(prefix="bench-body-images-")
+    with app.app_context():
+        db.create_all()
+        cleanup_bench_data()
+        seed_samples(count, image_kib, images_per_body)
+
+        print(f"\n== batch of {BATCH}, {count} samples (all samples in the table counted in the sizes)")
+        print_stats("before", body_size_stats())
+        measure("inline")
+
+        started = time.perf_counter()
+        result = extract_existing_body_images(upload_folder)
+        print(f"migration: {result['images']} images from {result['samples']} samples in {time.perf_counter() - started:.1f}s")
+        print_stats("after ", result["after"])
+        measure("extracted")
+
+        cleanup_bench_data()
+        paths = [blob.path for blob in MediaBlob.query.filter(MediaBlob.ref_count > 0)]
+        MediaBlob.query.filter(MediaBlob.path.in_(paths)).delete(synchronize_session=False)
+        db.session.commit()
+    shutil.rmtree(upload_folder, ignore_errors=True)
@@ -0,0 +1,81 @@
+"""
+Claim throughput and lock contention of the scheduler claim engine under parallel schedulers.
+
+Seeds due AlertLog rows, then runs N scheduler threads that each claim batches until nothing
+is left. Reports claim throughput, per-claim latency, short batches (rows skipped because
+another scheduler held the lock) and any log claimed twice (must be 0).
+
+SKIP LOCKED needs MySQL 8+ (or PostgreSQL); on SQLite the claims are serialized.
+
+Usage:
+    python -m benchmarks.bench_claim_engine [rows] [schedulers] [batch_size]
+"""
+import sys
+import time
+import threading
+import pytz
+from collections import Counter
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.worker_app import get_worker_app
+from app.notification_sender.models import AlertLog
+from app.notification_sender.claim_engine import claim_due_logs
+from benchmarks.common import quiet_loggers, seed_sample, cleanup_bench_data, summarize
+
+
+def seed_due_logs(rows):
+    sample = seed_sample()
+    due = datetime.now(pytz.utc) - timedelta(minutes=1)
+    db.session.bulk_insert_mappings(AlertLog, [
+        dict(sample_id=sample.id, audience="all", status="queued", scheduled_for=due, queued_at=due, retry_count=0)
+        for _ in range(rows)
+    ])
+    db.session.commit()
+
+
+def scheduler(app, batch_size, claimed_ids, timings, short_batches, lock):
+    with app.app_context():
+        while True:
+            claim = claim_due_logs(batch_size=batch_size)
+            with lock:
+                timings.append(claim["claim_ms"])
+                claimed_ids.extend(log_id for log_id, _ in claim["claimed"])
+                if 0 < len(claim["claimed"]) < batch_size:
+                    short_batches.append(len(claim["claimed"]))
+            if not claim["claimed"]:
+                break
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    schedulers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+
+    quiet_loggers()
+    app = get_worker_app()
+    with app.app_context():
+        cleanup_bench_data()
+        seed_due_logs(rows)
+
+    claimed_ids, timings, short_batches = [], [], []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=scheduler, args=(app, batch_size, claimed_ids, timings, short_batches, lock))
+        for _ in range(schedulers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    duplicates = sum(1 for count in Counter(claimed_ids).values() if count > 1)
+    print(f"{rows} due rows, {schedulers} schedulers, batch size {batch_size}")
+    summarize("claim latency", timings)
+    print(f"claimed {len(claimed_ids)} rows in {elapsed:.2f}s -> {len(claimed_ids) / elapsed:,.0f} rows/s")
+    print(f"short batches (lock contention): {len(short_batches)}")
+    print(f"duplicate claims: {duplicates}")
+
+    with app.app_context():
+        cleanup_bench_data()
@@ -0,0 +1,107 @@
+"""
+Dashboard request latency with the Redis fragment cache, against the queries the dashboard used to run
+on every request (every approved and pending user loaded with .all(), today's status and hourly counts
+aggregated over alert_log, groups per service).
+
+Seeds users, a year of logs plus a busy today (bench_hourly_stats generators) and rebuilds the hourly stats.
+Then it times:
+
+    old queries   - the per-request queries the dashboard ran before this cache (no template rendering)
+    GET / cold    - every fragment invalidated before the request (all rebuilt from the database)
+    GET / warm    - every fragment cached (one MGET)
+
+Usage:
+    python -m benchmarks.bench_dashboard_cache [users] [rows] [today_rows]
+"""
+import sys
+import time
+from app.app import create_app
+from app.extensions import db
+from app.authentication.models import User
+from app.dashboard_cache import DASHBOARD_CACHE_TTLS, invalidate_dashboard
+from app.notification_sender.models import AlertConfig
+from app.notification_sender.hourly_stats import rebuild_hourly_stats
+from benchmarks.bench_hourly_stats import day_range, seed_today, old_dashboard
+from benchmarks.bench_scheduler_queries import seed_logs
+from benchmarks.common import quiet_loggers, cleanup_bench_data, summarize
+
+REPEATS = 30
+BENCH_EMAIL_DOMAIN = "@bench.invalid"
+
+
+def seed_users(count):
+    admin = User(full_name="Benchmark admin", email=f"admin{BENCH_EMAIL_DOMAIN}", role="admin", is_approved=True)
+    admin.set_password("benchmark")
+    db.session.add(admin)
+    db.session.commit()
+    db.session.execute(User.__table__.insert(), [
+        dict(full_name=f"Benchmark user {i}", email=f"user{i}{BENCH_EMAIL_DOMAIN}", password_hash=admin.password_hash,
+             role="user", is_approved=i % 10 != 0)
+        for i in range(count)
+    ])
+    db.session.commit()
+    return admin.id
+
+
+def old_queries():
+    User.query.filter_by(is_approved=True).all()
+    User.query.filter_by(is_approved=False).all()
+    old_dashboard(*day_range())
+    db.session.query(AlertConfig.service_name, db.func.count(AlertConfig.group_name)).filter(
+        AlertConfig.group_name.isnot(None)
+    ).group_by(AlertConfig.service_name).all()
+
+
+def timed(label, run):
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    summarize(label, timings)
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 300_000
+    today_rows = int(sys.argv[3]) if len(sys.argv) > 3 else 50_000
+
+    quiet_loggers()
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        cleanup_bench_data()
+        User.query.filter(User.email.like(f"%{BENCH_EMAIL_DOMAIN}")).delete(synchronize_session=False)
+        db.session.commit()
+        admin_id = seed_users(users)
+        seed_today(seed_logs(rows), today_rows)
+        rebuild_hourly_stats()
+
+        print(f"\n== {users} users, {rows + today_rows} logs ({today_rows} today)")
+
+        def run_old():
+            old_queries()
+            db.session.rollback()
+        timed("old queries", run_old)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin_id
+
+    def get_dashboard():
+        assert client.get('/').status_code == 200
+
+    def get_cold():
+        invalidate_dashboard(*DASHBOARD_CACHE_TTLS)
+        get_dashboard()
+
+    timed("GET / cold", get_cold)
+    get_dashboard()
+    timed("GET / warm", get_dashboard)
+
+    with app.app_context():
+        cleanup_bench_data()
+        User.query.filter(User.email.like(f"%{BENCH_EMAIL_DOMAIN}")).delete(synchronize_session=False)
+        db.session.commit()
+        rebuild_hourly_stats()
+        invalidate_dashboard(*DASHBOARD_CACHE_TTLS)
@@ -0,0 +1,81 @@
+"""
+Scheduler lag of the Redis delay queue versus fixed-interval DB polling.
+
+Seeds AlertLog rows spread evenly over the next few seconds (the ORM hooks add them to the delay
+queue on commit), then pops and claims them the way the dispatcher does, without publishing.
+Reports the lag (claim time minus scheduled_for) next to what a poll every N seconds would give
+for the same schedule. Needs a reachable Redis (REDIS_HOST / REDIS_PORT).
+
+Usage:
+    python -m benchmarks.bench_delay_queue [rows] [spread_seconds] [poll_interval]
+"""
+import sys
+import time
+import pytz
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.worker_app import get_worker_app
+from app.notification_sender.models import AlertLog
+from app.notification_sender.claim_engine import claim_logs
+from app.notification_sender.delay_queue import pop_due, seconds_until_next
+from app.notification_sender.tasks import dispatch_lags_ms
+from app.notification_sender.dispatcher import DISPATCHER_POLL_INTERVAL
+from benchmarks.common import quiet_loggers, seed_sample, cleanup_bench_data, summarize
+
+
+def seed_spread_logs(rows, spread_seconds):
+    sample = seed_sample()
+    start = datetime.now(pytz.utc) + timedelta(seconds=1)
+    logs = [
+        AlertLog(sample_id=sample.id, audience="all", status="queued",
+                 scheduled_for=start + timedelta(seconds=spread_seconds * i / rows))
+        for i in range(rows)
+    ]
+    db.session.add_all(logs)
+    db.session.commit()
+    return [log.scheduled_for for log in logs]
+
+
+def polling_lags_ms(scheduled, poll_interval):
+    """
+    Lag each log would see if a poller ran every poll_interval seconds (phase averaged over one interval).
+    """
+    lags = []
+    phases = 10
+    for phase in range(phases):
+        offset = poll_interval * phase / phases
+        for scheduled_for in scheduled:
+            seconds = scheduled_for.timestamp() - offset
+            next_tick = (int(seconds // poll_interval) + 1) * poll_interval + offset
+            lags.append((next_tick - scheduled_for.timestamp()) * 1000)
+    return lags
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    spread_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    poll_interval = float(sys.argv[3]) if len(sys.argv) > 3 else 30
+
+    quiet_loggers()
+    app = get_worker_app()
+    with app.app_context():
+        cleanup_bench_data()
+        scheduled = seed_spread_logs(rows, spread_seconds)
+
+        lags = []
+        deadline = time.time() + spread_seconds + 5
+        while len(lags) < rows and time.time() < deadline:
+            entries = pop_due(500)
+            if entries:
+                claim = claim_logs([log_id for log_id, _ in entries])
+                lags.extend(dispatch_lags_ms(claim, datetime.now(pytz.utc)))
+                continue
+            wait = seconds_until_next()
+            time.sleep(DISPATCHER_POLL_INTERVAL if wait is None else min(wait, DISPATCHER_POLL_INTERVAL))
+
+    print(f"{rows} logs spread over {spread_seconds}s")
+    summarize("delay queue lag", lags)
+    summarize(f"poll every {poll_interval:g}s lag", polling_lags_ms(scheduled, poll_interval))
+
+    with app.app_context():
+        cleanup_bench_data()
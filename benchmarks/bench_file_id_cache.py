@@ -0,0 +1,59 @@
+"""
+Re-sending the same photo with and without the Telegram file_id cache.
+
+TelegramBot2 sends one photo to a number of groups through a local stub of the Bot API, first
+uploading the bytes every time (cache bypassed), then with the file_id cache: the first send
+uploads, every later one passes the cached file_id. The stub counts request body bytes.
+
+Usage:
+    python -m benchmarks.bench_file_id_cache [sends] [photo_kb]
+"""
+import os
+import sys
+import time
+import tempfile
+from app.notification_sender import file_id_cache
+from app.notification_sender.telegram_bot import TelegramBot2
+from benchmarks.common import quiet_loggers, summarize
+from benchmarks.stub_server import StubServer
+
+
+def respond(path):
+    if path.endswith("/sendPhoto"):
+        return 200, {"ok": True, "result": {"message_id": 1, "photo": [
+            {"file_id": "bench-small", "width": 90}, {"file_id": "bench-photo", "width": 1280}]}}
+    return 200, {"ok": True, "result": {"message_id": 1}}
+
+
+def run(label, bot, auth_token, photo_path, sends, stub):
+    stub.reset_stats()
+    timings = []
+    for i in range(sends):
+        started = time.perf_counter()
+        response = bot.group_message(auth_token, f"-100{i}", "Benchmark photo", file_path=photo_path)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.get("ok"), response
+    summarize(label, timings)
+    print(f"{'':<28} bytes sent to the API: {stub.stats['bytes'] / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    sends = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    photo_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    quiet_loggers()
+
+    with tempfile.TemporaryDirectory() as tmp, StubServer(responder=respond) as stub:
+        photo_path = os.path.join(tmp, "bench.jpg")
+        with open(photo_path, "wb") as f:
+            f.write(os.urandom(photo_kb * 1024))
+        bot = TelegramBot2()
+        bot.api_base = stub.url
+
+        print(f"{sends} sends of a {photo_kb} KiB photo")
+        lookup = file_id_cache.lookup
+        file_id_cache.lookup = lambda *args: None
+        run("upload every time", bot, "bench-token-a", photo_path, sends, stub)
+        file_id_cache.lookup = lookup
+        # A different bot token, so the baseline's uploads are not reused
+        run("file_id cache", bot, "bench-token-b", photo_path, sends, stub)
+        print(f"file_id cache stats: {file_id_cache.file_id_stats()['process']}")
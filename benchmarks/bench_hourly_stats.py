@@ -0,0 +1,127 @@
+"""
+Compares the dashboard's old per-request aggregation over alert_log with the hourly rollup table.
+
+Seeds a year of logs (same generator as bench_scheduler_queries) plus a busy "today" of today_rows logs,
+rebuilds alert_stats_hourly from them, then times:
+
+    old dashboard  - status counts + per-hour GROUP BY over today's alert_log rows
+    rollup         - hourly_totals() over at most 24 rows per service/config
+    status update  - ORM status change of one log (flush + commit), which now also upserts a counter row;
+                     timed again with the counting hook removed for comparison
+
+Usage:
+    python -m benchmarks.bench_hourly_stats [rows] [today_rows]
+"""
+import sys
+import time
+import random
+import pytz
+from datetime import datetime, timedelta
+from sqlalchemy import func, event
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.worker_app import get_worker_app
+from app.notification_sender.models import AlertLog
+from app.notification_sender import hourly_stats
+from app.notification_sender.hourly_stats import hourly_totals, rebuild_hourly_stats
+from benchmarks.bench_scheduler_queries import seed_logs
+from benchmarks.common import quiet_loggers, cleanup_bench_data, summarize
+
+REPEATS = 20
+UPDATES = 500
+
+
+def day_range():
+    day_start = datetime.now(pytz.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return day_start, day_start + timedelta(days=1) - timedelta(microseconds=1)
+
+
+def seed_today(sample_ids, rows):
+    rng = random.Random(7)
+    day_start, _ = day_range()
+    day_start = day_start.replace(tzinfo=None)
+    batch = []
+    for _ in range(rows):
+        scheduled_for = day_start + timedelta(seconds=rng.randint(0, 86399))
+        status = rng.choice(("sent", "sent", "sent", "failed", "queued"))
+        batch.append(dict(
+            sample_id=rng.choice(sample_ids), audience="all", status=status, scheduled_for=scheduled_for,
+            queued_at=scheduled_for - timedelta(minutes=5), sent_at=scheduled_for if status == "sent" else None,
+            retry_count=0,
+        ))
+    db.session.execute(AlertLog.__table__.insert(), batch)
+    db.session.commit()
+
+
+def old_dashboard(start, end):
+    """
+    The queries the dashboard ran before the rollup (hour extraction in UTC, as CONVERT_TZ is MySQL-only).
+    """
+    in_day = (AlertLog.scheduled_for >= start, AlertLog.scheduled_for <= end)
+    db.session.query(
+        func.count(AlertLog.id),
+        func.count(func.nullif(AlertLog.status != 'sent', True)),
+        func.count(func.nullif(AlertLog.status != 'failed', True)),
+        func.count(func.nullif(AlertLog.status.notin_(['queued', 'scheduled']), True))
+    ).filter(*in_day).first()
+    hour = func.extract('hour', AlertLog.scheduled_for)
+    db.session.query(
+        hour, func.count(AlertLog.id), func.count(func.nullif(AlertLog.status != 'sent', True))
+    ).filter(*in_day).group_by(hour).all()
+
+
+def timed(label, run, repeats=REPEATS):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        db.session.rollback()
+        timings.append((time.perf_counter() - started) * 1000)
+    summarize(label, timings)
+
+
+def time_status_updates(label, log_ids):
+    timings = []
+    for log_id in log_ids:
+        log = db.session.get(AlertLog, log_id)
+        started = time.perf_counter()
+        log.status = "sent" if log.status != "sent" else "failed"
+        db.session.commit()
+        timings.append((time.perf_counter() - started) * 1000)
+    summarize(label, timings)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    today_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+
+    quiet_loggers()
+    app = get_worker_app()
+    with app.app_context():
+        db.create_all()
+        cleanup_bench_data()
+        sample_ids = seed_logs(rows)
+        seed_today(sample_ids, today_rows)
+
+        started = time.perf_counter()
+        read, written = rebuild_hourly_stats()
+        print(f"Rebuilt {written} counter rows from {read} logs in {time.perf_counter() - started:.1f}s")
+
+        start, end = day_range()
+        print(f"\n== dashboard counters for today ({AlertLog.query.filter(AlertLog.scheduled_for >= start).count()} logs)")
+        timed("old dashboard", lambda: old_dashboard(start, end))
+        timed("rollup", lambda: hourly_totals(start, end))
+
+        rollup = hourly_totals(start, end)
+        print(f"rollup total today: {sum(hour['total'] for hour in rollup.values())}")
+
+        log_ids = [row.id for row in db.session.query(AlertLog.id).filter(
+            AlertLog.scheduled_for >= start
+        ).limit(UPDATES)]
+        time_status_updates("status update", log_ids)
+        event.remove(Session, "before_flush", hourly_stats._count_orm_transitions)
+        time_status_updates("status update, no rollup", log_ids)
+        event.listen(Session, "before_flush", hourly_stats._count_orm_transitions)
+
+        cleanup_bench_data()
+        rebuild_hourly_stats()
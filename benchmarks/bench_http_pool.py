@@ -0,0 +1,52 @@
+"""
+Connection reuse of TelegramBot's pooled session vs a fresh requests.post per alert.
+
+Both paths send the same group messages to a local stub server; the stub counts TCP
+connections and get_connection_stats() reports reuse as seen by the client pool.
+
+Usage:
+    python -m benchmarks.bench_http_pool [messages] [threads]
+"""
+import sys
+import json
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from app.notification_sender import telegram_bot
+from app.notification_sender.telegram_bot import TelegramBot, get_connection_stats
+from benchmarks.common import quiet_loggers
+from benchmarks.stub_server import StubServer
+
+
+def run(label, send, messages, threads, stub):
+    stub.reset_stats()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(send, range(messages)))
+    elapsed = time.perf_counter() - started
+    stats = stub.stats
+    print(f"{label:<22} {messages / elapsed:8.0f} msg/s  requests={stats['requests']}  tcp connections={stats['connections']}")
+
+
+if __name__ == "__main__":
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    quiet_loggers()
+
+    with StubServer() as stub:
+        payload = {"api_token": "token", "group_id": "-100123", "message": "Benchmark"}
+
+        def send_unpooled(i):
+            requests.post(stub.url + "/send-message-group", headers={"Content-Type": "application/json"},
+                          data=json.dumps(payload), timeout=10)
+
+        bot = TelegramBot()
+        bot.group_url = stub.url + "/send-message-group"
+
+        def send_pooled(i):
+            bot.group_message(auth_token="token", group_id="-100123", message="Benchmark")
+
+        print(f"{messages} messages, {threads} threads, pool maxsize {telegram_bot.HTTP_POOL_MAXSIZE}")
+        run("requests.post", send_unpooled, messages, threads, stub)
+        run("pooled session", send_pooled, messages, threads, stub)
+        print(f"client pool stats: {get_connection_stats()}")
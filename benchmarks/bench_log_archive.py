@@ -0,0 +1,89 @@
+"""
+Seeds a year of alert_log rows (500k by default, same generator as bench_scheduler_queries), times the
+hot-table queries, runs the retention job and times them again on the trimmed table.
+
+    list page 1        - list_logs: COUNT(*) + first page ordered by queued_at
+    list page 500      - list_logs deep page (OFFSET)
+    per-sample history - detail_sample / list_logs?sample_id=
+    scheduler claim    - check_scheduled_alerts
+
+The archive pass reports rows moved per second and the size of each batch transaction.
+
+Usage:
+    python -m benchmarks.bench_log_archive [rows] [days] [--ndjson]
+"""
+import sys
+import time
+import tempfile
+import pytz
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.worker_app import get_worker_app
+from app.notification_sender.models import AlertLog
+from app.notification_sender.log_archive import archive_old_logs, log_status_counts, iter_exported_logs
+from benchmarks.bench_scheduler_queries import seed_logs, hot_queries
+from benchmarks.common import quiet_loggers, cleanup_bench_data, summarize
+
+REPEATS = 20
+PER_PAGE = 10
+
+
+def list_page(page):
+    query = AlertLog.query.order_by(AlertLog.queued_at.desc())
+    return lambda: (query.count(), query.limit(PER_PAGE).offset((page - 1) * PER_PAGE).all())
+
+
+def time_queries(label, sample_id):
+    queries = {
+        "list page 1": list_page(1),
+        "list page 500": list_page(500),
+    }
+    for name, query in hot_queries(sample_id).items():
+        if name in ("per-sample history", "scheduler claim"):
+            queries[name] = query.all
+    print(f"\n== {label}: {AlertLog.query.count()} rows in alert_log")
+    for name, run in queries.items():
+        timings = []
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            run()
+            db.session.rollback()
+            timings.append((time.perf_counter() - started) * 1000)
+        summarize(name, timings)
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    rows = int(args[0]) if args else 500_000
+    days = int(args[1]) if len(args) > 1 else 90
+    mode = "ndjson" if "--ndjson" in sys.argv else "table"
+
+    quiet_loggers()
+    app = get_worker_app()
+    with app.app_context():
+        db.create_all()
+        cleanup_bench_data()
+        sample_ids = seed_logs(rows)
+        sample_id = sample_ids[len(sample_ids) // 2]
+        time_queries("before archiving", sample_id)
+
+        export_dir = tempfile.mkdtemp(prefix="log_archive_")
+        result = archive_old_logs(older_than_days=days, max_batches=sys.maxsize, mode=mode, pause=0, export_dir=export_dir)
+        print(f"\nArchived {result['archived']} rows older than {days} days ({mode}) in {result['batches']} batches: "
+              f"{result['seconds']:.1f}s, {result['archived'] / max(result['seconds'], 1e-9):.0f} rows/s")
+
+        time_queries("after archiving", sample_id)
+
+        # Reporting over the whole seeded year still sees every row
+        year_end = datetime.now(pytz.utc).replace(tzinfo=None) + timedelta(days=1)
+        year_start = year_end - timedelta(days=367)
+        started = time.perf_counter()
+        if mode == "table":
+            counts = log_status_counts(year_start, year_end, include_archive=True)
+            print(f"\nYear report over alert_log + alert_log_archive: {sum(counts.values())} rows {counts} "
+                  f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        else:
+            exported = sum(1 for _ in iter_exported_logs(start=year_start, end=year_end, export_dir=export_dir))
+            print(f"\nRead back {exported} exported rows in {time.perf_counter() - started:.1f}s from {export_dir}")
+
+        cleanup_bench_data()
@@ -0,0 +1,178 @@
+"""
+SQL statements per AlertLog hot path, checked against a budget, plus the cost of loading logs with the
+old lazy="joined" relationships against the lean profiles in log_profiles.py.
+
+Each path runs with a statement counter on the engine; a path that runs more statements or JOINs than
+its budget is reported as OVER and the script exits with status 1, so it can gate a deploy.
+
+    scheduler claim    - claim_due_logs (one batch)
+    batch load         - tasks.load_batch for the claimed logs
+    send path get      - the log lookup of deliver_alert
+    dead-letter replay - replay_dead_letters
+    bulk delete        - delete_logs (per-sample delete)
+    GET list_logs      - one page, with sender names
+    GET detail_log     - one log with service, config, sender and target
+    GET detail_sample  - a sample's log history
+
+Usage:
+    python -m benchmarks.bench_log_queries [logs]
+"""
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+from app.app import create_app
+from app.extensions import db
+from app.authentication.models import User
+from app.notification_sender.models import AlertLog, AlertService, AlertConfig, AlertDeadLetter
+from app.notification_sender.claim_engine import claim_due_logs
+from app.notification_sender.dead_letter import replay_dead_letters
+from app.notification_sender.hourly_stats import delete_logs
+from app.notification_sender.log_profiles import bare_profile
+from app.notification_sender.tasks import load_batch
+from benchmarks.common import quiet_loggers, seed_sample, cleanup_bench_data, summarize, BENCH_COMPANY
+
+REPEATS = 20
+BATCH = 50
+
+# path: (max statements, max JOINs over those statements)
+BUDGETS = {
+    "scheduler claim": (2, 0),
+    "batch load": (3, 0),
+    "send path get": (1, 0),
+    "dead-letter replay": (5, 0),
+    "bulk delete": (3, 0),
+    "GET list_logs": (3, 1),
+    "GET detail_log": (2, 4),
+    "GET detail_sample": (5, 0),
+}
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+
+def joins(statements):
+    return sum(len(re.findall(r"\bJOIN\b", statement)) for statement in statements)
+
+
+def seed(app, count):
+    with app.app_context():
+        db.create_all()
+        cleanup_bench_data()
+        user = User.query.filter_by(email="queries@bench.invalid").first()
+        if not user:
+            user = User(full_name="Benchmark sender", email="queries@bench.invalid", role="admin", is_approved=True)
+            user.set_password("benchmark")
+            db.session.add(user)
+        service = AlertService(name="Benchmark service", code=f"BQ{int(time.time()) % 100000}")
+        db.session.add(service)
+        db.session.commit()
+        config = AlertConfig(company_name=BENCH_COMPANY, service_id=service.id, service_name=service.name, group_name="bench")
+        db.session.add(config)
+        db.session.commit()
+        sample = seed_sample(service_id=service.id, config_id=config.id)
+
+        now = datetime.now(pytz.utc).replace(tzinfo=None)
+        db.session.execute(AlertLog.__table__.insert(), [
+            dict(sample_id=sample.id, service_id=service.id, config_id=config.id, sender_id=user.id,
+                 target_user_id=user.id, audience="all", status="queued" if i < BATCH else "sent",
+                 scheduled_for=now - timedelta(seconds=i), queued_at=now - timedelta(seconds=i), retry_count=0)
+            for i in range(count)
+        ])
+        failed_id = db.session.query(AlertLog.id).filter(AlertLog.status == "sent").first().id
+        AlertLog.query.filter_by(id=failed_id).update({"status": "failed"})
+        db.session.add(AlertDeadLetter(log_id=failed_id, sample_id=sample.id, reason="permanent", attempts=1))
+        db.session.commit()
+        return user.id, sample.id, service.id, config.id, failed_id
+
+
+def check_paths(app, client, sample_id, log_id):
+    results = {}
+    with app.app_context():
+        with count_statements() as statements:
+            claimed = [row_id for row_id, _ in claim_due_logs(batch_size=BATCH)["claimed"]]
+        results["scheduler claim"] = statements
+        with count_statements() as statements:
+            load_batch(claimed)
+        results["batch load"] = statements
+        db.session.rollback()
+        with count_statements() as statements:
+            db.session.get(AlertLog, log_id, options=bare_profile())
+        results["send path get"] = statements
+        db.session.rollback()
+        with count_statements() as statements:
+            replay_dead_letters()
+        results["dead-letter replay"] = statements
+
+    for name, url in (("GET list_logs", "/alerts/logs"), ("GET detail_log", f"/alerts/logs/{log_id}"),
+                      ("GET detail_sample", f"/alerts/samples/{sample_id}")):
+        with app.app_context(), count_statements() as statements:
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+        results[name] = statements
+
+    with app.app_context():
+        with count_statements() as statements:
+            delete_logs(AlertLog.query.filter(AlertLog.sample_id == sample_id, AlertLog.status == "sent"))
+        db.session.rollback()
+        results["bulk delete"] = statements
+    return results
+
+
+def time_loading(app, sample_id):
+    with app.app_context():
+        log_ids = [row.id for row in db.session.query(AlertLog.id).filter_by(sample_id=sample_id).limit(500)]
+        joined = [joinedload(AlertLog.service), joinedload(AlertLog.config), joinedload(AlertLog.sender), joinedload(AlertLog.target)]
+        for label, options in (("500 logs, joined", joined), ("500 logs, bare profile", bare_profile())):
+            timings = []
+            for _ in range(REPEATS):
+                started = time.perf_counter()
+                AlertLog.query.options(*options).filter(AlertLog.id.in_(log_ids)).all()
+                db.session.rollback()
+                timings.append((time.perf_counter() - started) * 1000)
+            summarize(label, timings)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    quiet_loggers()
+    app = create_app()
+    user_id, sample_id, service_id, config_id, log_id = seed(app, count)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+
+    results = check_paths(app, client, sample_id, log_id)
+    over = False
+    print(f"{'path':<22} {'statements':>10} {'joins':>6}  budget")
+    for name, statements in results.items():
+        max_statements, max_joins = BUDGETS[name]
+        ok = len(statements) <= max_statements and joins(statements) <= max_joins
+        over = over or not ok
+        print(f"{name:<22} {len(statements):>10} {joins(statements):>6}  {max_statements}/{max_joins} {'ok' if ok else 'OVER'}")
+
+    print()
+    time_loading(app, sample_id)
+
+    with app.app_context():
+        cleanup_bench_data()
+        AlertConfig.query.filter_by(id=config_id).delete()
+        AlertService.query.filter_by(id=service_id).delete()
+        db.session.commit()
+    sys.exit(1 if over else 0)
@@ -0,0 +1,121 @@
+"""
+Concurrent media fetches against the /media/uploads route, under gunicorn with 4 sync workers
+as in supervisord.conf.
+
+    old      - the previous route: a bare send_from_directory
+    flask    - serve_upload streaming the file itself (ETag, Range, immutable caching)
+    x-accel  - serve_upload with MEDIA_SENDFILE_MODE=x-accel: the worker only answers with headers and
+               nginx would stream the bytes, so this measures how long a fetch holds a worker
+
+Each mode fetches a content-addressed image from many client threads at once, then checks the
+conditional and Range behaviour of the route.
+
+Usage:
+    python -m benchmarks.bench_media_serving [concurrency] [fetches] [image_kb]
+"""
+import os
+import sys
+import time
+import socket
+import hashlib
+import tempfile
+import subprocess
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, send_from_directory
+from benchmarks.common import summarize
+
+WORKERS = 4
+
+
+def bench_app(media_dir, mode):
+    """
+    gunicorn app factory: the route of the given mode over media_dir.
+    """
+    app = Flask(__name__)
+
+    if mode == "old":
+        @app.route('/media/uploads/<path:filename>')
+        def uploaded_file(filename):
+            return send_from_directory(media_dir, filename)
+    else:
+        from app.media_serving import serve_upload
+
+        @app.route('/media/uploads/<path:filename>')
+        def uploaded_file(filename):
+            return serve_upload(media_dir, filename)
+    return app
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(media_dir, mode):
+    port = free_port()
+    env = dict(os.environ, MEDIA_SENDFILE_MODE="x-accel" if mode == "x-accel" else "")
+    process = subprocess.Popen(
+        ["gunicorn", "-w", str(WORKERS), "-b", f"127.0.0.1:{port}", "--log-level", "warning",
+         f"benchmarks.bench_media_serving:bench_app('{media_dir}', '{mode}')"],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            requests.get(url, timeout=5)
+            return process, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("gunicorn did not start")
+
+
+def run(mode, media_dir, path, concurrency, fetches):
+    process, url = start_server(media_dir, mode)
+    try:
+        file_url = f"{url}/media/uploads/{path}"
+
+        def fetch(_):
+            started = time.perf_counter()
+            response = requests.get(file_url, timeout=30)
+            assert response.status_code == 200, response.status_code
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = list(pool.map(fetch, range(fetches)))
+        elapsed = time.perf_counter() - started
+        summarize(f"{mode} ({fetches / elapsed:.0f} req/s)", timings)
+
+        first = requests.get(file_url, timeout=30)
+        print(f"{'':<28} Cache-Control: {first.headers.get('Cache-Control')!r}")
+        if mode == "x-accel":
+            # Conditional and Range requests are answered by nginx for the internal location
+            print(f"{'':<28} X-Accel-Redirect: {first.headers.get('X-Accel-Redirect')!r}")
+            return
+        revalidated = requests.get(file_url, headers={"If-None-Match": first.headers.get("ETag", "")}, timeout=30)
+        ranged = requests.get(file_url, headers={"Range": "bytes=0-1023"}, timeout=30)
+        print(f"{'':<28} If-None-Match -> {revalidated.status_code}  Range -> {ranged.status_code} ({len(ranged.content)} bytes)")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    fetches = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    image_kb = int(sys.argv[3]) if len(sys.argv) > 3 else 1024
+
+    with tempfile.TemporaryDirectory() as media_dir:
+        data = os.urandom(image_kb * 1024)
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = f"cas/{sha256[:2]}/{sha256[2:4]}/{sha256}.jpg"
+        os.makedirs(os.path.join(media_dir, os.path.dirname(path)))
+        with open(os.path.join(media_dir, path), "wb") as f:
+            f.write(data)
+
+        print(f"{fetches} fetches of a {image_kb} KiB image, {concurrency} concurrent clients, {WORKERS} sync workers")
+        for mode in ("old", "flask", "x-accel"):
+            run(mode, media_dir, path, concurrency, fetches)
@@ -0,0 +1,65 @@
+"""
+Page-N latency of the log listing: Flask-SQLAlchemy .paginate() (COUNT(*) + OFFSET) against
+keyset_paginate (cursor on (queued_at, id) + capped count), at increasing page depths.
+
+The keyset cursor for page N is built from the last row of page N-1, as the Next link would carry it.
+
+Usage:
+    python -m benchmarks.bench_pagination [rows]
+"""
+import sys
+import time
+from app.extensions import db
+from app.worker_app import get_worker_app
+from app.notification_sender.models import AlertLog
+from app.pagination import keyset_paginate, encode_cursor
+from benchmarks.bench_scheduler_queries import seed_logs
+from benchmarks.common import quiet_loggers, cleanup_bench_data, summarize
+
+PER_PAGE = 10
+REPEATS = 10
+PAGES = (1, 100, 1000, 10000, 25000)
+
+
+def cursor_for_page(page):
+    if page == 1:
+        return None
+    last = db.session.query(AlertLog.queued_at, AlertLog.id).order_by(
+        AlertLog.queued_at.desc(), AlertLog.id.desc()
+    ).offset((page - 1) * PER_PAGE - 1).limit(1).one()
+    return encode_cursor("next", [last.queued_at, last.id], (page - 1) * PER_PAGE)
+
+
+def timed(run):
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        run()
+        db.session.rollback()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+
+    quiet_loggers()
+    app = get_worker_app()
+    with app.app_context():
+        db.create_all()
+        cleanup_bench_data()
+        seed_logs(rows)
+        total = AlertLog.query.count()
+        print(f"{total} rows in alert_log, {PER_PAGE} per page")
+
+        for page in (page for page in PAGES if (page - 1) * PER_PAGE < total):
+            offset_query = AlertLog.query.order_by(AlertLog.queued_at.desc())
+            summarize(f"paginate() page {page}", timed(
+                lambda: offset_query.paginate(page=page, per_page=PER_PAGE, error_out=False).items
+            ))
+            cursor = cursor_for_page(page)
+            summarize(f"keyset page {page}", timed(
+                lambda: keyset_paginate(AlertLog.query, (AlertLog.queued_at, AlertLog.id), cursor=cursor, per_page=PER_PAGE).items
+            ))
+
+        cleanup_bench_data()
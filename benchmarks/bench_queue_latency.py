@@ -0,0 +1,84 @@
+"""
+Interactive task latency during a bulk scheduled burst: one shared queue versus the routed queues.
+
+Runs embedded Celery workers on an in-memory broker with stand-in tasks registered under the real
+task names, so the routing in app/celery_config.py decides where each message goes. A burst of
+slow "send_alert_batch_task" messages is published, then "send_test_alert_task" probes are sent
+at a fixed rate; the probe latency is the time from publish to the task starting.
+
+    shared  - every task on one queue with one pool (the old setup)
+    routed  - task_routes / task_queues from celery_config, one pool per queue
+
+Usage:
+    python -m benchmarks.bench_queue_latency [bulk_tasks] [bulk_task_ms] [probes]
+"""
+import sys
+import time
+import logging
+from contextlib import ExitStack
+from celery import Celery
+from celery.contrib.testing.worker import start_worker
+from app.celery_config import celery as app_celery, QUEUE_NAMES
+from benchmarks.common import summarize
+
+BULK_TASK = "app.notification_sender.tasks.send_alert_batch_task"
+PROBE_TASK = "app.notification_sender.tasks.send_test_alert_task"
+
+# Pool sizes as in supervisord.conf; the shared setup gets the same total concurrency
+POOLS = {"interactive": 2, "immediate": 4, "scheduled": 4, "maintenance": 2}
+
+
+def build_app(routed, probe_latencies):
+    app = Celery("bench_queues", broker="memory://", backend="cache+memory://")
+    app.conf.broker_transport_options = {"polling_interval": 0.005}
+    app.conf.worker_hijack_root_logger = False
+    app.conf.broker_connection_retry_on_startup = True
+    if routed:
+        app.conf.task_queues = app_celery.conf.task_queues
+        app.conf.task_default_queue = app_celery.conf.task_default_queue
+        app.conf.task_routes = app_celery.conf.task_routes
+
+    @app.task(name=BULK_TASK)
+    def bulk(duration):
+        time.sleep(duration)
+
+    @app.task(name=PROBE_TASK)
+    def probe(published_at):
+        probe_latencies.append((time.time() - published_at) * 1000)
+
+    return app, bulk, probe
+
+
+def run(routed, bulk_tasks, bulk_seconds, probes):
+    latencies = []
+    app, bulk, probe = build_app(routed, latencies)
+    with ExitStack() as stack:
+        if routed:
+            for name in QUEUE_NAMES:
+                stack.enter_context(start_worker(app, pool="threads", concurrency=POOLS[name], queues=[name],
+                                                 perform_ping_check=False, loglevel="WARNING"))
+        else:
+            stack.enter_context(start_worker(app, pool="threads", concurrency=sum(POOLS.values()),
+                                             perform_ping_check=False, loglevel="WARNING"))
+
+        for _ in range(bulk_tasks):
+            bulk.delay(bulk_seconds)
+        for _ in range(probes):
+            probe.delay(time.time())
+            time.sleep(0.05)
+
+        deadline = time.time() + bulk_tasks * bulk_seconds + 30
+        while len(latencies) < probes and time.time() < deadline:
+            time.sleep(0.05)
+    return latencies
+
+
+if __name__ == "__main__":
+    bulk_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    bulk_seconds = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    probes = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    logging.getLogger("celery").setLevel(logging.ERROR)
+
+    print(f"{bulk_tasks} bulk tasks of {bulk_seconds * 1000:.0f} ms, {probes} interactive probes")
+    summarize("shared queue probe latency", run(False, bulk_tasks, bulk_seconds, probes))
+    summarize("routed queues probe latency", run(True, bulk_tasks, bulk_seconds, probes))
@@ -0,0 +1,97 @@
+"""
+Latency and Python memory of the sample list page when every sample carries a large body
+(an inline base64 image, as pasted into the editor), with AlertSample.body loaded as before
+and deferred as now.
+
+    eager     - page rows with the body (undefer) and the total counted over all columns, as before
+    deferred  - keyset_paginate(AlertSample.query): no body, total counted over the primary key
+    GET list  - the whole list_samples request (deferred)
+
+Memory is the tracemalloc peak while loading one page.
+
+Usage:
+    python -m benchmarks.bench_sample_body [samples] [body_kib] [per_page]
+"""
+import os
+import sys
+import time
+import base64
+import tracemalloc
+from sqlalchemy.orm import undefer
+from app.app import create_app
+from app.extensions import db
+from app.authentication.models import User
+from app.notification_sender.models import AlertSample
+from app.pagination import keyset_paginate
+from benchmarks.common import quiet_loggers, seed_sample, cleanup_bench_data, summarize, BENCH_COMPANY
+
+REPEATS = 20
+
+
+def seed_samples(count, body_kib):
+    image = base64.b64encode(os.urandom(body_kib * 768)).decode()  # ~body_kib KiB once encoded
+    started = time.perf_counter()
+    for i in range(count):
+        seed_sample(title=f"Benchmark sample {i}",
+                    body=f'<p>Benchmark body {i} &amp; more</p><img src="data:image/jpeg;base64,{image}">')
+    print(f"Seeded {count} samples with ~{body_kib} KiB bodies in {time.perf_counter() - started:.1f}s")
+
+
+def eager_page(per_page):
+    query = AlertSample.query.filter(AlertSample.company_name == BENCH_COMPANY)
+    rows = query.options(undefer(AlertSample.body)).order_by(AlertSample.id.desc()).limit(per_page).all()
+    total = query.options(undefer(AlertSample.body)).order_by(None).limit(1001).count()
+    return rows, total
+
+
+def deferred_page(per_page):
+    page = keyset_paginate(AlertSample.query.filter(AlertSample.company_name == BENCH_COMPANY), (AlertSample.id,), per_page=per_page)
+    return page.items, page.total
+
+
+def measure(label, run):
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        run()
+        db.session.rollback()
+        timings.append((time.perf_counter() - started) * 1000)
+    summarize(label, timings)
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.session.rollback()
+    print(f"{'':<28} peak memory {peak / 1024 / 1024:.2f} MiB")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    body_kib = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    per_page = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    quiet_loggers()
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        cleanup_bench_data()
+        seed_samples(count, body_kib)
+        user = User.query.filter_by(email="samples@bench.invalid").first()
+        if not user:
+            user = User(full_name="Benchmark admin", email="samples@bench.invalid", role="admin", is_approved=True)
+            user.set_password("benchmark")
+            db.session.add(user)
+            db.session.commit()
+        user_id = user.id
+
+        print(f"\n== list page of {per_page}, {count} samples")
+        measure("eager", lambda: eager_page(per_page))
+        measure("deferred", lambda: deferred_page(per_page))
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    with app.app_context():
+        measure("GET list", lambda: client.get(f"/alerts/samples?per_page={per_page}"))
+        cleanup_bench_data()
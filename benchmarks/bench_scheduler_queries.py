@@ -0,0 +1,124 @@
+"""
+Seeds a large alert_log (1M rows by default) and reports the query plan and latency of
+each hot query: the scheduler claim, per-sample log history, the last sent log of a
+recurring sample and the dashboard's scheduled_for day-range aggregation.
+
+The data is generated from a fixed random seed so runs are comparable across schema
+changes. Seeded rows are tagged as benchmark data and removed at the end unless --keep
+is passed (re-running with --reuse skips seeding).
+
+Usage:
+    python -m benchmarks.bench_scheduler_queries [rows] [--keep] [--reuse]
+"""
+import sys
+import time
+import random
+import pytz
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app.extensions import db
+from app.worker_app import get_worker_app
+from app.notification_sender.models import AlertLog, AlertSample
+from benchmarks.common import BENCH_COMPANY, quiet_loggers, seed_sample, cleanup_bench_data, summarize
+
+SAMPLES = 1000
+CHUNK = 10000
+REPEATS = 50
+
+
+def seed_logs(rows):
+    rng = random.Random(42)
+    sample_ids = [seed_sample(title=f"Benchmark sample {i}").id for i in range(SAMPLES)]
+    now = datetime.now(pytz.utc).replace(tzinfo=None)
+    table = AlertLog.__table__
+    started = time.perf_counter()
+    for offset in range(0, rows, CHUNK):
+        batch = []
+        for _ in range(min(CHUNK, rows - offset)):
+            scheduled_for = now - timedelta(seconds=rng.randint(-86400, 365 * 86400))
+            roll = rng.random()
+            status = "sent" if roll < 0.90 else "failed" if roll < 0.95 else "queued"
+            batch.append(dict(
+                sample_id=rng.choice(sample_ids),
+                audience="all",
+                status=status,
+                scheduled_for=scheduled_for,
+                queued_at=scheduled_for - timedelta(minutes=5),
+                sent_at=scheduled_for if status == "sent" else None,
+                retry_count=0,
+            ))
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+    print(f"Seeded {rows} rows in {time.perf_counter() - started:.1f}s")
+    return sample_ids
+
+
+def explain(stmt):
+    """
+    Returns the database's plan for a SQLAlchemy statement.
+    """
+    dialect = db.engine.dialect
+    compiled = stmt.compile(dialect=dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    prefix = "EXPLAIN QUERY PLAN " if dialect.name == "sqlite" else "EXPLAIN "
+    return db.session.connection().exec_driver_sql(prefix + str(compiled), params).fetchall()
+
+
+def hot_queries(sample_id):
+    now = datetime.now(pytz.utc)
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = day_start + timedelta(days=1)
+    return {
+        "scheduler claim": db.session.query(AlertLog.id, AlertLog.sample_id).filter(
+            AlertLog.status == 'queued',
+            AlertLog.scheduled_for <= now
+        ).order_by(AlertLog.scheduled_for, AlertLog.id).limit(500),
+        "per-sample history": db.session.query(AlertLog.id).filter(
+            AlertLog.sample_id == sample_id
+        ).order_by(AlertLog.queued_at.desc()).limit(10),
+        "last sent log": db.session.query(AlertLog.id).filter(
+            AlertLog.sample_id == sample_id,
+            AlertLog.status == 'sent'
+        ).order_by(AlertLog.sent_at.desc()).limit(1),
+        "dashboard day range": db.session.query(
+            func.count(AlertLog.id),
+            func.count(func.nullif(AlertLog.status != 'sent', True)),
+            func.count(func.nullif(AlertLog.status != 'failed', True)),
+        ).filter(
+            AlertLog.scheduled_for >= day_start,
+            AlertLog.scheduled_for <= day_end
+        ),
+    }
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    rows = int(args[0]) if args else 1_000_000
+    keep = "--keep" in sys.argv
+    reuse = "--reuse" in sys.argv
+
+    quiet_loggers()
+    app = get_worker_app()
+    with app.app_context():
+        if reuse:
+            sample_ids = [row.id for row in db.session.query(AlertSample.id).filter(AlertSample.company_name == BENCH_COMPANY)]
+        else:
+            cleanup_bench_data()
+            sample_ids = seed_logs(rows)
+
+        sample_id = sample_ids[len(sample_ids) // 2]
+        for label, query in hot_queries(sample_id).items():
+            print(f"\n== {label}")
+            for plan_row in explain(query.statement):
+                print("   ", tuple(plan_row))
+            timings = []
+            for _ in range(REPEATS):
+                started = time.perf_counter()
+                query.all()
+                timings.append((time.perf_counter() - started) * 1000)
+            summarize(label, timings)
+
+        if not keep:
+            cleanup_bench_data()
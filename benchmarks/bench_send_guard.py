@@ -0,0 +1,102 @@
+"""
+Exactly-once check of the send guard under parallel workers.
+
+Seeds logs (one sample each, so every delivery is identifiable by its title), then runs N worker
+threads that all deliver the same logs at once: half through send_alert_batch_task (overlapping
+re-dispatches), half through send_alert_task (overlapping retries). The stub Telegram API records
+every request; any title received twice is a double send and must not happen.
+
+Usage:
+    python -m benchmarks.bench_send_guard [logs] [workers]
+"""
+import re
+import sys
+import json
+import time
+import random
+import threading
+from collections import Counter
+from app.extensions import db
+from app.worker_app import get_worker_app
+from app.notification_sender import tasks
+from app.notification_sender.models import AlertLog, AlertConfig, AlertService
+from app.notification_sender.send_guard import send_guard_stats
+from benchmarks.common import BENCH_COMPANY, quiet_loggers, seed_sample, cleanup_bench_data
+from benchmarks.stub_server import StubServer
+
+TITLE_RE = re.compile(r"Announcement: (guard-\d+)")
+
+
+def seed_logs(count):
+    service = AlertService.query.filter_by(code="bench").first()
+    if not service:
+        service = AlertService(name="Benchmark", code="bench")
+        db.session.add(service)
+        db.session.commit()
+    config = AlertConfig(company_name=BENCH_COMPANY, service_id=service.id, service_name="Benchmark",
+                         group_id="-100123", auth_token="bench-token")
+    db.session.add(config)
+    db.session.commit()
+    logs = []
+    for i in range(count):
+        sample = seed_sample(title=f"guard-{i}", config_id=config.id, service_id=service.id)
+        logs.append(AlertLog(sample_id=sample.id, audience="all", status="sending"))
+    db.session.add_all(logs)
+    db.session.commit()
+    return [(log.sample_id, log.id) for log in logs], config.id
+
+
+def worker(index, logs, errors):
+    batch = index % 2 == 0
+    order = list(logs)
+    random.Random(index).shuffle(order)
+    try:
+        if batch:
+            for offset in range(0, len(order), 25):
+                tasks.send_alert_batch_task([log_id for _, log_id in order[offset:offset + 25]])
+        else:
+            for sample_id, log_id in order:
+                tasks.send_alert_task(sample_id, log_id=log_id)
+    except Exception as e:
+        errors.append(e)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    quiet_loggers()
+    app = get_worker_app()
+    with StubServer(record_bodies=True) as stub:
+        tasks.async_telegram_bot.group_url = stub.url
+        tasks.telegram_bot.group_url = stub.url
+        with app.app_context():
+            cleanup_bench_data()
+            logs, config_id = seed_logs(count)
+
+        errors = []
+        threads = [threading.Thread(target=worker, args=(i, logs, errors)) for i in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        titles = Counter()
+        for body in stub.bodies:
+            match = TITLE_RE.search(json.loads(body).get("message", ""))
+            if match:
+                titles[match.group(1)] += 1
+
+    with app.app_context():
+        statuses = Counter(status for (status,) in db.session.query(AlertLog.status).filter(
+            AlertLog.id.in_([log_id for _, log_id in logs])))
+        AlertConfig.query.filter_by(id=config_id).delete()
+        cleanup_bench_data()
+
+    print(f"{count} logs, {workers} parallel workers, {elapsed:.2f}s, {len(errors)} worker errors")
+    print(f"HTTP sends: {len(stub.bodies)}, logs delivered: {len(titles)}, "
+          f"double sends: {sum(1 for n in titles.values() if n > 1)}")
+    print(f"final statuses: {dict(statuses)}")
+    print(f"send guard: {send_guard_stats()['process']}")
@@ -0,0 +1,53 @@
+"""
+Per-task setup overhead: create_app() on every task vs the per-worker app.
+
+Usage (from the project root, with the usual .env / SQLALCHEMY_DATABASE_URI):
+    python -m benchmarks.bench_task_overhead [iterations]
+"""
+import sys
+import time
+import logging
+import statistics
+from sqlalchemy import text
+from app.app import create_app
+from app.extensions import db
+from app.worker_app import get_worker_app
+from app.logging_config import flask_logger, celery_logger
+
+
+def task_with_create_app():
+    app = create_app()
+    with app.app_context():
+        db.session.execute(text("SELECT 1"))
+        # Each fresh app owns a fresh engine; release it like the old tasks did on GC
+        db.engine.dispose()
+
+
+def task_with_worker_app():
+    app = get_worker_app()
+    with app.app_context():
+        db.session.execute(text("SELECT 1"))
+
+
+def measure(label, fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<22} mean={statistics.mean(timings):8.3f} ms  p50={statistics.median(timings):8.3f} ms  p95={p95:8.3f} ms")
+    return statistics.mean(timings)
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    flask_logger.setLevel(logging.WARNING)
+    celery_logger.setLevel(logging.WARNING)
+
+    print(f"Per-task overhead over {iterations} runs")
+    before = measure("create_app() per task", task_with_create_app, iterations)
+    get_worker_app()  # built once, as on worker_process_init
+    after = measure("per-worker app", task_with_worker_app, iterations)
+    print(f"Speedup: {before / after:.1f}x")
@@ -0,0 +1,92 @@
+"""
+Memory and file descriptors while uploading a large document.
+
+Pushes the same document (50 MiB by default) several times through a local stub of the Bot API:
+
+    requests files=  - the old path: requests builds the whole multipart body in memory,
+                       and the handle is left for the garbage collector to close
+    TelegramBot2     - send_document, streamed with MultipartStream
+    AsyncTelegramBot - send_media over aiohttp, streamed with MultipartStream
+
+Reports the peak Python allocation (tracemalloc) and the growth of open file descriptors for each
+path, after a warm-up upload that opens the pooled connections. Fails if a streamed path allocates
+more than a few chunks or leaks a descriptor.
+
+Usage:
+    python -m benchmarks.bench_upload_memory [size_mb] [uploads]
+"""
+import os
+import sys
+import asyncio
+import tempfile
+import tracemalloc
+import aiohttp
+import requests
+from app.notification_sender.multipart import UPLOAD_CHUNK_SIZE
+from app.notification_sender.telegram_bot import TelegramBot2
+from app.notification_sender.async_sender import AsyncTelegramBot
+from benchmarks.common import quiet_loggers
+from benchmarks.stub_server import StubServer
+
+STREAMED_PEAK_LIMIT = 64 * UPLOAD_CHUNK_SIZE  # bytes; far below the document size
+
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def measure(label, upload, uploads):
+    upload()  # warm-up, so pooled keep-alive connections are already open
+    fds_before = open_fds()
+    tracemalloc.start()
+    for _ in range(uploads):
+        upload()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    fd_growth = open_fds() - fds_before
+    print(f"{label:<18} peak allocated={peak / 1024 / 1024:8.2f} MiB  fd growth={fd_growth}")
+    return peak, fd_growth
+
+
+if __name__ == "__main__":
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    uploads = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    quiet_loggers()
+
+    with tempfile.TemporaryDirectory() as tmp, StubServer() as stub:
+        path = os.path.join(tmp, "bench.pdf")
+        with open(path, "wb") as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+        print(f"{uploads} uploads of a {size_mb} MiB document")
+
+        def old_upload():
+            files = {"document": (os.path.basename(path), open(path, "rb"))}
+            requests.post(f"{stub.url}/botbench/sendDocument", data={"chat_id": "-100123"}, files=files, timeout=60)
+
+        bot = TelegramBot2()
+        bot.api_base = stub.url
+
+        def sync_upload():
+            assert bot.send_document("bench-token", "-100123", path, caption="Benchmark").get("ok")
+
+        async_bot = AsyncTelegramBot()
+        async_bot.api_base = stub.url
+
+        async def async_uploads():
+            async with aiohttp.ClientSession() as session:
+                for _ in range(uploads):
+                    response = await async_bot.send_media(session, "bench-token", "-100123", path)
+                    assert response.get("ok"), response
+
+        measure("requests files=", old_upload, uploads)
+        results = [
+            measure("TelegramBot2", sync_upload, uploads),
+            measure("AsyncTelegramBot", lambda: asyncio.run(async_uploads()), 1),
+        ]
+        print(f"stub received {stub.stats['bytes'] / 1024 / 1024:.0f} MiB")
+
+    for peak, fd_growth in results:
+        assert peak < STREAMED_PEAK_LIMIT, f"streamed upload allocated {peak} bytes"
+        assert fd_growth <= 0, f"streamed upload leaked {fd_growth} file descriptors"
+    print("streamed uploads: flat memory, no descriptor growth")
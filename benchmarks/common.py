@@ -0,0 +1,62 @@
+"""
+Shared helpers for the benchmark scripts.
+"""
+import logging
+import statistics
+import pytz
+from datetime import datetime
+from app.extensions import db
+from app.logging_config import flask_logger, celery_logger, scheduled_alerts_logger, telegram_logger
+
+BENCH_COMPANY = "__bench__"
+
+
+def quiet_loggers():
+    for logger in (flask_logger, celery_logger, scheduled_alerts_logger, telegram_logger):
+        logger.setLevel(logging.WARNING)
+
+
+def seed_sample(**overrides):
+    """
+    Creates (and commits) an AlertSample tagged as benchmark data.
+    """
+    from app.notification_sender.models import AlertSample
+    fields = dict(
+        company_name=BENCH_COMPANY,
+        sender_name="Benchmark",
+        title="Benchmark sample",
+        body="<p>Benchmark body</p>",
+        start_date=datetime.now(pytz.utc).date(),
+        start_time=datetime.now(pytz.utc).time(),
+    )
+    fields.update(overrides)
+    sample = AlertSample(**fields)
+    db.session.add(sample)
+    db.session.commit()
+    return sample
+
+
+def cleanup_bench_data():
+    """
+    Removes every row created by seed_sample and the logs and dead letters attached to it.
+    Logs go through delete_logs, so alert_stats_hourly (and the dashboard) stop counting them.
+    """
+    from app.notification_sender.models import AlertSample, AlertLog, AlertLogArchive, AlertDeadLetter
+    from app.notification_sender.hourly_stats import delete_logs
+    sample_ids = [row.id for row in db.session.query(AlertSample.id).filter(AlertSample.company_name == BENCH_COMPANY)]
+    if sample_ids:
+        AlertDeadLetter.query.filter(AlertDeadLetter.sample_id.in_(sample_ids)).delete(synchronize_session=False)
+        delete_logs(AlertLog.query.filter(AlertLog.sample_id.in_(sample_ids)))
+        delete_logs(AlertLogArchive.query.filter(AlertLogArchive.sample_id.in_(sample_ids)))
+        AlertSample.query.filter(AlertSample.id.in_(sample_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def summarize(label, timings_ms):
+    timings = sorted(timings_ms)
+    if not timings:
+        print(f"{label:<28} no samples")
+        return
+    p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+    print(f"{label:<28} n={len(timings):<6} mean={statistics.mean(timings):9.3f} ms  "
+          f"p50={statistics.median(timings):9.3f} ms  p95={p95:9.3f} ms  max={timings[-1]:9.3f} ms")
@@ -0,0 +1,115 @@
+"""
+Local stub of the Telegram Bot API / BOT_GROUP_API used by the delivery benchmarks.
+
+Answers every POST with {"ok": true, ...} over HTTP/1.1 keep-alive, optionally after a
+fixed delay, and counts requests, TCP connections and body bytes received.
+With record_bodies=True the JSON bodies are kept in `stub.bodies` for inspection.
+"""
+import json
+import time
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.stats_lock:
+            self.server.stats["connections"] += 1
+
+    def _read_body(self):
+        if self.server.bodies is not None and "Content-Length" in self.headers:
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            with self.server.stats_lock:
+                self.server.bodies.append(body)
+            return len(body)
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            received = 0
+            while True:
+                size = int(self.rfile.readline().strip().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return received
+                remaining = size
+                while remaining:
+                    remaining -= len(self.rfile.read(min(remaining, 65536)))
+                received += size
+                self.rfile.readline()
+        remaining = int(self.headers.get("Content-Length", 0))
+        received = remaining
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 65536))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+        return received
+
+    def do_POST(self):
+        received = self._read_body()
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+            self.server.stats["bytes"] += received
+            responder = self.server.responder
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        status, payload = responder(self.path) if responder else (200, {"ok": True, "result": {"message_id": 1}})
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default backlog of 5 drops connection bursts
+
+
+class StubServer:
+    """
+    Runs the stub on a background thread: `with StubServer(delay=0.05) as stub: stub.url`.
+    `responder(path) -> (status, payload)` overrides the default success reply.
+    """
+    def __init__(self, delay=0.0, responder=None, record_bodies=False):
+        self.httpd = StubHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.httpd.delay = delay
+        self.httpd.responder = responder
+        self.httpd.bodies = [] if record_bodies else None
+        self.httpd.stats_lock = threading.Lock()
+        self.httpd.stats = {"requests": 0, "connections": 0, "bytes": 0}
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self):
+        with self.httpd.stats_lock:
+            return dict(self.httpd.stats)
+
+    @property
+    def bodies(self):
+        with self.httpd.stats_lock:
+            return list(self.httpd.bodies or [])
+
+    def reset_stats(self):
+        with self.httpd.stats_lock:
+            self.httpd.stats.update(requests=0, connections=0, bytes=0)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
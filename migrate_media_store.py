@@ -0,0 +1,60 @@
+import os
+import sys
+from app.app import create_app
+from app.extensions import db
+from app.authentication.models import User
+from app.notification_sender.models import AlertSample
+from app.notification_sender.media_store import ingest_file, is_stored, recount_references, PROFILE_PIC_PREFIX
+
+# Moves uploads saved flat in UPLOAD_FOLDER into the content-addressed store and rewrites the paths.
+# Usage: python migrate_media_store.py [--keep-originals]
+keep_originals = "--keep-originals" in sys.argv
+
+app = create_app()
+
+with app.app_context():
+    upload_folder = app.config['UPLOAD_FOLDER']
+    print("Starting media store migration...")
+    stored = {}  # flat file name -> stored path, so a file shared by several rows is ingested once
+    missing = set()
+
+    def migrate(relative_path):
+        if not relative_path or is_stored(relative_path):
+            return relative_path
+        if relative_path in stored:
+            return stored[relative_path]
+        file_path = os.path.join(upload_folder, relative_path)
+        if not os.path.isfile(file_path):
+            missing.add(relative_path)
+            return relative_path
+        stored[relative_path] = ingest_file(file_path, upload_folder, move=False)
+        print(f"Stored {relative_path} as {stored[relative_path]}")
+        return stored[relative_path]
+
+    updated_count = 0
+    for sample in AlertSample.query.filter(
+        (AlertSample.photo_upload.isnot(None)) | (AlertSample.document_upload.isnot(None))
+    ).all():
+        photo, document = migrate(sample.photo_upload), migrate(sample.document_upload)
+        if (photo, document) != (sample.photo_upload, sample.document_upload):
+            sample.photo_upload, sample.document_upload = photo, document
+            updated_count += 1
+
+    for user in User.query.filter(User.profile_pic.like(f"{PROFILE_PIC_PREFIX}%")).all():
+        profile_pic = PROFILE_PIC_PREFIX + migrate(user.profile_pic[len(PROFILE_PIC_PREFIX):])
+        if profile_pic != user.profile_pic:
+            user.profile_pic = profile_pic
+            updated_count += 1
+            print(f"Updated user {user.email}: new profile_pic = {user.profile_pic}")
+
+    db.session.commit()
+    # ingest_file counted one reference per file; set the real counts from the rewritten rows
+    recount_references()
+    print(f"Media store migration complete. {len(stored)} files stored, {updated_count} rows updated.")
+
+    if missing:
+        print(f"{len(missing)} referenced files were not found and keep their old path: {sorted(missing)}")
+    if not keep_originals:
+        for relative_path in stored:
+            os.remove(os.path.join(upload_folder, relative_path))
+        print(f"Removed {len(stored)} original files.")